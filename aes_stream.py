@@ -0,0 +1,258 @@
+import os
+import struct
+
+from lazy_import import lazy_import
+from image_io import load_rgb_array, save_image
+from instrumentation import stage
+from key_derivation import derive_key, INFO_STREAM
+from standard_lsb import write_lsb_bytes, extract_lsb_bytes, read_lsb_preamble
+from stego_header import (HEADER_BITS, METHOD_STANDARD_STREAM, METHOD_VARIANCE_STREAM, FLAG_HKDF, pack_preamble,
+                          header_bits, unpack_header)
+from stego_probe import probe_method
+from variance_cache import cached_variance_map
+from variance_kernel import embed_bits, extract_bits, stable_gray
+from capacity import check_capacity
+
+np = lazy_import("numpy")
+AES = lazy_import("Crypto.Cipher.AES")
+
+# Streaming AES-GCM for file-sized payloads.
+#
+# The plaintext is read and encrypted in chunks, and every chunk is written into the image as soon
+# as it is encrypted, so only one chunk is held in memory at a time. The stream is:
+#   stream header: nonce prefix (8 bytes) | chunk size (u32) | plaintext size (u64), big-endian
+#   frames:        one per chunk, ciphertext + 16-byte GCM tag
+# Chunk i uses the nonce prefix + i (u32) as its nonce, and authenticates the stream header and a
+# last-chunk flag as associated data, so reordered, truncated or tampered frames fail verification.
+# A wrong key or a damaged image is reported after the first chunk, without reading the rest.
+# The key is the HKDF stream key of the shared secret (FLAG_HKDF); streams without the flag use
+# the legacy SHA-256 key.
+
+STREAM_HEADER_FORMAT = ">8sIQ"
+STREAM_HEADER_SIZE = struct.calcsize(STREAM_HEADER_FORMAT)
+TAG_SIZE = 16
+DEFAULT_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+
+
+def _chunk_count(size, chunk_size):
+    # An empty plaintext is still one (empty) authenticated chunk
+    return max(1, -(-size // chunk_size))
+
+
+def stream_length(size, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Returns the number of bytes encrypt_stream() produces for `size` bytes of plaintext."""
+    return STREAM_HEADER_SIZE + size + TAG_SIZE * _chunk_count(size, chunk_size)
+
+
+def _chunk_cipher(key, header, index):
+    nonce_prefix = header[:8]
+    return AES.new(key, AES.MODE_GCM, nonce=nonce_prefix + struct.pack(">I", index), mac_len=TAG_SIZE)
+
+
+def _associated_data(header, last):
+    return header + (b"\x01" if last else b"\x00")
+
+
+def encrypt_stream(source, size, key, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+       Encrypts a file-like source chunk by chunk.
+
+       Parameters:
+           source: Object with a read(n) method (e.g. a file opened in binary mode).
+           size (int): Number of bytes to read from the source.
+           key (bytes): 32-byte AES key.
+           chunk_size (int): Plaintext bytes per chunk.
+
+       Yields:
+           bytes: The stream header, then one frame (ciphertext + tag) per chunk.
+
+       Raises:
+           ValueError: If the chunk size is invalid or the source ends before `size` bytes.
+       """
+    if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+        raise ValueError(f"Chunk size must be between 1 and {MAX_CHUNK_SIZE} bytes.")
+    header = struct.pack(STREAM_HEADER_FORMAT, os.urandom(8), chunk_size, size)
+    yield header
+    n_chunks = _chunk_count(size, chunk_size)
+    remaining = size
+    for index in range(n_chunks):
+        chunk = source.read(min(chunk_size, remaining))
+        if len(chunk) != min(chunk_size, remaining):
+            raise ValueError("The source ended before the announced size.")
+        remaining -= len(chunk)
+        cipher = _chunk_cipher(key, header, index)
+        cipher.update(_associated_data(header, index == n_chunks - 1))
+        ciphertext, tag = cipher.encrypt_and_digest(chunk)
+        yield ciphertext + tag
+
+
+def decrypt_stream(read, key):
+    """
+       Decrypts a stream written by encrypt_stream(), chunk by chunk.
+
+       Parameters:
+           read (callable): read(n) returns the next n bytes of the stream (fewer at its end).
+           key (bytes): 32-byte AES key.
+
+       Yields:
+           bytes: The plaintext of each chunk, after its tag has been verified.
+
+       Raises:
+           ValueError: If the stream is truncated or a chunk fails authentication. Chunks
+                       yielded before the failure were authentic.
+       """
+    header = read(STREAM_HEADER_SIZE)
+    if len(header) != STREAM_HEADER_SIZE:
+        raise ValueError("Truncated stream header.")
+    _, chunk_size, size = struct.unpack(STREAM_HEADER_FORMAT, header)
+    if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+        raise ValueError("Invalid stream header (wrong key or no stream in this image).")
+    n_chunks = _chunk_count(size, chunk_size)
+    remaining = size
+    for index in range(n_chunks):
+        n = min(chunk_size, remaining)
+        frame = read(n + TAG_SIZE)
+        if len(frame) != n + TAG_SIZE:
+            raise ValueError(f"Stream truncated at chunk {index}.")
+        cipher = _chunk_cipher(key, header, index)
+        cipher.update(_associated_data(header, index == n_chunks - 1))
+        try:
+            chunk = cipher.decrypt_and_verify(frame[:n], frame[n:])
+        except ValueError:
+            raise ValueError(f"Authentication failed at chunk {index} (wrong key or modified image).")
+        remaining -= n
+        yield chunk
+
+
+def embed_stream(source, size, S, carrier, method, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+       Encrypts a file-like source with streaming AES-GCM and embeds it into a carrier image.
+
+       Parameters:
+           source: Object with a read(n) method.
+           size (int): Number of bytes to read from the source.
+           S (str or int): Shared secret the AES key is derived from.
+           carrier: Path, bytes, file-like object, PIL image or RGB array of the carrier.
+           method (str): '1' for standard LSB, '2' for variance-based LSB.
+           chunk_size (int): Plaintext bytes per chunk.
+
+       Returns:
+           np.ndarray: HxWx3 uint8 array of the image with the embedded stream.
+
+       Raises:
+           ValueError: If the stream does not fit in the carrier or the method is invalid.
+       """
+    total = stream_length(size, chunk_size)
+    if method in ('1', '2'):
+        check_capacity(carrier, method, total, marker="")
+    array = load_rgb_array(carrier, writable=True)
+    chunks = encrypt_stream(source, size, derive_key(S, INFO_STREAM), chunk_size)
+
+    if method == '1':
+        preamble = pack_preamble(METHOD_STANDARD_STREAM, FLAG_HKDF)
+        write_lsb_bytes(array, preamble)
+        offset = len(preamble)
+        with stage("embed_stream", bits=total * 8):
+            for chunk in chunks:
+                write_lsb_bytes(array, chunk, offset)
+                offset += len(chunk)
+    elif method == '2':
+        var_map = cached_variance_map(stable_gray(array))
+        min_var, max_var = np.min(var_map), np.max(var_map)
+        embed_bits(array, None, min_var, max_var,
+                   header_bits(METHOD_VARIANCE_STREAM, min_var, max_var, total, FLAG_HKDF))
+        bit_pos = HEADER_BITS
+        with stage("embed_stream", bits=total * 8):
+            for chunk in chunks:
+                bits = np.unpackbits(np.frombuffer(chunk, dtype=np.uint8))
+                bit_pos += embed_bits(array, var_map, min_var, max_var, bits, start_bit=bit_pos)
+    else:
+        raise ValueError("Invalid LSB method.")
+    return array
+
+
+def _stream_reader(array):
+    # Returns (read(n) over the embedded stream, header/preamble flags), for whichever method
+    # the image was embedded with
+    method = probe_method(array)
+    if method == METHOD_STANDARD_STREAM:
+        preamble = read_lsb_preamble(array)
+        position = [preamble["size"]]
+
+        def read(n):
+            data = extract_lsb_bytes(array, n, offset=position[0])
+            position[0] += len(data)
+            return data
+        return read, preamble["flags"]
+
+    if method == METHOD_VARIANCE_STREAM:
+        header = unpack_header(np.packbits(extract_bits(array, HEADER_BITS)).tobytes())
+        var_map = cached_variance_map(stable_gray(array))
+        end_bit = HEADER_BITS + header["length"] * 8
+        position = [HEADER_BITS]
+
+        def read(n):
+            n_bits = min(n * 8, end_bit - position[0])
+            bits = extract_bits(array, n_bits, var_map, header["min_var"], header["max_var"],
+                                start_bit=position[0])[:n_bits]
+            position[0] += len(bits)
+            return np.packbits(bits[:len(bits) // 8 * 8]).tobytes()
+        return read, header["flags"]
+
+    raise ValueError("The image does not contain an encrypted stream.")
+
+
+def extract_stream(image, S):
+    """
+       Extracts and decrypts a stream embedded with embed_stream(), chunk by chunk.
+
+       Parameters:
+           image: Path, bytes, file-like object, PIL image or RGB array of the stego image.
+           S (str or int): Shared secret the AES key is derived from.
+
+       Yields:
+           bytes: Authenticated plaintext chunks.
+
+       Raises:
+           ValueError: If the image holds no stream, or a chunk fails authentication.
+       """
+    array = load_rgb_array(image)
+    read, flags = _stream_reader(array)
+    key = derive_key(S, INFO_STREAM, hkdf=bool(flags & FLAG_HKDF))
+    with stage("extract_stream"):
+        yield from decrypt_stream(read, key)
+
+
+def embed_file(file_path, S, carrier, output_image, method, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Embeds the file at file_path with embed_stream() and saves the stego image."""
+    with open(file_path, "rb") as source:
+        array = embed_stream(source, os.fstat(source.fileno()).st_size, S, carrier, method, chunk_size)
+    save_image(array, output_image)
+
+
+def extract_file(image, S, output_path):
+    """
+       Extracts a file embedded with embed_file() into output_path.
+
+       The data is written to a temporary file next to output_path, which is renamed only once
+       every chunk has been authenticated, so a failed extraction leaves no partial output.
+
+       Returns:
+           int: Number of bytes written.
+
+       Raises:
+           ValueError: If the image holds no stream, or a chunk fails authentication.
+       """
+    part_path = output_path + ".part"
+    written = 0
+    try:
+        with open(part_path, "wb") as out:
+            for chunk in extract_stream(image, S):
+                out.write(chunk)
+                written += len(chunk)
+        os.replace(part_path, output_path)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+    return written
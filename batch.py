@@ -0,0 +1,171 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from image_io import load_rgb_array, save_image
+from standard_lsb import embed_lsb_array, END_MARKER
+from extract_dh_from_image_2 import extract_dh_from_image_standard_lsb
+from lsb_with_variance_plaintext import embed_message_variance_array, extract_message_variance
+from encrypt_and_hide_message_3 import encrypt_and_embed
+from variance_cache import configure_variance_cache
+from extract_and_decrypt_message_4 import extract_and_decrypt_message
+from stego_header import METHOD_STANDARD_PLAINTEXT
+from stego_probe import detect_method
+
+OPERATIONS = ("embed", "extract")
+METHODS = ("1", "2")
+
+
+def read_manifest(path):
+    """
+       Reads a batch manifest from a CSV or JSONL file.
+
+       Each item has the fields:
+           op      - 'embed' or 'extract'
+           input   - path of the carrier (embed) or stego image (extract)
+           output  - path of the stego image to write (embed only)
+           method  - '1' for standard LSB, '2' for variance-based LSB. Optional for extract,
+                     where it is detected from the image when left empty.
+           payload - text to embed (embed only)
+           secret  - optional shared secret S. With a secret the payload is AES encrypted
+                     (like option 3/4 of main.py); without it the payload is embedded as
+                     plaintext (like the DH values in option 1/2).
+
+       Parameters:
+           path (str): Manifest path. Files ending in .csv are read as CSV, anything else as JSONL.
+
+       Returns:
+           list[dict]: The manifest items, in file order.
+       """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            return [dict(row) for row in csv.DictReader(f)]
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def process_item(item):
+    """
+       Runs one manifest item with the existing embed/extract functions.
+
+       Parameters:
+           item (dict): A manifest item (see read_manifest()).
+
+       Returns:
+           dict: Status record with the input, output, op, status ('ok' or 'error'),
+                 error message, extraction result and elapsed seconds.
+       """
+    start = time.perf_counter()
+    record = {"input": item.get("input"), "output": item.get("output") or None, "op": item.get("op"),
+              "status": "ok", "error": None, "result": None}
+    try:
+        op = item.get("op")
+        method = str(item.get("method") or ("1" if op == "embed" else ""))
+        secret = item.get("secret") or None
+        if op not in OPERATIONS:
+            raise ValueError(f"Unknown op: {op!r}")
+        if op == "extract" and not method:
+            image = load_rgb_array(item["input"])
+            method = detect_method(image)
+        else:
+            image = item["input"]
+        if method not in METHODS:
+            raise ValueError(f"Unknown method: {method!r}")
+
+        # The library functions report progress with print(); keep worker output quiet
+        with contextlib.redirect_stdout(io.StringIO()):
+            if op == "embed":
+                if not item.get("output"):
+                    raise ValueError("Missing output path")
+                payload = item.get("payload") or ""
+                if secret is not None:
+                    array = encrypt_and_embed(payload, secret, item["input"], method)
+                else:
+                    array = load_rgb_array(item["input"], writable=True)
+                    if method == "1":
+                        embed_lsb_array(array, payload.encode("latin-1"), END_MARKER, METHOD_STANDARD_PLAINTEXT)
+                    else:
+                        embed_message_variance_array(payload, array)
+                save_image(array, item["output"])
+            else:
+                if secret is not None:
+                    result = extract_and_decrypt_message(image, secret, method)
+                elif method == "1":
+                    result = extract_dh_from_image_standard_lsb(image)
+                else:
+                    result = extract_message_variance(image) or None
+                if result is None:
+                    raise ValueError("No valid message found in the image.")
+                record["result"] = result
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["seconds"] = round(time.perf_counter() - start, 6)
+    return record
+
+
+def _init_worker(variance_cache_dir):
+    if variance_cache_dir:
+        configure_variance_cache(disk_dir=variance_cache_dir)
+
+
+def run_batch(items, workers=None, chunksize=1, variance_cache_dir=None):
+    """
+       Processes manifest items in a process pool.
+
+       Parameters:
+           items (list[dict]): Manifest items.
+           workers (int or None): Number of worker processes. Defaults to os.cpu_count().
+                                  With 1 worker, items are processed in this process.
+           chunksize (int): Number of items sent to a worker at a time.
+           variance_cache_dir (str or None): Directory of an on-disk variance map cache shared
+                                             by the workers (see variance_cache).
+
+       Returns:
+           list[dict]: One status record per item, in manifest order.
+       """
+    if workers == 1:
+        _init_worker(variance_cache_dir)
+        records = [process_item(item) for item in items]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(variance_cache_dir,)) as executor:
+            records = list(executor.map(process_item, items, chunksize=chunksize))
+    for index, record in enumerate(records):
+        record["index"] = index
+    return records
+
+
+def write_report(records, stream):
+    for record in records:
+        stream.write(json.dumps(record) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch LSB embedding/extraction from a manifest.")
+    parser.add_argument("manifest", help="CSV or JSONL manifest (fields: op, input, output, method, payload, secret)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("-c", "--chunksize", type=int, default=1, help="items per worker task (default: 1)")
+    parser.add_argument("--variance-cache", default=None, help="directory for cached variance maps (.npy)")
+    parser.add_argument("-r", "--report", default=None, help="JSONL status report path (default: stdout)")
+    args = parser.parse_args(argv)
+
+    records = run_batch(read_manifest(args.manifest), workers=args.workers, chunksize=args.chunksize,
+                        variance_cache_dir=args.variance_cache)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            write_report(records, f)
+    else:
+        write_report(records, sys.stdout)
+
+    failed = sum(record["status"] != "ok" for record in records)
+    print(f" Processed {len(records)} items, {failed} failed.", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
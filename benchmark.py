@@ -0,0 +1,272 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+from PIL import Image
+import numpy as np
+
+from image_io import encode_image, load_rgb_array, save_image
+from variance_map import compute_variance_map
+from variance_cache import get_variance_cache
+from variance_kernel import embed_bits, grid_capacity_bits, stable_gray
+from stego_header import HEADER_BITS
+from capacity import STANDARD_LSB, VARIANCE_LSB, aes_payload_size, payload_capacity
+from standard_lsb import END_MARKER, embed_lsb_array
+from encrypt_and_hide_message_3 import aes_encrypt_message, derive_aes_key, embed_with_standard_lsb
+from extract_and_decrypt_message_4 import extract_bits_from_image
+from extract_dh_from_image_2 import extract_dh_from_image_standard_lsb
+import lsb_with_variance_aes
+import lsb_with_variance_plaintext
+
+BUNDLED_IMAGES = ("horse.png", "dog.png", "clean.png")
+DEFAULT_SYNTHETIC_MP = (1, 5)
+DEFAULT_PAYLOADS = (64, 4096, 32768)
+SECRET = "123456789"
+
+
+def synthetic_image(megapixels, seed=0):
+    """
+       Builds a deterministic RGB test image of about the given size.
+
+       A small random image is upscaled and mixed with mild noise, so the image has both smooth
+       and textured regions and the variance bins are spread roughly like in a photo.
+
+       Parameters:
+           megapixels (float): Target size in millions of pixels (4:3 aspect ratio).
+           seed (int): Seed of the random generator.
+
+       Returns:
+           np.ndarray: HxWx3 uint8 image data.
+       """
+    width = int(round((megapixels * 1e6 * 4 / 3) ** 0.5))
+    height = int(round(megapixels * 1e6 / width))
+    rng = np.random.default_rng(seed)
+    base = Image.fromarray(rng.integers(0, 256, (48, 64, 3), dtype=np.uint8))
+    array = np.array(base.resize((width, height), Image.BICUBIC))
+    noise = rng.integers(-8, 9, array.shape, dtype=np.int16)
+    return np.clip(array.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def make_payload(size):
+    # Printable ASCII, so it is valid for every method and never contains the end marker
+    letters = np.frombuffer(b"abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 ", dtype=np.uint8)
+    return letters[np.arange(size) % len(letters)].tobytes().decode("ascii")
+
+
+def fits(method, shape, size):
+    """Returns True if a payload of `size` characters fits in an image of the given shape."""
+    height, width = shape[:2]
+    if method == "standard":
+        return aes_payload_size(size) <= payload_capacity(width, height, STANDARD_LSB, END_MARKER)
+    if method == "variance_plaintext":
+        return size <= payload_capacity(width, height, VARIANCE_LSB)
+    return aes_payload_size(size) <= payload_capacity(width, height, VARIANCE_LSB)
+
+
+def _time(function, repeat, cold_cache=True):
+    # Runs function `repeat` times and returns the list of wall times in seconds
+    times = []
+    for _ in range(repeat):
+        if cold_cache:
+            get_variance_cache().clear()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+    return times
+
+
+def _stage_functions(path, payload, workdir):
+    # (stage name, callable) pairs for the building blocks of an embed
+    array = load_rgb_array(path)
+    gray = stable_gray(array)
+    message = payload.encode("latin-1")
+    key = derive_aes_key(SECRET)
+    var_map = compute_variance_map(gray)
+    min_var, max_var = var_map.min(), var_map.max()
+    bits = np.unpackbits(np.frombuffer(message, dtype=np.uint8))
+
+    def embed_kernel():
+        target = array.copy()
+        embed_bits(target, var_map, min_var, max_var, bits[:grid_capacity_bits(target) - HEADER_BITS],
+                   start_bit=HEADER_BITS)
+
+    return [
+        ("decode", lambda: Image.open(path).load()),
+        ("to_rgb", lambda: Image.open(path).convert("RGB")),
+        ("to_gray", lambda: stable_gray(array)),
+        ("variance_map", lambda: compute_variance_map(gray)),
+        ("pack_bits", lambda: np.unpackbits(np.frombuffer(message, dtype=np.uint8))),
+        ("embed_standard_kernel", lambda: embed_lsb_array(array.copy(), message)),
+        ("embed_variance_kernel", embed_kernel),
+        ("aes_encrypt", lambda: aes_encrypt_message(payload, key)),
+        ("png_encode", lambda: encode_image(array)),
+        ("png_save", lambda: save_image(array, os.path.join(workdir, "stage_save.png"))),
+    ]
+
+
+def _operation_functions(path, payload, workdir, shape):
+    # (case name, method, callable) pairs for the public embed/extract functions.
+    # Extract cases read the image written by the matching embed case.
+    out = {name: os.path.join(workdir, f"{name}.png") for name in ("standard", "variance_plaintext", "variance_aes")}
+    key = derive_aes_key(SECRET)
+    cases = [
+        ("standard/embed", "standard",
+         lambda: embed_with_standard_lsb(path, aes_encrypt_message(payload, key), out["standard"])),
+        ("standard/extract_bits", "standard", lambda: extract_bits_from_image(out["standard"])),
+        ("standard/extract_dh", "standard", lambda: extract_dh_from_image_standard_lsb(out["standard"])),
+        ("variance_plaintext/embed", "variance_plaintext",
+         lambda: lsb_with_variance_plaintext.embed_message_variance(payload, path, out["variance_plaintext"])),
+        ("variance_plaintext/extract", "variance_plaintext",
+         lambda: lsb_with_variance_plaintext.extract_message_variance(out["variance_plaintext"])),
+        ("variance_aes/embed", "variance_aes",
+         lambda: lsb_with_variance_aes.embed_message_variance(payload, path, out["variance_aes"], SECRET)),
+        ("variance_aes/extract", "variance_aes",
+         lambda: lsb_with_variance_aes.extract_message_variance(out["variance_aes"], SECRET)),
+    ]
+    return [(name, function) for name, method, function in cases if fits(method, shape, len(payload))]
+
+
+def _summary(times):
+    return {"min": min(times), "median": statistics.median(times), "mean": statistics.fmean(times),
+            "runs": len(times)}
+
+
+def run_benchmarks(images, payloads, repeat=3, cold_cache=True, workdir=None):
+    """
+       Times every stage and every embed/extract function over a matrix of images and payloads.
+
+       Parameters:
+           images (list[tuple]): (name, path) pairs of the carrier images.
+           payloads (list[int]): Payload sizes in characters.
+           repeat (int): Timed runs per case. min, median and mean are reported.
+           cold_cache (bool): If True, the variance map cache is cleared before every run, so the
+                              variance filter is part of every embed/extract timing.
+           workdir (str or None): Directory for the stego images written by the embed cases.
+
+       Returns:
+           list[dict]: One record per case with the keys 'key', 'image', 'megapixels',
+                       'payload', 'case', 'min', 'median', 'mean' and 'runs'.
+       """
+    results = []
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        for name, path in images:
+            with Image.open(path) as img:
+                shape = (img.height, img.width)
+            megapixels = round(shape[0] * shape[1] / 1e6, 3)
+            for size in payloads:
+                payload = make_payload(size)
+                cases = [(f"stage/{stage}", function) for stage, function in _stage_functions(path, payload, tmp)]
+                cases += _operation_functions(path, payload, tmp, shape)
+                for case, function in cases:
+                    record = {"key": f"{name}|{size}|{case}", "image": name, "megapixels": megapixels,
+                              "payload": size, "case": case}
+                    record.update(_summary(_time(function, repeat, cold_cache)))
+                    results.append(record)
+                    print(f" {record['key']:<55} min {record['min'] * 1000:10.2f} ms", file=sys.stderr)
+    return results
+
+
+def compare_results(results, baseline, threshold=0.10, min_delta=0.001):
+    """
+       Compares benchmark results with a stored baseline.
+
+       A case regresses if its minimum time grew by more than `threshold` (a fraction) and by more
+       than `min_delta` seconds, which keeps timer noise on very short cases from failing a run.
+
+       Parameters:
+           results (list[dict]): Current results (see run_benchmarks()).
+           baseline (list[dict]): Baseline results, matched by 'key'.
+           threshold (float): Allowed relative slowdown, e.g. 0.10 for 10%.
+           min_delta (float): Allowed absolute slowdown in seconds.
+
+       Returns:
+           list[dict]: One record per case found in both, with 'key', 'baseline', 'current',
+                       'ratio' and 'status' ('regression', 'improvement' or 'ok').
+       """
+    previous = {record["key"]: record for record in baseline}
+    comparison = []
+    for record in results:
+        if record["key"] not in previous:
+            continue
+        old, new = previous[record["key"]]["min"], record["min"]
+        ratio = new / old if old > 0 else float("inf")
+        if ratio > 1 + threshold and new - old > min_delta:
+            status = "regression"
+        elif ratio < 1 / (1 + threshold) and old - new > min_delta:
+            status = "improvement"
+        else:
+            status = "ok"
+        comparison.append({"key": record["key"], "baseline": old, "current": new,
+                           "ratio": round(ratio, 4), "status": status})
+    return comparison
+
+
+def _environment():
+    return {"python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+            "processor": platform.processor(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z")}
+
+
+def _load_results(path):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return data["results"] if isinstance(data, dict) else data
+
+
+def _parse_list(text, cast):
+    return [cast(value) for value in text.split(",") if value.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the embed/extract pipeline stages.")
+    parser.add_argument("-o", "--output", default="benchmark_results.json", help="JSON results path")
+    parser.add_argument("-b", "--baseline", default=None, help="baseline JSON to compare against")
+    parser.add_argument("-t", "--threshold", type=float, default=0.10,
+                        help="allowed relative slowdown before a case counts as a regression (default: 0.10)")
+    parser.add_argument("--min-delta", type=float, default=0.001,
+                        help="allowed absolute slowdown in seconds (default: 0.001)")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="timed runs per case (default: 3)")
+    parser.add_argument("-p", "--payloads", default=",".join(map(str, DEFAULT_PAYLOADS)),
+                        help="comma separated payload sizes in characters")
+    parser.add_argument("-s", "--synthetic", default=",".join(map(str, DEFAULT_SYNTHETIC_MP)),
+                        help="comma separated synthetic image sizes in megapixels, e.g. 1,10,50 ('' for none)")
+    parser.add_argument("--no-bundled", action="store_true", help="skip horse.png, dog.png and clean.png")
+    parser.add_argument("--warm-cache", action="store_true", help="keep the variance map cache between runs")
+    args = parser.parse_args(argv)
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as synthetic_dir:
+        images = [] if args.no_bundled else [(name, os.path.join(here, name)) for name in BUNDLED_IMAGES]
+        for megapixels in _parse_list(args.synthetic, float):
+            path = os.path.join(synthetic_dir, f"synthetic_{megapixels:g}mp.png")
+            save_image(synthetic_image(megapixels), path)
+            images.append((f"synthetic_{megapixels:g}mp", path))
+
+        results = run_benchmarks(images, _parse_list(args.payloads, int), repeat=args.repeat,
+                                 cold_cache=not args.warm_cache)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"environment": _environment(), "results": results}, f, indent=2)
+    print(f" Wrote {len(results)} results to {args.output}", file=sys.stderr)
+
+    if not args.baseline:
+        return 0
+    comparison = compare_results(results, _load_results(args.baseline), args.threshold, args.min_delta)
+    for record in comparison:
+        if record["status"] != "ok":
+            print(f" {record['status']:<12} {record['key']:<55} {record['baseline'] * 1000:10.2f} ms -> "
+                  f"{record['current'] * 1000:10.2f} ms (x{record['ratio']})")
+    regressions = sum(record["status"] == "regression" for record in comparison)
+    print(f" Compared {len(comparison)} cases, {regressions} regressions.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
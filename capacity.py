@@ -0,0 +1,147 @@
+import argparse
+import json
+import os
+import sys
+
+from image_io import image_size
+from stego_header import HEADER_SIZE, PREAMBLE_SIZE
+
+# Capacity of carrier images, computed from their dimensions only.
+#
+# Standard LSB stores 1 bit per channel value, after the preamble and before the end marker.
+# Variance LSB stores 2 bits per 3x3 block (the LSB pair changes with the variance, the number
+# of bits does not), after the binary header. So both capacities are exact and need no pixel data,
+# and embedders can reject oversized payloads before decoding the carrier.
+
+STANDARD_LSB = '1'
+VARIANCE_LSB = '2'
+END_MARKER = "$t3g0$"  # Same marker as standard_lsb.END_MARKER
+IMAGE_EXTENSIONS = (".png", ".bmp", ".tif", ".tiff", ".jpg", ".jpeg", ".webp")
+
+
+def capacity_bits(width, height, method):
+    """
+       Returns the number of bits an image of the given size can hold with a method.
+
+       Parameters:
+           width (int): Image width in pixels.
+           height (int): Image height in pixels.
+           method (str): '1' for standard LSB, '2' for variance-based LSB.
+
+       Raises:
+           ValueError: If the method is unknown.
+       """
+    if method == STANDARD_LSB:
+        return width * height * 3
+    if method == VARIANCE_LSB:
+        return 2 * len(range(1, height - 1, 3)) * len(range(1, width - 1, 3))
+    raise ValueError("Invalid LSB method.")
+
+
+def payload_capacity(width, height, method, marker=END_MARKER):
+    """
+       Returns the largest payload, in bytes, that fits in an image of the given size.
+
+       The preamble and end marker (standard LSB) or binary header (variance LSB) are
+       already subtracted. Pass marker="" for payloads embedded without an end marker.
+       """
+    if method == STANDARD_LSB:
+        overhead = PREAMBLE_SIZE + len(marker)
+    else:
+        overhead = HEADER_SIZE
+    return max(0, capacity_bits(width, height, method) // 8 - overhead)
+
+
+def capacity(image, method, marker=END_MARKER):
+    """
+       Returns the largest payload, in bytes, that an image can hold with a method.
+
+       Only the image header is read (see image_io.image_size()), so this is cheap even for
+       very large carriers.
+
+       Parameters:
+           image: Path, bytes, file-like object, PIL image or RGB array.
+           method (str): '1' for standard LSB, '2' for variance-based LSB.
+           marker (str): End marker of standard-LSB payloads ("" for none).
+
+       Returns:
+           int: Payload capacity in bytes (AES payloads count with their padded ciphertext size).
+       """
+    width, height = image_size(image)
+    return payload_capacity(width, height, method, marker)
+
+
+def check_capacity(image, method, payload_size, marker=END_MARKER):
+    """
+       Raises ValueError if a payload of payload_size bytes does not fit in the image.
+
+       Call it before loading or processing the carrier, so oversized payloads fail fast.
+       """
+    available = capacity(image, method, marker)
+    if payload_size > available:
+        raise ValueError(f"Message is too large to embed in image: {payload_size} bytes needed, "
+                         f"{available} available.")
+
+
+def aes_payload_size(message_size):
+    # Ciphertext size of an uncompressed message after PKCS#7 padding (an upper bound if compressed)
+    return (message_size // 16 + 1) * 16
+
+
+def capacity_report(directory, payload_size=None):
+    """
+       Reports the capacity of every image in a directory.
+
+       Parameters:
+           directory (str): Carrier directory (not searched recursively).
+           payload_size (int or None): If given, each record also tells which methods fit it.
+
+       Returns:
+           list[dict]: One record per image, sorted by path, with path, width, height,
+                       standard_bytes and variance_bytes, or an error for unreadable files.
+       """
+    records = []
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        path = os.path.join(directory, name)
+        record = {"path": path}
+        try:
+            width, height = image_size(path)
+        except (OSError, ValueError) as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+            records.append(record)
+            continue
+        record.update(width=width, height=height,
+                      standard_bytes=payload_capacity(width, height, STANDARD_LSB),
+                      variance_bytes=payload_capacity(width, height, VARIANCE_LSB))
+        if payload_size is not None:
+            record["fits"] = [method for method, key in ((STANDARD_LSB, "standard_bytes"),
+                                                         (VARIANCE_LSB, "variance_bytes"))
+                              if payload_size <= record[key]]
+        records.append(record)
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report the payload capacity of every carrier in a directory.")
+    parser.add_argument("directory", help="carrier directory")
+    parser.add_argument("-p", "--payload", type=int, default=None,
+                        help="payload size in bytes; lists the methods that fit it")
+    parser.add_argument("-r", "--report", default=None, help="JSONL report path (default: stdout)")
+    args = parser.parse_args(argv)
+
+    records = capacity_report(args.directory, args.payload)
+    stream = open(args.report, "w", encoding="utf-8") if args.report else sys.stdout
+    try:
+        for record in records:
+            stream.write(json.dumps(record) + "\n")
+    finally:
+        if args.report:
+            stream.close()
+    print(f" Reported {len(records)} carriers.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
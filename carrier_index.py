@@ -0,0 +1,224 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from lazy_import import lazy_import
+from capacity import STANDARD_LSB, VARIANCE_LSB, IMAGE_EXTENSIONS, payload_capacity
+from variance_kernel import stable_gray
+from variance_map import compute_variance_map
+
+np = lazy_import("numpy")
+Image = lazy_import("PIL.Image")
+
+# Persistent index of a carrier library.
+#
+# One SQLite row per carrier file records its dimensions, a content hash, the payload capacity of
+# the standard and variance methods and the min/max local variance. Scans are incremental: files
+# whose size and modification time match their row are skipped, so rescanning a large library
+# only decodes new or changed files. Choosing a carrier is then an indexed query instead of
+# opening candidate images.
+
+_COLUMNS = {STANDARD_LSB: "standard_bytes", VARIANCE_LSB: "variance_bytes"}
+
+
+def _describe_carrier(path):
+    # Decodes one carrier and returns its index fields
+    with open(path, "rb") as f:
+        data = f.read()
+    with Image.open(io.BytesIO(data)) as img:
+        array = np.asarray(img.convert("RGB"))
+    height, width = array.shape[:2]
+    var_map = compute_variance_map(stable_gray(array))
+    return {"width": width, "height": height,
+            "content_hash": hashlib.blake2b(data, digest_size=20).hexdigest(),
+            "standard_bytes": payload_capacity(width, height, STANDARD_LSB),
+            "variance_bytes": payload_capacity(width, height, VARIANCE_LSB),
+            "min_var": int(var_map.min()), "max_var": int(var_map.max())}
+
+
+def _iter_carrier_files(directory, recursive=True):
+    for root, dirs, files in os.walk(directory):
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(root, name)
+        if not recursive:
+            break
+
+
+class CarrierIndex:
+    """
+       SQLite index of carrier images.
+
+       Parameters:
+           path (str): Database path (':memory:' for a private in-memory index).
+       """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS carriers ("
+                         "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime REAL NOT NULL, "
+                         "width INTEGER NOT NULL, height INTEGER NOT NULL, content_hash TEXT NOT NULL, "
+                         "standard_bytes INTEGER NOT NULL, variance_bytes INTEGER NOT NULL, "
+                         "min_var REAL NOT NULL, max_var REAL NOT NULL, scanned REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS carriers_standard ON carriers (standard_bytes)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS carriers_variance ON carriers (variance_bytes)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS carriers_hash ON carriers (content_hash)")
+        self._scanner = None
+        self._stop = threading.Event()
+
+    def scan(self, directory, recursive=True):
+        """
+           Brings the index up to date with the carriers in a directory.
+
+           Only new files and files whose size or modification time changed are decoded. Rows
+           of files that no longer exist under the directory are removed.
+
+           Returns:
+               dict: Counts of 'added', 'updated', 'unchanged', 'removed' and 'errors'.
+           """
+        counts = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0, "errors": 0}
+        directory = os.path.abspath(directory)
+        with self._lock:
+            known = {row["path"]: (row["size"], row["mtime"]) for row in self._db.execute(
+                "SELECT path, size, mtime FROM carriers WHERE path >= ? AND path < ?",
+                (directory + os.sep, directory + chr(ord(os.sep) + 1)))}
+        seen = set()
+        for path in _iter_carrier_files(directory, recursive):
+            if self._stop.is_set():
+                return counts
+            seen.add(path)
+            try:
+                stat = os.stat(path)
+                if known.get(path) == (stat.st_size, stat.st_mtime):
+                    counts["unchanged"] += 1
+                    continue
+                fields = _describe_carrier(path)
+            except (OSError, ValueError) as e:
+                counts["errors"] += 1
+                print(f" Skipping {path}: {type(e).__name__}: {e}", file=sys.stderr)
+                continue
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO carriers (path, size, mtime, width, height, content_hash, "
+                    "standard_bytes, variance_bytes, min_var, max_var, scanned) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (path, stat.st_size, stat.st_mtime, fields["width"], fields["height"],
+                     fields["content_hash"], fields["standard_bytes"], fields["variance_bytes"],
+                     fields["min_var"], fields["max_var"], time.time()))
+            counts["updated" if path in known else "added"] += 1
+        removed = [path for path in known if path not in seen]
+        if removed:
+            with self._lock:
+                self._db.executemany("DELETE FROM carriers WHERE path = ?", [(path,) for path in removed])
+            counts["removed"] = len(removed)
+        return counts
+
+    def start_scanner(self, directory, interval=300, recursive=True):
+        """
+           Starts a background thread that rescans the directory every `interval` seconds.
+
+           The first scan starts right away. Queries can run while a scan is in progress;
+           they see the carriers indexed so far.
+           """
+        if self._scanner is not None:
+            raise ValueError("A scanner is already running.")
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                self.scan(directory, recursive)
+                self._stop.wait(interval)
+
+        self._scanner = threading.Thread(target=run, name="carrier-scanner", daemon=True)
+        self._scanner.start()
+
+    def stop_scanner(self):
+        """Stops the background scanner after the file it is processing."""
+        self._stop.set()
+        if self._scanner is not None:
+            self._scanner.join()
+            self._scanner = None
+
+    def select(self, payload_size, method, limit=1):
+        """
+           Returns carriers that can hold a payload, smallest sufficient capacity first.
+
+           Parameters:
+               payload_size (int): Payload size in bytes (e.g. the ciphertext size).
+               method (str): '1' for standard LSB, '2' for variance-based LSB.
+               limit (int): Maximum number of carriers returned.
+
+           Returns:
+               list[dict]: Index rows of the matching carriers.
+           """
+        column = self._column(method)
+        with self._lock:
+            rows = self._db.execute(f"SELECT * FROM carriers WHERE {column} >= ? ORDER BY {column} LIMIT ?",
+                                    (payload_size, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def largest(self, method, limit=16):
+        """
+           Returns the carriers with the largest capacity first, e.g. as the pool for
+           sharding.plan_shards() (with capacities taken from the rows).
+           """
+        column = self._column(method)
+        with self._lock:
+            rows = self._db.execute(f"SELECT * FROM carriers ORDER BY {column} DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def get(self, path):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM carriers WHERE path = ?", (os.path.abspath(path),)).fetchone()
+        return dict(row) if row else None
+
+    def _column(self, method):
+        if method not in _COLUMNS:
+            raise ValueError("Invalid LSB method.")
+        return _COLUMNS[method]
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM carriers").fetchone()[0]
+
+    def close(self):
+        self.stop_scanner()
+        with self._lock:
+            self._db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index a carrier library, or pick carriers from the index.")
+    parser.add_argument("database", help="SQLite index path")
+    parser.add_argument("--scan", metavar="DIR", default=None, help="scan DIR for new or changed carriers")
+    parser.add_argument("--select", metavar="BYTES", type=int, default=None,
+                        help="list the carriers that fit a payload of BYTES bytes")
+    parser.add_argument("-m", "--method", default=STANDARD_LSB, choices=(STANDARD_LSB, VARIANCE_LSB))
+    parser.add_argument("-n", "--limit", type=int, default=10, help="carriers listed by --select")
+    args = parser.parse_args(argv)
+
+    index = CarrierIndex(args.database)
+    try:
+        if args.scan:
+            counts = index.scan(args.scan)
+            print(f" Scanned {args.scan}: " + ", ".join(f"{count} {name}" for name, count in counts.items()),
+                  file=sys.stderr)
+        if args.select is not None:
+            for row in index.select(args.select, args.method, args.limit):
+                sys.stdout.write(json.dumps(row) + "\n")
+    finally:
+        index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
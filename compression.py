@@ -0,0 +1,116 @@
+import lzma
+import zlib
+
+from lazy_import import lazy_import
+
+# zstd is optional; the zstandard extension is only loaded when a zstd payload is handled
+try:
+    zstandard = lazy_import("zstandard")
+except ImportError:
+    zstandard = None
+
+# Optional compression of AES payloads before encryption.
+#
+# The codec is recorded in 2 bits of the flags byte of the binary header (variance LSB)
+# or the preamble (standard LSB), see stego_header.codec_flags().
+
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_LZMA = 2
+CODEC_ZSTD = 3
+CODEC_NAMES = {CODEC_NONE: "none", CODEC_ZLIB: "zlib", CODEC_LZMA: "lzma", CODEC_ZSTD: "zstd"}
+
+MIN_COMPRESS_SIZE = 256          # Smaller payloads are never compressed
+LARGE_PAYLOAD_SIZE = 64 * 1024   # From this size on the stronger codec is used
+SAMPLE_SIZE = 4096               # Bytes compressed by the incompressibility check
+MAX_SAMPLE_RATIO = 0.9           # Skip compression if the sample does not shrink below this
+
+
+def choose_codec(size):
+    """
+       Picks the codec for a payload of `size` bytes.
+
+       Returns:
+           int: CODEC_NONE below MIN_COMPRESS_SIZE, CODEC_ZLIB up to LARGE_PAYLOAD_SIZE, and
+                CODEC_ZSTD (if the zstandard package is installed) or CODEC_LZMA above it.
+       """
+    if size < MIN_COMPRESS_SIZE:
+        return CODEC_NONE
+    if size < LARGE_PAYLOAD_SIZE:
+        return CODEC_ZLIB
+    return CODEC_ZSTD if zstandard is not None else CODEC_LZMA
+
+
+def looks_compressible(data):
+    # Cheap check on a sample, so already compressed or encrypted data is not compressed again
+    sample = data[:SAMPLE_SIZE]
+    return len(zlib.compress(sample, 1)) < len(sample) * MAX_SAMPLE_RATIO
+
+
+def _compress(codec, data):
+    if codec == CODEC_ZLIB:
+        return zlib.compress(data, 6)
+    if codec == CODEC_LZMA:
+        return lzma.compress(data, preset=6)
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    raise ValueError(f"Unknown compression codec: {codec}")
+
+
+def compress_payload(data, codec=None):
+    """
+       Compresses a payload before encryption, if that makes it smaller.
+
+       Parameters:
+           data (bytes): The plaintext payload.
+           codec (int or None): CODEC_* to use, or None to pick one with choose_codec().
+
+       Returns:
+           tuple: (codec, data). codec is CODEC_NONE and data is unchanged if the payload is
+                  small, fails the incompressibility check, or would not shrink.
+
+       Raises:
+           ValueError: If the codec is unknown or not available.
+       """
+    if codec is None:
+        codec = choose_codec(len(data))
+        if codec != CODEC_NONE and not looks_compressible(data):
+            return CODEC_NONE, data
+    if codec == CODEC_NONE:
+        return CODEC_NONE, data
+    if codec == CODEC_ZSTD and zstandard is None:
+        raise ValueError("zstd compression needs the zstandard package.")
+    compressed = _compress(codec, data)
+    if len(compressed) >= len(data):
+        return CODEC_NONE, data
+    return codec, compressed
+
+
+def _decompress_errors(codec):
+    # Only looked up once decompression failed, so zstandard.ZstdError does not load the module
+    if codec == CODEC_ZSTD and zstandard is not None:
+        return zlib.error, lzma.LZMAError, zstandard.ZstdError
+    return zlib.error, lzma.LZMAError
+
+
+def decompress_payload(codec, data):
+    """
+       Reverses compress_payload().
+
+       Raises:
+           ValueError: If the codec is unknown or not available, or the data is corrupt.
+       """
+    try:
+        if codec == CODEC_NONE:
+            return data
+        if codec == CODEC_ZLIB:
+            return zlib.decompress(data)
+        if codec == CODEC_LZMA:
+            return lzma.decompress(data)
+        if codec == CODEC_ZSTD:
+            if zstandard is None:
+                raise ValueError("zstd decompression needs the zstandard package.")
+            return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    except _decompress_errors(codec) as e:
+        raise ValueError(f"Failed to decompress the payload: {e}")
+    raise ValueError(f"Unknown compression codec: {codec}")
@@ -1,32 +1,64 @@
-import random
+from keypair_pool import dh_pool, generate_dh_keypair
 
 # Step 1: Generate a shared prime p and base g
 p = 7919  # Example small prime (for real use, choose a large prime)
 g = 2     # Primitive root
 
 # Step 2: Each side chooses a private key
-a = random.randint(2, p - 2)  # Alice's private key
-# b = random.randint(2, p - 2)  # Bob's private key
-
 # Step 3: Each side computes their public key
-A = pow(g, a, p)  # Alice's public key
-# B = pow(g, b, p)  # Bob's public key
+# Both steps come from a pool of pre-generated keypairs (see keypair_pool.py), so the
+# private key is drawn with the secrets module and keygen is off the request path:
+# a, A = dh_pool(p, g).get()  # Alice's private and public key
+# b, B = dh_pool(p, g).get()  # Bob's private and public key
 
 # Step 4: Each side computes the shared secret key
 # S_Alice = pow(B, a, p)  # Alice computes shared key from Bob's public key
 # S_Bob = pow(A, b, p)    # Bob computes shared key from Alice's public key
 
-# Output
-print("Shared prime (p):", p)
-print("Primitive root (g):", g)
-print("\nAlice's private key (a):", a)
-print("Alice's public key (A):", A)
-# print("\nBob's private key (b):", b)
-# print("Bob's public key (B):", B)
-# print("\nAlice's shared secret:", S_Alice)
-# print("Bob's shared secret:", S_Bob)
-# print("Keys match:", S_Alice == S_Bob)
-
 def generate_dh_values():
+    # Returns (p, g, A, a) with a fresh keypair from the pool
+    a, A = dh_pool(p, g).get()
     return p, g, A, a
 
+
+# Groups read from a received image are untrusted: only the group above is pooled, and any other
+# group must have a modulus of a sane size before a key is generated for it.
+MIN_P_BITS = 2048
+MAX_P_BITS = 8192
+
+
+def check_dh_group(p_value, g_value, public_key=None):
+    """
+       Validates DH parameters received from a peer.
+
+       Parameters:
+           p_value (int): Prime modulus.
+           g_value (int): Generator.
+           public_key (int or None): The peer's public key, checked to lie in [2, p - 2] if given.
+
+       Raises:
+           ValueError: If the group is not the known group and its modulus is smaller than
+                       MIN_P_BITS or larger than MAX_P_BITS bits, or a value is out of range.
+       """
+    if (p_value, g_value) != (p, g) and not MIN_P_BITS <= p_value.bit_length() <= MAX_P_BITS:
+        raise ValueError(f"Unsupported DH group: the modulus must be {MIN_P_BITS} to {MAX_P_BITS} bits.")
+    if not 1 < g_value < p_value - 1:
+        raise ValueError("Invalid DH generator.")
+    if public_key is not None and not 1 < public_key < p_value - 1:
+        raise ValueError("Invalid DH public key.")
+
+
+def dh_keypair(p_value, g_value):
+    """
+       Returns a fresh (private, public) keypair for a group received from a peer.
+
+       The known group is served from the keypair pool. Any other group is validated and its
+       keypair generated inline, so groups from images never create pools or refill threads.
+
+       Raises:
+           ValueError: If the group is rejected by check_dh_group().
+       """
+    check_dh_group(p_value, g_value)
+    if (p_value, g_value) == (p, g):
+        return dh_pool(p, g).get()
+    return generate_dh_keypair(p_value, g_value)
@@ -1,14 +1,33 @@
-from PIL import Image
-import numpy as np
-from scipy.ndimage import generic_filter
 END_MARKER = "$t3g0$"
 from extract_dh_from_image_2 import extract_dh_from_image_standard_lsb
-from embed_dh_values_into_image_11 import embed_with_standard_lsb_without_AES
+from standard_lsb import embed_lsb_array
+from image_io import load_rgb_array, save_image
+from stego_header import METHOD_STANDARD_PLAINTEXT
+from capacity import STANDARD_LSB, check_capacity
+from x25519_key_exchange import embed_x25519_public_key, extract_x25519_public_key, is_x25519_key
+
+
+def embed_B(message, carrier):
+    # In-memory version of embed_B_into_image(): returns the stego image as an RGB array.
+    # An X25519 public key (32 bytes) is embedded in binary. The size is checked before decoding.
+    if is_x25519_key(message):
+        check_capacity(carrier, STANDARD_LSB, len(message), marker="")
+        return embed_x25519_public_key(message, load_rgb_array(carrier, writable=True), '1')
+    data = str(message).encode('latin-1')
+    check_capacity(carrier, STANDARD_LSB, len(data))
+    return embed_lsb_array(load_rgb_array(carrier, writable=True), data, END_MARKER, METHOD_STANDARD_PLAINTEXT)
+
+
 def embed_B_into_image(message, input_image, output_image):
-    embed_with_standard_lsb_without_AES(input_image, message, output_image)
+    save_image(embed_B(message, input_image), output_image)
     print(f" DH values ( B ) have been embedded into the image '{output_image}' successfully.")
 
 
 def extract_B_from_image(image):
+    # Returns B as a decimal string, or the 32-byte key for X25519 (None if not found)
+    image = load_rgb_array(image)
+    key = extract_x25519_public_key(image)
+    if key is not None:
+        return key
     b = extract_dh_from_image_standard_lsb(image)
     return b
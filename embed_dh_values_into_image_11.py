@@ -1,9 +1,9 @@
-from PIL import Image
-import numpy as np
-from PIL import Image
-import numpy as np
-from scipy.ndimage import generic_filter
-from lsb_with_variance_plaintext import embed_message_variance
+from lsb_with_variance_plaintext import embed_message_variance_array
+from standard_lsb import embed_lsb_bytes, embed_lsb_array
+from image_io import load_rgb_array, save_image
+from stego_header import METHOD_STANDARD_PLAINTEXT
+from capacity import check_capacity
+from x25519_key_exchange import embed_x25519_public_key, is_x25519_key
 END_MARKER = "$t3g0$" #Marker indicating end of message
 
 
@@ -13,9 +13,6 @@ def create_dh_message(p, g, A):
 def int_to_bin_str(x, bits=16):
     return format(x, f'0{bits}b')
 
-def message_to_bits(message):
-    return ''.join(format(ord(c), '08b') for c in message + END_MARKER)
-
 
 def embed_with_standard_lsb_without_AES(image_path, message, output_path):
     """
@@ -23,7 +20,7 @@ def embed_with_standard_lsb_without_AES(image_path, message, output_path):
      without any encryption (no AES involved).
 
      Each bit of the message is embedded into the least significant bit of each pixel component
-     (R, G, B) in a flattened version of the image data.
+     (R, G, B) through a flat view of the image data.
 
      Parameters:
          image_path (str): Path to the input image file (should be in RGB format).
@@ -36,23 +33,43 @@ def embed_with_standard_lsb_without_AES(image_path, message, output_path):
      Returns:
          None. The modified image is saved to the specified output path.
      """
-    img = Image.open(image_path)
-    img = img.convert("RGB")
-    data = np.array(img)
+    embed_lsb_bytes(image_path, message.encode('latin-1'), output_path, END_MARKER, METHOD_STANDARD_PLAINTEXT)
+
 
-    flat_data = data.flatten()
-    bits = message_to_bits(message)
+def embed_dh_values(p, g, A, carrier, method):
+    """
+       Embeds Diffie-Hellman values (p, g, A) into an image in memory.
 
-    if len(bits) > len(flat_data):
-        raise ValueError("Message is too long to embed in this image!")
+       With the X25519 backend (see x25519_key_exchange), p and g are None and A is the
+       32-byte public key, which is embedded in binary instead of as "p:g:A" text.
+
+       Parameters:
+           p (int or None): Prime number.
+           g (int or None): Generator.
+           A (int or bytes): Public key.
+           carrier: Path, bytes, file-like object, PIL image or RGB array of the carrier image.
+           method (str): '1' for standard LSB, '2' for variance-based.
 
-    for i in range(len(bits)):
-        flat_data[i] = (flat_data[i] & 254) | int(bits[i])
+       Returns:
+           np.ndarray: HxWx3 uint8 array of the image with the embedded DH values.
 
-    # reshape and save image
-    new_data = flat_data.reshape(data.shape)
-    new_img = Image.fromarray(new_data.astype(np.uint8))
-    new_img.save(output_path)
+       Raises:
+           ValueError: If the method is unknown or the message does not fit in the image.
+       """
+    # The size is checked before the carrier is decoded
+    if is_x25519_key(A):
+        check_capacity(carrier, method, len(A), marker="")
+        return embed_x25519_public_key(A, load_rgb_array(carrier, writable=True), method)
+    message = create_dh_message(p, g, A)
+    check_capacity(carrier, method, len(message.encode('latin-1')))
+    array = load_rgb_array(carrier, writable=True)
+    if method == '1':
+        embed_lsb_array(array, message.encode('latin-1'), END_MARKER, METHOD_STANDARD_PLAINTEXT)
+    elif method == '2':
+        embed_message_variance_array(message, array)
+    else:
+        raise ValueError("Invalid LSB method.")
+    return array
 
 
 def dh_key_generation_and_embedding(p, g, A, input_image, output_image, method):
@@ -60,9 +77,9 @@ def dh_key_generation_and_embedding(p, g, A, input_image, output_image, method):
        Embeds Diffie-Hellman values (p, g, A) into an image using the selected LSB method.
 
        Parameters:
-           p (int): Prime number.
-           g (int): Generator.
-           A (int): Public key.
+           p (int or None): Prime number (None for X25519).
+           g (int or None): Generator (None for X25519).
+           A (int or bytes): Public key (32 bytes for X25519).
            input_image (str): Path to input image.
            output_image (str): Path to save output image.
            method (str): '1' for standard LSB, '2' for variance-based.
@@ -70,16 +87,8 @@ def dh_key_generation_and_embedding(p, g, A, input_image, output_image, method):
        Returns:
            None. Saves the image with embedded DH values.
        """
-    message = create_dh_message(p, g, A)
-    if method == '1':
-        embed_with_standard_lsb_without_AES(input_image, message, output_image)
-        print(f" DH values (p, g, A) have been embedded into the image '{output_image}' successfully.")
-    elif method == '2':
-        embed_message_variance(message, input_image, output_image)
-        print(f" DH values (p, g, A) have been embedded into the image '{output_image}' successfully.")
-
-    else:
+    if method not in ('1', '2'):
         print(" Invalid LSB method.")
-
-
-
+        return
+    save_image(embed_dh_values(p, g, A, input_image, method), output_image)
+    print(f" DH values (p, g, A) have been embedded into the image '{output_image}' successfully.")
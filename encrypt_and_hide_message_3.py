@@ -1,36 +1,42 @@
-from Crypto.Cipher import AES
-from Crypto.Util.Padding import pad
-from hashlib import sha256
-from PIL import Image
-import numpy as np
-from scipy.ndimage import generic_filter
-from lsb_with_variance_aes import embed_message_variance
+from lazy_import import lazy_import
+from lsb_with_variance_aes import encrypt_payload
+from lsb_with_variance_plaintext import embed_payload_variance
+from standard_lsb import embed_lsb_bytes, embed_lsb_array
+from image_io import load_rgb_array, save_image
+from stego_header import METHOD_STANDARD_AES, METHOD_VARIANCE_AES, FLAG_HKDF, codec_flags
+from capacity import check_capacity
+from key_derivation import derive_key, ecb_cipher, INFO_MESSAGE
+from compression import compress_payload
+from instrumentation import stage
+
+AES = lazy_import("Crypto.Cipher.AES")
+padding = lazy_import("Crypto.Util.Padding")
 
 END_MARKER = "$t3g0$"
 
-def derive_aes_key(shared_secret):
-    # Convert the secret number to a string, then hash it to 256 bits
-    return sha256(str(shared_secret).encode()).digest()
+def derive_aes_key(shared_secret, hkdf=True):
+    # HKDF key of the shared secret (cached), or the old SHA-256 key if hkdf is False
+    return derive_key(shared_secret, INFO_MESSAGE, hkdf)
 
 def aes_encrypt_message(message, key):
+    return aes_encrypt_bytes(message.encode(), key)
+
+def aes_encrypt_bytes(data, key):
     cipher = AES.new(key, AES.MODE_ECB)
-    padded_msg = pad(message.encode(), AES.block_size)
+    padded_msg = padding.pad(data, AES.block_size)
     encrypted = cipher.encrypt(padded_msg)
     return encrypted
 
-def bytes_to_bits(byte_data):
-    return ''.join(format(byte, '08b') for byte in byte_data) + ''.join(format(ord(c), '08b') for c in END_MARKER)
-
 def embed_with_standard_lsb(image_path, cipher_bytes, output_path):
     """
        Embeds an encrypted byte sequence into an image using standard LSB (Least Significant Bit) steganography.
 
        The function modifies the least significant bit of each pixel component (R, G, B)
-       in the flattened image data to encode the provided ciphertext.
+       through a flat view of the image data to encode the provided ciphertext.
 
        Parameters:
            image_path (str): Path to the input image file (should be in RGB format).
-           cipher_bytes (bytes): Encrypted message as a bytes object to be embedded into the image.
+           cipher_bytes (bytes): Message encrypted with the key from derive_aes_key().
            output_path (str): Path to save the resulting image with the embedded message.
 
        Raises:
@@ -44,24 +50,52 @@ def embed_with_standard_lsb(image_path, cipher_bytes, output_path):
            - Assumes the input image is large enough to contain all the message bits.
            - Make sure to use a corresponding extraction function to retrieve the message.
        """
-    img = Image.open(image_path)
-    img = img.convert("RGB")
-    data = np.array(img)
-    flat = data.flatten()
+    embed_lsb_bytes(image_path, cipher_bytes, output_path, END_MARKER, METHOD_STANDARD_AES, FLAG_HKDF)
+    print(f" Encrypted message embedded into {output_path}")
 
-    bits = bytes_to_bits(cipher_bytes)
-    if len(bits) > len(flat):
-        raise ValueError("Message is too large to embed in image.")
+def encrypt_and_embed(message, S, carrier, method, compress=True, stride=None):
+    """
+        Encrypts a plaintext message and embeds it into an image in memory.
 
-    for i in range(len(bits)):
-        flat[i] = (flat[i] & 254) | int(bits[i])
+        Parameters:
+            message (str): The plaintext message to encrypt and embed.
+            S (str or int): Shared secret used to derive the AES encryption key.
+            carrier: Path, bytes, file-like object, PIL image or RGB array of the carrier image.
+            method (str): '1' for standard LSB with AES, '2' for variance-based adaptive LSB with AES.
+            compress (bool): Compress the message before encryption when that helps. The codec is
+                             recorded in the preamble/header (see compression.py).
+            stride (int or None): Method '2' only: block stride (1-4) of the dense multi-channel
+                                  variance mode (see variance_dense), or None for the classic mode.
 
-    embedded = flat.reshape(data.shape)
-    result_img = Image.fromarray(embedded.astype(np.uint8))
-    result_img.save(output_path)
-    print(f" Encrypted message embedded into {output_path}")
+        Returns:
+            np.ndarray: HxWx3 uint8 array of the image with the embedded message.
 
-def encrypt_and_embed_message(message, S, input_image, output_image, method):
+        Raises:
+            ValueError: If the method is unknown or the message does not fit in the image.
+                        The size is checked before the carrier is decoded.
+        """
+    S = str(S)
+    if method == '1':
+        codec, data = 0, message.encode()
+        if compress:
+            with stage("compress", bits=len(data) * 8):
+                codec, data = compress_payload(data)
+        with stage("encrypt"):
+            cipher_bytes = ecb_cipher(S).encrypt(padding.pad(data, AES.block_size))
+        check_capacity(carrier, method, len(cipher_bytes), END_MARKER)
+        array = load_rgb_array(carrier, writable=True)
+        embed_lsb_array(array, cipher_bytes, END_MARKER, METHOD_STANDARD_AES, codec_flags(codec) | FLAG_HKDF)
+    elif method == '2':
+        encrypted, flags = encrypt_payload(message, S, compress=compress)
+        if stride is None:
+            check_capacity(carrier, method, len(encrypted))
+        array = load_rgb_array(carrier, writable=True)
+        embed_payload_variance(array, encrypted, METHOD_VARIANCE_AES, flags, stride)
+    else:
+        raise ValueError("Invalid embedding method.")
+    return array
+
+def encrypt_and_embed_message(message, S, input_image, output_image, method, compress=True):
     """
         Encrypts a plaintext message and embeds it into an image using the selected steganographic method.
 
@@ -77,24 +111,20 @@ def encrypt_and_embed_message(message, S, input_image, output_image, method):
             method (str): Embedding method to use:
                           - '1' for standard LSB with AES encryption
                           - '2' for variance-based adaptive LSB (plaintext)
+            compress (bool): Compress the message before encryption when that helps.
 
         Returns:
             None. The image with the embedded message is saved to the specified output path.
 
         Notes:
-            - Requires functions: derive_aes_key(), aes_encrypt_message(), embed_with_standard_lsb(), embed_message_variance().
+            - Thin file-based wrapper around encrypt_and_embed().
             - The image must be large enough to contain the encrypted message.
-            - The global END_MARKER should be used inside embed_message_variance if needed.
         """
-    S = str(S)
-    if method == '1':
-        key = derive_aes_key(S)
-        cipher_bytes = aes_encrypt_message(message, key)
-        embed_with_standard_lsb(input_image, cipher_bytes, output_image)
-    elif method == '2':
-        embed_message_variance(message, input_image, output_image, S)
-    else:
+    if method not in ('1', '2'):
         print(" Invalid embedding method.")
+        return
+    save_image(encrypt_and_embed(message, S, input_image, method, compress), output_image)
+    print(f" Encrypted message embedded into {output_image}")
 
 
 
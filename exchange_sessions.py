@@ -0,0 +1,291 @@
+import json
+import secrets
+import sqlite3
+import threading
+import time
+
+from embed_dh_values_into_image_11 import embed_dh_values
+from extract_dh_from_image_2 import extract_dh_from_image
+from embed_and_extract_B_Into_Image_12 import embed_B, extract_B_from_image
+from encrypt_and_hide_message_3 import encrypt_and_embed
+from extract_and_decrypt_message_4 import extract_and_decrypt_message
+from x25519_key_exchange import x25519_shared_secret
+from keypair_pool import x25519_pool
+from key_derivation import derive_key, forget_secret
+import dh_key_exchange_10
+
+# Session-based key exchange.
+#
+# Every exchange has its own session record (keys, shared secret, state) in a session store,
+# instead of one shared_secret.txt per working directory. Records expire after a TTL.
+# Session states:
+#     'awaiting_response' - sender embedded its public key (step 1), waits for B
+#     'established'       - shared secret known (after step 2 on the receiver, step 3 on the sender)
+
+DEFAULT_TTL = 3600  # seconds
+
+
+class MemorySessionStore:
+    """
+       In-process session store with TTL eviction.
+
+       Parameters:
+           ttl (float): Seconds a session lives after it was last written.
+       """
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def get(self, session_id):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._sessions[session_id]
+                return None
+            return dict(entry[1])
+
+    def put(self, session_id, record):
+        with self._lock:
+            self._sessions[session_id] = (time.monotonic() + self.ttl, dict(record))
+            self._writes += 1
+            purge = self._writes % 1024 == 0
+        if purge:
+            self.purge_expired()
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def purge_expired(self):
+        """Removes expired sessions and returns how many were removed."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, (expires, _) in self._sessions.items() if expires <= now]
+            for key in expired:
+                del self._sessions[key]
+        return len(expired)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+
+def _encode(record):
+    # JSON with bytes values stored as {"__bytes__": hex}
+    return json.dumps({key: {"__bytes__": value.hex()} if isinstance(value, (bytes, bytearray)) else value
+                       for key, value in record.items()})
+
+
+def _decode(data):
+    record = json.loads(data)
+    return {key: bytes.fromhex(value["__bytes__"]) if isinstance(value, dict) and "__bytes__" in value else value
+            for key, value in record.items()}
+
+
+class SQLiteSessionStore:
+    """
+       Session store backed by an SQLite database, shared by processes that open the same file.
+
+       Parameters:
+           path (str): Database path (':memory:' for a private in-memory database).
+           ttl (float): Seconds a session lives after it was last written.
+       """
+
+    def __init__(self, path, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS sessions "
+                         "(id TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires)")
+
+    def get(self, session_id):
+        with self._lock:
+            row = self._db.execute("SELECT data FROM sessions WHERE id = ? AND expires > ?",
+                                   (session_id, time.time())).fetchone()
+        return _decode(row[0]) if row else None
+
+    def put(self, session_id, record):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO sessions (id, data, expires) VALUES (?, ?, ?)",
+                             (session_id, _encode(record), time.time() + self.ttl))
+
+    def delete(self, session_id):
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def purge_expired(self):
+        """Removes expired sessions and returns how many were removed."""
+        with self._lock:
+            return self._db.execute("DELETE FROM sessions WHERE expires <= ?", (time.time(),)).rowcount
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM sessions WHERE expires > ?", (time.time(),)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def derive_session_key(S):
+    # Same key the AES steps derive from the shared secret
+    return derive_key(S)
+
+
+class ExchangeManager:
+    """
+       Runs the four exchange steps as API calls keyed by a session ID.
+
+       Images are passed and returned in memory (see image_io for the accepted sources);
+       stego images are returned as HxWx3 uint8 arrays.
+
+       Parameters:
+           store (MemorySessionStore, SQLiteSessionStore or None): Session store.
+                                                                   Defaults to a new MemorySessionStore.
+       """
+
+    def __init__(self, store=None):
+        self.store = store if store is not None else MemorySessionStore()
+
+    def session(self, session_id):
+        """Returns the session record, or None if it does not exist or has expired."""
+        return self.store.get(session_id)
+
+    def _require(self, session_id, state=None):
+        record = self.store.get(session_id)
+        if record is None:
+            raise ValueError(f"Unknown or expired session: {session_id}")
+        if state is not None and record["state"] != state:
+            raise ValueError(f"Session {session_id} is '{record['state']}', expected '{state}'.")
+        return record
+
+    def _establish(self, record, S):
+        record["shared_secret"] = S
+        record["aes_key"] = derive_session_key(S)
+        record["state"] = "established"
+
+    def start(self, carrier, method, backend="dh", session_id=None):
+        """
+           Step 1 (sender): generates a keypair and embeds the public values into the carrier.
+
+           Parameters:
+               carrier: Carrier image.
+               method (str): '1' for standard LSB, '2' for variance-based LSB.
+               backend (str): 'dh' for classic Diffie-Hellman or 'x25519'.
+               session_id (str or None): Session ID to use. A random one is created if None.
+
+           Returns:
+               tuple: (session_id, stego image array).
+           """
+        if backend == "x25519":
+            p = g = None
+            private_key, public_key = x25519_pool().get()
+        elif backend == "dh":
+            p, g, public_key, private_key = dh_key_exchange_10.generate_dh_values()
+        else:
+            raise ValueError(f"Unknown key exchange backend: {backend!r}")
+        array = embed_dh_values(p, g, public_key, carrier, method)
+        session_id = session_id or secrets.token_urlsafe(16)
+        self.store.put(session_id, {"role": "sender", "backend": backend, "state": "awaiting_response",
+                                    "p": p, "g": g, "private_key": private_key, "public_key": public_key})
+        return session_id, array
+
+    def respond(self, dh_image, carrier, session_id=None):
+        """
+           Step 2 (receiver): extracts the sender's public values, embeds B and derives the secret.
+
+           Parameters:
+               dh_image: Image written by start().
+               carrier: Carrier image for B.
+               session_id (str or None): Session ID to use. A random one is created if None.
+
+           Returns:
+               tuple: (session_id, stego image array with B).
+
+           Raises:
+               ValueError: If the image holds no public values.
+           """
+        p, g, A = extract_dh_from_image(dh_image)
+        if isinstance(A, bytes):
+            backend = "x25519"
+            private_key, public_key = x25519_pool().get()
+            S = x25519_shared_secret(private_key, A)
+            array = embed_B(public_key, carrier)
+        elif A is not None:
+            backend = "dh"
+            dh_key_exchange_10.check_dh_group(p, g, A)
+            private_key, public_key = dh_key_exchange_10.dh_keypair(p, g)
+            S = pow(A, private_key, p)
+            array = embed_B(str(public_key), carrier)
+        else:
+            raise ValueError("No valid DH values found in the image.")
+        record = {"role": "receiver", "backend": backend, "p": p, "g": g, "private_key": private_key,
+                  "public_key": public_key, "peer_public_key": A}
+        self._establish(record, S)
+        session_id = session_id or secrets.token_urlsafe(16)
+        self.store.put(session_id, record)
+        return session_id, array
+
+    def complete(self, session_id, b_image):
+        """
+           Step 3a (sender): extracts B and derives the shared secret.
+
+           Returns:
+               The shared secret S (int for classic DH, hex string for X25519).
+
+           Raises:
+               ValueError: If the session is unknown or not waiting for B, or B is not found.
+           """
+        record = self._require(session_id, "awaiting_response")
+        B = extract_B_from_image(b_image)
+        if B is None:
+            raise ValueError("No public key B found in the image.")
+        if record["backend"] == "x25519":
+            if not isinstance(B, bytes):
+                raise ValueError("Expected an X25519 public key.")
+            S = x25519_shared_secret(record["private_key"], B)
+        else:
+            B = int(B)
+            S = pow(B, record["private_key"], record["p"])
+        record["peer_public_key"] = B
+        self._establish(record, S)
+        self.store.put(session_id, record)
+        return S
+
+    def send_message(self, session_id, message, carrier, method):
+        """Step 3b (sender): encrypts the message with the session secret and embeds it."""
+        record = self._require(session_id, "established")
+        return encrypt_and_embed(message, record["shared_secret"], carrier, method)
+
+    def receive_message(self, session_id, image, close=True):
+        """
+           Step 4 (receiver): extracts and decrypts a message with the session secret.
+
+           Parameters:
+               session_id (str): Receiver session.
+               image: Image written by send_message().
+               close (bool): If True, the session is deleted afterwards.
+
+           Returns:
+               str or None: The message, or None if it could not be recovered.
+           """
+        record = self._require(session_id, "established")
+        try:
+            return extract_and_decrypt_message(image, record["shared_secret"])
+        finally:
+            if close:
+                self.close(session_id)
+
+    def close(self, session_id):
+        # Also drops the session's derived keys and ciphers from the key cache
+        record = self.store.get(session_id)
+        self.store.delete(session_id)
+        if record is not None and record.get("shared_secret") is not None:
+            forget_secret(record["shared_secret"])
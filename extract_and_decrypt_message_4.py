@@ -1,23 +1,31 @@
-from Crypto.Cipher import AES
-from Crypto.Util.Padding import unpad
-from hashlib import sha256
-from PIL import Image
-import numpy as np
+from lazy_import import lazy_import
 from lsb_with_variance_aes import extract_message_variance
+from standard_lsb import extract_lsb_until_marker
+from image_io import describe_source, load_rgb_array
+from stego_probe import detect_method
+from standard_lsb import read_lsb_preamble
+from stego_header import FLAG_HKDF, flags_codec
+from key_derivation import derive_key, ecb_cipher, INFO_MESSAGE
+from compression import decompress_payload
+from instrumentation import stage
+
+AES = lazy_import("Crypto.Cipher.AES")
+padding = lazy_import("Crypto.Util.Padding")
+
 END_MARKER = "$t3g0$"
 
-def derive_aes_key(shared_secret):
-    return sha256(str(shared_secret).encode()).digest()
+def derive_aes_key(shared_secret, hkdf=True):
+    return derive_key(shared_secret, INFO_MESSAGE, hkdf)
 
 def extract_bits_from_image(image_path):
     """
        Extracts a hidden message from an image using standard LSB (Least Significant Bit) decoding.
 
-       The function reads the least significant bit of each pixel value (RGB flattened),
-       reconstructs the bitstream, converts it to bytes, and stops once it detects the END_MARKER.
+       The function reads the least significant bit of each pixel value (RGB flattened) in chunks,
+       packs the bits into bytes, and stops once it detects the END_MARKER.
 
        Parameters:
-           image_path (str): Path to the input image containing the embedded message.
+           image_path: Path, bytes, file-like object, PIL image or RGB array containing the message.
 
        Returns:
            bytes: The extracted hidden message as a bytes object, excluding the END_MARKER.
@@ -26,66 +34,68 @@ def extract_bits_from_image(image_path):
            The global variable END_MARKER must be defined (e.g. END_MARKER = "$t3g0$").
            The message must have been embedded using a matching LSB-based method.
        """
-    img = Image.open(image_path)
-    img = img.convert("RGB")
-    data = np.array(img).flatten()
-
-    bits = ""
-    for val in data:
-        bits += str(val & 1)
-
-    # Convert bits to bytes until END_MARKER appears
-    chars = [bits[i:i+8] for i in range(0, len(bits), 8)]
-    byte_list = []
-    current_text = ""
-    for char in chars:
-        char_val = chr(int(char, 2))
-        current_text += char_val
-        byte_list.append(int(char, 2))
-        if END_MARKER in current_text:
-            break
-
-    return bytes(byte_list[:-len(END_MARKER)])
+    data, found = extract_lsb_until_marker(image_path, END_MARKER)
+    if not found:
+        return data[:-len(END_MARKER)]
+    return data
 
 def aes_decrypt_message(cipher_bytes, key):
+    return aes_decrypt_bytes(cipher_bytes, key).decode()
+
+def aes_decrypt_bytes(cipher_bytes, key):
     cipher = AES.new(key, AES.MODE_ECB)
     decrypted = cipher.decrypt(cipher_bytes)
-    return unpad(decrypted, AES.block_size).decode()
+    return padding.unpad(decrypted, AES.block_size)
 
 
-def extract_and_decrypt_message(image, S, method):
+def extract_and_decrypt_message(image, S, method=None):
     S = str(S)
 
     """
     Extract and decrypt a hidden message from an image using the selected method.
 
     Parameters:
-        image (str): Path to the image.
+        image: Path, bytes, file-like object, PIL image or RGB array of the image.
         S (str or int): Shared secret for AES decryption.
-        method (str): Extraction method - '1' for regular LSB, '2' for variance-based.
+        method (str or None): Extraction method - '1' for regular LSB, '2' for variance-based,
+                              or None to detect it from the image.
+
+    Returns:
+        str or None: The decrypted message, or None if extraction or decryption failed.
     """
-    print(f"\n Trying to extract from image: {image}")
+    print(f"\n Trying to extract from image: {describe_source(image)}")
     print(f" Using shared secret (S) = {S}")
-    print(f" Method selected: {'LSB with AES' if method == '1' else 'Local Variance-based LSB'}")
+    image = load_rgb_array(image)
+    detected = method is None
+    if detected:
+        method = detect_method(image)
+    print(f" Method {'detected' if detected else 'selected'}: {'LSB with AES' if method == '1' else 'Local Variance-based LSB'}")
 
     if method == '1':
         # Method 1: Extract bits using regular LSB + decrypt AES
         cipher_data = extract_bits_from_image(image)
-        aes_key = derive_aes_key(S)
-        print(f" Derived AES key: {aes_key.hex()}")
+        preamble = read_lsb_preamble(image)
+        flags = preamble["flags"] if preamble is not None else 0
+        hkdf = bool(flags & FLAG_HKDF)
+        print(f" Derived AES key: {derive_aes_key(S, hkdf).hex()}")
         print(f" Extracted {len(cipher_data)} bytes from LSB")
 
         try:
-            message = aes_decrypt_message(cipher_data, aes_key)
+            with stage("decrypt"):
+                data = padding.unpad(ecb_cipher(S, hkdf).decrypt(cipher_data), AES.block_size)
+            with stage("decompress"):
+                message = decompress_payload(flags_codec(flags), data).decode()
             print(f" The message is:\n{message}")
+            return message
         except Exception as e:
             print(f" Failed to decrypt message: {e}")
 
     elif method == '2':
         # Method 2: Use variance-based extraction
         print(" Extracting message using local variance-based LSB...")
-        extract_message_variance(image, S)
+        return extract_message_variance(image, S) or None
 
     else:
         print(" Unknown method. Use '1' for LSB or '2' for variance-based.")
+    return None
 
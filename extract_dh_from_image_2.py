@@ -1,20 +1,21 @@
-from PIL import Image
-import numpy as np
-from scipy.ndimage import generic_filter
 END_MARKER = "$t3g0$"
 from lsb_with_variance_plaintext import extract_message_variance
+from standard_lsb import extract_lsb_until_marker
+from image_io import load_rgb_array
+from stego_probe import detect_method
+from x25519_key_exchange import extract_x25519_public_key
 
 
 def extract_dh_from_image_standard_lsb(image_path):
     """
        Extracts a Diffie-Hellman value embedded in an image using standard LSB steganography.
 
-       The function reads the least significant bit of each RGB value, reconstructs the bitstream,
-       converts it to characters, and stops once the END_MARKER is found. It returns the message
+       The function reads the least significant bit of each RGB value in chunks, packs the bits
+       into characters, and stops once the END_MARKER is found. It returns the message
        with the marker removed.
 
        Parameters:
-           image_path (str): Path to the image that contains the embedded DH value.
+           image_path: Path, bytes, file-like object, PIL image or RGB array with the embedded DH value.
 
        Returns:
            str or None: The extracted string without the END_MARKER if found; otherwise, None.
@@ -23,25 +24,9 @@ def extract_dh_from_image_standard_lsb(image_path):
            Requires a global variable END_MARKER (e.g., END_MARKER = "$t3g0$").
            The embedding method must use standard LSB encoding with a known end marker.
        """
-    img = Image.open(image_path)
-    img = img.convert("RGB")
-    data = np.array(img).flatten()
-
-    bits = ""
-    for value in data:
-        bits += str(value & 1)
-
-    # Divide into groups of 8 bits
-    chars = [bits[i:i+8] for i in range(0, len(bits), 8)]
-    message = ""
-    for char in chars:
-        decoded_char = chr(int(char, 2))
-        message += decoded_char
-        if END_MARKER in message:
-            break
-
-    if END_MARKER in message:
-        return message.replace(END_MARKER, "")
+    data, found = extract_lsb_until_marker(image_path, END_MARKER)
+    if found:
+        return data.decode('latin-1')
     else:
         return None
 
@@ -52,7 +37,7 @@ def parse_dh_values(message):
     except:
         return None, None, None
 
-def extract_dh_from_image(image, method):
+def extract_dh_from_image(image, method=None):
     """
         Extracts Diffie-Hellman parameters (p, g, A) from an image using the selected steganographic extraction method.
 
@@ -60,29 +45,40 @@ def extract_dh_from_image(image, method):
         - Standard LSB extraction (method '1')
         - Variance-based adaptive LSB extraction (method '2')
 
+        If no method is given, it is detected from the image itself (see stego_probe.detect_method()).
+
         Parameters:
-            image (str): Path to the image containing the embedded Diffie-Hellman values.
-            method (str): Extraction method to use:
+            image: Path, bytes, file-like object, PIL image or RGB array with the embedded DH values.
+            method (str or None): Extraction method to use:
                           - '1' for standard LSB
                           - '2' for variance-based adaptive LSB
+                          - None to detect it from the image
 
         Returns:
             tuple: A tuple (p, g, A) containing the extracted prime number, primitive root, and public key as integers.
+                   For an X25519 public key (see x25519_key_exchange) it is (None, None, key_bytes).
+                   (None, None, None) if the image holds no DH values.
 
         Notes:
             - Requires the presence of a global END_MARKER in the embedded message.
             - The message must be in the format: "<p>:<g>:<A>"
             - Depends on: extract_dh_from_image_standard_lsb(), extract_message_variance(), parse_dh_values().
         """
+    image = load_rgb_array(image)
+    key = extract_x25519_public_key(image)
+    if key is not None:
+        return None, None, key
+    if method is None:
+        method = detect_method(image)
+    message = None
     if method == '1':
         message = extract_dh_from_image_standard_lsb(image)
     elif method == '2':
-         message = extract_message_variance(image)
-    if message:
-        p, g, A = parse_dh_values(message)
-    else:
+        message = extract_message_variance(image)
+    if not message:
         print(" No valid message found in the image.")
-    return p, g, A
+        return None, None, None
+    return parse_dh_values(message)
 
 
 
@@ -0,0 +1,143 @@
+import io
+import os
+from lazy_import import lazy_import
+from instrumentation import stage
+
+Image = lazy_import("PIL.Image")
+np = lazy_import("numpy")
+
+
+def open_image(source):
+    """
+       Opens an image from any supported source and returns it as an RGB PIL image.
+
+       Parameters:
+           source: A file path (str or os.PathLike), encoded image bytes, a binary
+                   file-like object, a PIL.Image.Image or an HxWx3 uint8 np.ndarray.
+
+       Returns:
+           PIL.Image.Image: The image in RGB mode.
+
+       Raises:
+           TypeError: If the source type is not supported.
+       """
+    if isinstance(source, Image.Image):
+        img = source
+    elif isinstance(source, np.ndarray):
+        img = Image.fromarray(np.ascontiguousarray(source, dtype=np.uint8))
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        img = Image.open(io.BytesIO(source))
+    elif isinstance(source, (str, os.PathLike)) or hasattr(source, "read"):
+        img = Image.open(source)
+    else:
+        raise TypeError(f"Unsupported image source: {type(source).__name__}")
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    return img
+
+
+def image_size(source):
+    """
+       Returns the (width, height) of an image without decoding its pixels.
+
+       Encoded sources (paths, bytes, file-like objects) are opened with PIL, which only reads
+       the file header. File-like objects are rewound to where they were.
+
+       Parameters:
+           source: See open_image().
+
+       Returns:
+           tuple: (width, height) in pixels.
+       """
+    if isinstance(source, np.ndarray):
+        return source.shape[1], source.shape[0]
+    if isinstance(source, Image.Image):
+        return source.size
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        with Image.open(io.BytesIO(source)) as img:
+            return img.size
+    if hasattr(source, "read"):
+        position = source.tell()
+        try:
+            return Image.open(source).size
+        finally:
+            source.seek(position)
+    if isinstance(source, (str, os.PathLike)):
+        with Image.open(source) as img:
+            return img.size
+    raise TypeError(f"Unsupported image source: {type(source).__name__}")
+
+
+def describe_source(source):
+    # Short printable name of an image source, for status messages
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    return f"<in-memory {type(source).__name__}>"
+
+
+def load_rgb_array(source, writable=False):
+    """
+       Loads an image from any supported source as an HxWx3 uint8 array.
+
+       Parameters:
+           source: See open_image().
+           writable (bool): If True, the returned array is a private copy that can be
+                            modified in place. Otherwise it may be a read-only view.
+
+       Returns:
+           np.ndarray: The RGB pixel data.
+       """
+    if isinstance(source, np.ndarray) and source.ndim == 3 and source.dtype == np.uint8:
+        return source.copy() if writable else source
+    with stage("decode") as s:
+        img = open_image(source)
+        array = np.array(img) if writable else np.asarray(img)
+        s.pixels = img.width * img.height
+    return array
+
+
+def encode_image(array, format="PNG"):
+    """Encodes an RGB array into image file bytes (PNG by default)."""
+    buffer = io.BytesIO()
+    with stage("encode", pixels=array.shape[0] * array.shape[1]):
+        Image.fromarray(array).save(buffer, format=format)
+    return buffer.getvalue()
+
+
+def save_image(array, destination, format=None):
+    """
+       Writes an RGB array to a file path or a binary file-like object.
+
+       Parameters:
+           array (np.ndarray): HxWx3 uint8 image data.
+           destination (str, os.PathLike or file-like): Where to write the image.
+           format (str or None): Image format. Defaults to PNG for file-like objects and
+                                 to the file extension for paths.
+       """
+    if format is None and hasattr(destination, "write"):
+        format = "PNG"
+    with stage("encode_save", pixels=array.shape[0] * array.shape[1]):
+        Image.fromarray(array).save(destination, format=format)
+
+
+def convert_output(array, output="array"):
+    """
+       Converts a stego image array into the requested return type.
+
+       Parameters:
+           array (np.ndarray): HxWx3 uint8 image data.
+           output (str): 'array' for np.ndarray, 'pil' for PIL.Image.Image or 'bytes' for PNG bytes.
+
+       Returns:
+           The image in the requested form.
+
+       Raises:
+           ValueError: If the output type is unknown.
+       """
+    if output == "array":
+        return array
+    if output == "pil":
+        return Image.fromarray(array)
+    if output == "bytes":
+        return encode_image(array)
+    raise ValueError(f"Unknown output type: {output!r}")
@@ -0,0 +1,231 @@
+import contextlib
+import json
+import logging
+import threading
+import time
+import tracemalloc
+
+# Opt-in per-stage instrumentation for the embed/extract pipeline.
+#
+# The pipeline modules wrap their stages in `with stage("name", pixels=..., bits=...):`.
+# While no sink is registered, stage() returns a shared no-op context manager, so the
+# only cost is one list check per stage. Register a sink with instrument():
+#
+#     counters = PrometheusCounters()
+#     with instrument(counters, memory=True):
+#         embed_message_variance(message, "horse.png", "out.png")
+#     print(counters.render())
+#
+# `with stage(...) as s:` also allows setting s.pixels / s.bits once they are known.
+# Every finished stage is reported to the sinks as a dict:
+#     {"stage", "seconds", "pixels", "bits", "peak_bytes"}
+# peak_bytes is the peak of new Python/NumPy allocations during the stage (tracemalloc),
+# or None when memory tracing is off. The tracemalloc peak is shared by the whole process, so
+# while memory is traced, the outermost stages of different threads run one at a time.
+
+_sinks = []
+_sinks_lock = threading.Lock()
+_memory_users = 0
+_local = threading.local()
+_memory_lock = threading.Lock()  # Held by the thread whose memory-traced stages are running
+
+
+class _NullStage:
+    # Shared no-op stage. Fields set on it inside a with block are ignored.
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name, pixels=0, bits=0):
+    """
+       Returns a context manager that times one pipeline stage.
+
+       Parameters:
+           name (str): Stage name, e.g. 'variance_map'.
+           pixels (int): Number of pixels the stage processes.
+           bits (int): Number of payload bits the stage writes or reads.
+
+       Returns:
+           A context manager. A shared no-op one if instrumentation is disabled.
+           pixels and bits can also be set on the entered object, e.g. once the image is decoded.
+       """
+    if not _sinks:
+        return _NULL_STAGE
+    return _Stage(name, pixels, bits)
+
+
+class _Stage:
+    __slots__ = ("name", "pixels", "bits", "start", "mem_start", "mem_peak", "locked")
+
+    def __init__(self, name, pixels, bits):
+        self.name = name
+        self.pixels = pixels
+        self.bits = bits
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        self.mem_start = self.mem_peak = None
+        # Nested stages run under the lock of the enclosing stage that took it
+        self.locked = tracemalloc.is_tracing() and not any(entered.locked for entered in stack)
+        if self.locked:
+            _memory_lock.acquire()
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if stack and stack[-1].mem_peak is not None:
+                stack[-1].mem_peak = max(stack[-1].mem_peak, peak)
+            tracemalloc.reset_peak()
+            self.mem_start = self.mem_peak = current
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        stack = _local.stack
+        stack.pop()
+        peak_bytes = None
+        try:
+            if self.mem_start is not None and tracemalloc.is_tracing():
+                peak = max(self.mem_peak, tracemalloc.get_traced_memory()[1])
+                peak_bytes = peak - self.mem_start
+                # Nested stages reset the tracemalloc peak, so hand ours on to the enclosing stage
+                if stack and stack[-1].mem_peak is not None:
+                    stack[-1].mem_peak = max(stack[-1].mem_peak, peak)
+                tracemalloc.reset_peak()
+        finally:
+            if self.locked:
+                _memory_lock.release()
+        _emit({"stage": self.name, "seconds": seconds, "pixels": int(self.pixels), "bits": int(self.bits),
+               "peak_bytes": peak_bytes})
+        return False
+
+
+def _emit(record):
+    for sink in list(_sinks):
+        sink(record)
+
+
+def add_sink(sink, memory=False):
+    """
+       Registers a callable that receives one record per finished stage.
+
+       Parameters:
+           sink (callable): Called with the stage record dict.
+           memory (bool): If True, tracemalloc is started (if needed) to report peak_bytes.
+                          Stages of different threads then run one at a time.
+       """
+    global _memory_users
+    with _sinks_lock:
+        _sinks.append(sink)
+        if memory:
+            if _memory_users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+            _memory_users += 1
+
+
+def remove_sink(sink, memory=False):
+    """Unregisters a sink added with add_sink(). Pass the same memory flag."""
+    global _memory_users
+    with _sinks_lock:
+        _sinks.remove(sink)
+        if memory:
+            _memory_users -= 1
+            if _memory_users == 0 and tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+
+@contextlib.contextmanager
+def instrument(sink=None, memory=False):
+    """
+       Enables instrumentation for the duration of a with block.
+
+       Parameters:
+           sink (callable or None): Receives one record per stage. If None, records are collected
+                                    in the list yielded by the context manager.
+           memory (bool): Also measure peak allocations per stage with tracemalloc (stages of
+                          different threads then run one at a time).
+
+       Yields:
+           The sink (or the list of collected records if no sink was given).
+       """
+    records = None
+    if sink is None:
+        records = []
+        sink = records.append
+    add_sink(sink, memory)
+    try:
+        yield records if records is not None else sink
+    finally:
+        remove_sink(sink, memory)
+
+
+def log_sink(logger=None, level=logging.INFO):
+    """
+       Returns a sink that writes every stage record as one JSON log line.
+
+       Parameters:
+           logger (logging.Logger or None): Logger to use. Defaults to the 'stego.instrumentation' logger.
+           level (int): Log level.
+       """
+    logger = logger or logging.getLogger("stego.instrumentation")
+
+    def sink(record):
+        logger.log(level, json.dumps(record))
+    return sink
+
+
+class PrometheusCounters:
+    """
+       Sink that aggregates stage records into Prometheus-style counters.
+
+       Per stage it keeps the number of calls, total seconds, pixels and bits, and the largest
+       peak allocation seen. render() returns them in the Prometheus text exposition format.
+
+       Parameters:
+           prefix (str): Prefix of the metric names.
+       """
+
+    def __init__(self, prefix="stego_stage"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.stages = {}
+
+    def __call__(self, record):
+        with self._lock:
+            totals = self.stages.setdefault(record["stage"], {"calls": 0, "seconds": 0.0, "pixels": 0,
+                                                              "bits": 0, "peak_bytes": 0})
+            totals["calls"] += 1
+            totals["seconds"] += record["seconds"]
+            totals["pixels"] += record["pixels"]
+            totals["bits"] += record["bits"]
+            if record["peak_bytes"] is not None:
+                totals["peak_bytes"] = max(totals["peak_bytes"], record["peak_bytes"])
+
+    def render(self):
+        metrics = [("calls_total", "counter", "calls", "Number of times the stage ran."),
+                   ("seconds_total", "counter", "seconds", "Wall time spent in the stage."),
+                   ("pixels_total", "counter", "pixels", "Pixels processed by the stage."),
+                   ("bits_total", "counter", "bits", "Payload bits written or read by the stage."),
+                   ("peak_bytes", "gauge", "peak_bytes", "Largest peak allocation seen in the stage.")]
+        lines = []
+        with self._lock:
+            for suffix, kind, field, help_text in metrics:
+                name = f"{self.prefix}_{suffix}"
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for stage_name, totals in sorted(self.stages.items()):
+                    lines.append(f'{name}{{stage="{stage_name}"}} {totals[field]}')
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,143 @@
+import threading
+import time
+from collections import OrderedDict
+from hashlib import sha256
+
+from lazy_import import lazy_import
+
+AES = lazy_import("Crypto.Cipher.AES")
+SHA256 = lazy_import("Crypto.Hash.SHA256")
+KDF = lazy_import("Crypto.Protocol.KDF")
+
+# Key derivation for every AES path.
+#
+# New images derive their keys with HKDF-SHA256 (fixed salt, one `info` label per use) and set
+# FLAG_HKDF in their header or preamble. Images without the flag were written with the old
+# SHA-256(str(secret)) key, which legacy_key() still provides.
+#
+# Derived keys and ECB cipher objects are kept in a bounded LRU cache with a TTL, keyed by the
+# shared secret (one per exchange session), so a receiver decrypting many images of the same
+# session derives the key and builds the cipher once.
+
+KDF_SALT = b"lsb-stego/kdf/v1"
+INFO_MESSAGE = b"aes-256-ecb message key"
+INFO_STREAM = b"aes-256-gcm stream key"
+KEY_SIZE = 32
+
+DEFAULT_CACHE_SIZE = 256
+DEFAULT_CACHE_TTL = 3600  # seconds
+
+
+def hkdf_key(secret, info=INFO_MESSAGE, salt=KDF_SALT):
+    """
+       Derives a 32-byte key from a shared secret with HKDF-SHA256 (uncached).
+
+       Parameters:
+           secret (str, int or bytes): The shared secret. Non-bytes values are used as str(secret).
+           info (bytes): Context label, so different uses get independent keys.
+           salt (bytes): HKDF salt.
+
+       Returns:
+           bytes: The derived key.
+       """
+    return KDF.HKDF(_secret_bytes(secret), KEY_SIZE, salt, SHA256, context=info)
+
+
+def legacy_key(secret):
+    # Key of images written before FLAG_HKDF: SHA-256 of the secret's text
+    return sha256(_secret_bytes(secret)).digest()
+
+
+def _secret_bytes(secret):
+    return bytes(secret) if isinstance(secret, (bytes, bytearray)) else str(secret).encode()
+
+
+class KeyCache:
+    """
+       Thread-safe LRU cache with a TTL, for derived keys and cipher objects.
+
+       Parameters:
+           max_entries (int): Entries kept at most; the least recently used one is evicted first.
+           ttl (float): Seconds an entry lives after it was created.
+       """
+
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, factory):
+        """Returns the cached value for key, calling factory() to create it on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        value = factory()
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def forget(self, secret):
+        """Drops every entry derived from secret (e.g. when its session is closed)."""
+        secret = _secret_bytes(secret)
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == secret]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "max_entries": self.max_entries,
+                    "hits": self.hits, "misses": self.misses}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+key_cache = KeyCache()
+
+
+def derive_key(secret, info=INFO_MESSAGE, hkdf=True):
+    """
+       Returns the cached AES key for a shared secret.
+
+       Parameters:
+           secret (str, int or bytes): The shared secret.
+           info (bytes): HKDF context label (ignored for legacy keys).
+           hkdf (bool): HKDF key if True, legacy SHA-256 key if False (images without FLAG_HKDF).
+
+       Returns:
+           bytes: 32-byte AES key.
+       """
+    if hkdf:
+        return key_cache.get((_secret_bytes(secret), "hkdf", info), lambda: hkdf_key(secret, info))
+    return key_cache.get((_secret_bytes(secret), "legacy"), lambda: legacy_key(secret))
+
+
+def ecb_cipher(secret, hkdf=True):
+    """
+       Returns a cached AES-ECB cipher object for the message key of a shared secret.
+
+       ECB objects keep no state between calls, so one object serves every message of a session.
+       """
+    return key_cache.get((_secret_bytes(secret), "ecb", hkdf),
+                         lambda: AES.new(derive_key(secret, INFO_MESSAGE, hkdf), AES.MODE_ECB))
+
+
+def forget_secret(secret):
+    """Evicts the keys and ciphers of a shared secret from the cache."""
+    key_cache.forget(secret)
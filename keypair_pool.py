@@ -0,0 +1,139 @@
+import secrets
+import threading
+from collections import deque
+from x25519_key_exchange import generate_x25519_keypair
+
+
+def generate_dh_keypair(p, g):
+    """
+       Generates a classic Diffie-Hellman keypair with the secrets module.
+
+       Parameters:
+           p (int): Prime modulus.
+           g (int): Generator.
+
+       Returns:
+           tuple: (private_key, public_key) with 2 <= private_key <= p - 2.
+       """
+    private_key = 2 + secrets.randbelow(p - 3)
+    return private_key, pow(g, private_key, p)
+
+
+class KeypairPool:
+    """
+       Pool of pre-generated keypairs, refilled by a background thread.
+
+       get() takes a keypair from the pool (a hit) or, if the pool is empty, generates one
+       inline (a miss). Whenever the pool drops to the low watermark, the refill thread
+       generates keypairs until it is back at the target depth. Every keypair is handed out once.
+
+       Parameters:
+           factory (callable): Called without arguments, returns a new (private, public) keypair.
+           depth (int): Target number of keypairs kept ready.
+           low_water (int): Refill starts when the pool holds this many keypairs or fewer.
+           start (bool): If True, the refill thread is started (and the pool filled) right away.
+       """
+
+    def __init__(self, factory, depth=32, low_water=8, start=True):
+        if not 0 <= low_water < depth:
+            raise ValueError("low_water must be between 0 and depth - 1.")
+        self.factory = factory
+        self.depth = depth
+        self.low_water = low_water
+        self._keys = deque()
+        self._lock = threading.Lock()
+        self._refill = threading.Event()
+        self._closed = False
+        self._thread = None
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        if start:
+            self.start()
+
+    def start(self):
+        # Starts the refill thread (once)
+        with self._lock:
+            if self._thread is not None or self._closed:
+                return
+            self._thread = threading.Thread(target=self._run, name="keypair-pool", daemon=True)
+            self._thread.start()
+        self._refill.set()
+
+    def _run(self):
+        while True:
+            self._refill.wait()
+            if self._closed:
+                return
+            self._refill.clear()
+            while not self._closed and len(self._keys) < self.depth:
+                keypair = self.factory()
+                with self._lock:
+                    self._keys.append(keypair)
+                    self.generated += 1
+
+    def get(self):
+        """Returns a fresh (private, public) keypair."""
+        with self._lock:
+            if self._keys:
+                keypair = self._keys.popleft()
+                self.hits += 1
+            else:
+                keypair = None
+                self.misses += 1
+            low = len(self._keys) <= self.low_water
+        if low and self._thread is not None:
+            self._refill.set()
+        if keypair is None:
+            keypair = self.factory()
+            with self._lock:
+                self.generated += 1
+        return keypair
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._keys), "depth": self.depth, "hits": self.hits,
+                    "misses": self.misses, "generated": self.generated}
+
+    def close(self):
+        """Stops the refill thread and drops the pooled keypairs."""
+        self._closed = True
+        self._refill.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            self._keys.clear()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(key, factory):
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = KeypairPool(factory)
+        return pool
+
+
+def dh_pool(p, g):
+    """
+       Returns the module-wide pool of classic DH keypairs for the group (p, g), creating it on first use.
+
+       Every group gets its own pool and refill thread for the life of the process, so only pass
+       trusted groups. Use dh_key_exchange_10.dh_keypair() for groups read from an image.
+       """
+    return _get_pool(("dh", p, g), lambda: generate_dh_keypair(p, g))
+
+
+def x25519_pool():
+    """Returns the module-wide pool of X25519 keypairs, creating it on first use."""
+    return _get_pool(("x25519",), generate_x25519_keypair)
+
+
+def pool_stats():
+    """Returns {pool name: stats} for every pool created so far."""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {":".join(map(str, key)): pool.stats() for key, pool in pools.items()}
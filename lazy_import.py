@@ -0,0 +1,57 @@
+import importlib
+import importlib.util
+import sys
+import types
+
+# Deferred imports of heavy dependencies (NumPy, PIL, PyCryptodome, zstandard).
+#
+# lazy_import() returns a stand-in module that imports the real one on first attribute access,
+# so importing a module of this project does not load them:
+#
+#     np = lazy_import("numpy")
+#     Image = lazy_import("PIL.Image")
+#
+# The real import goes through importlib.import_module(), which holds the import lock, so
+# threads touching a stand-in at the same time (e.g. a keypair pool refill thread) are safe.
+# A missing dependency is still reported at import time, since its spec is looked up eagerly.
+# Names imported with `from package import name` are bound at import time and would load the
+# module, so the importing code keeps the module and accesses its attributes on use.
+
+
+class LazyModule(types.ModuleType):
+    """Stand-in for a module that is imported on first attribute access."""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self._module = None
+
+    def __getattr__(self, attr):
+        # Only called for attributes the stand-in itself does not have
+        module = self._module
+        if module is None:
+            module = self._module = importlib.import_module(self.__name__)
+        return getattr(module, attr)
+
+    def __repr__(self):
+        return f"<lazy module {self.__name__!r} ({'loaded' if self._module is not None else 'not loaded'})>"
+
+
+def lazy_import(name):
+    """
+       Returns a module that is imported on first attribute access.
+
+       Parameters:
+           name (str): Absolute module name, e.g. 'numpy' or 'Crypto.Cipher.AES'.
+
+       Returns:
+           module: The module itself if it was already imported, otherwise a LazyModule.
+
+       Raises:
+           ModuleNotFoundError: If the module does not exist.
+       """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    if importlib.util.find_spec(name) is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    return LazyModule(name)
@@ -1,23 +1,32 @@
-from PIL import Image
-import numpy as np
-from scipy.ndimage import generic_filter
 import re
-from Crypto.Cipher import AES
-from Crypto.Hash import SHA256
-from Crypto.Util.Padding import pad, unpad
+from lazy_import import lazy_import
+from variance_cache import cached_variance_map
+from variance_kernel import extract_bits
+from image_io import load_rgb_array, save_image
+from instrumentation import stage
+from stego_header import (HEADER_BITS, METHOD_VARIANCE_AES, FLAG_BINARY, FLAG_HKDF, codec_flags, flags_codec,
+                          unpack_header)
+from key_derivation import ecb_cipher
+from compression import CODEC_NONE, compress_payload, decompress_payload
+from capacity import VARIANCE_LSB, check_capacity
+from lsb_with_variance_plaintext import embed_payload_variance, extract_payload_variance
+
+Image = lazy_import("PIL.Image")
+np = lazy_import("numpy")
+AES = lazy_import("Crypto.Cipher.AES")
+padding = lazy_import("Crypto.Util.Padding")
 
 END_MARKER = "$t3g0$"
+LEGACY_HEADER_BITS = 300 * 8  # More space to accommodate a long header (old text format)
 # S = "123456" # The password for sharing
 
 
-def get_aes_key(password):
-    return SHA256.new(password.encode()).digest()
-
-
 def encrypt_message(message, password):
     """
        Encrypts a message using AES (ECB mode) and returns it as a hex string.
 
+       The hex format is read by older versions, so it keeps the legacy SHA-256 key.
+
        Parameters:
            message (str): The plaintext to encrypt.
            password (str): Password used to derive the AES key.
@@ -25,10 +34,11 @@ def encrypt_message(message, password):
        Returns:
            str: Encrypted message as hex.
        """
-    key = get_aes_key(password)
-    cipher = AES.new(key, AES.MODE_ECB)
-    ciphertext = cipher.encrypt(pad(message.encode(), AES.block_size))
-    return ciphertext.hex()
+    return encrypt_bytes(message.encode(), password, hkdf=False).hex()
+
+
+def encrypt_bytes(data, password, hkdf=True):
+    return ecb_cipher(password, hkdf).encrypt(padding.pad(data, AES.block_size))
 
 
 def decrypt_message(hex_ciphertext, password):
@@ -42,120 +52,96 @@ def decrypt_message(hex_ciphertext, password):
      Returns:
          str: Decrypted plaintext message.
      """
-    key = get_aes_key(password)
-    cipher = AES.new(key, AES.MODE_ECB)
-    ciphertext = bytes.fromhex(hex_ciphertext)
-    return unpad(cipher.decrypt(ciphertext), AES.block_size).decode()
+    return decrypt_bytes(bytes.fromhex(hex_ciphertext), password, hkdf=False).decode()
 
 
-def local_variance(block):
-    return np.var(block)
+def decrypt_bytes(ciphertext, password, hkdf=True):
+    return padding.unpad(ecb_cipher(password, hkdf).decrypt(ciphertext), AES.block_size)
 
 
-def embed_message_variance(message, input_image, output_image ,sign):
+def embed_message_variance(message, input_image, output_image ,sign, binary=True, compress=True, stride=None):
     """
        Encrypts and embeds a message into an image using variance-based LSB steganography.
 
        Parameters:
            message (str): Message to encrypt and embed.
-           input_image (str): Path to the source image (RGB).
-           output_image (str): Path to save the output image.
+           input_image: Path, bytes, file-like object, PIL image or RGB array of the carrier.
+           output_image (str or file-like): Where to save the output image.
            sign (int): Shared secret for AES encryption.
+           binary (bool): Embed the raw ciphertext (default). If False, its hex text is embedded
+                          as before, which takes twice the bits.
+           compress (bool): Compress the message before encryption when that helps (binary mode
+                            only, see compression.compress_payload()).
+           stride (int or None): None for the classic red-channel mode, or the block stride (1-4)
+                                 of the dense multi-channel mode (see variance_dense).
 
        Returns:
            None. Saves the image with the embedded message.
-       """
-    img = Image.open(input_image).convert("RGB")
-    array = np.array(img)
-    gray = img.convert("L")
-    gray_arr = np.array(gray)
-
-    var_map = generic_filter(gray_arr, local_variance, size=3, mode='reflect')
-    min_var = np.min(var_map)
-    max_var = np.max(var_map)
-    step = (max_var - min_var) / 6 if max_var > min_var else 1
-
-    encrypted = encrypt_message(message + END_MARKER, sign)
-    enc_len = len(encrypted)
-    header = f"{min_var:.6f},{max_var:.6f}|{enc_len:04X}"
-    full_message = header + "|" + encrypted
-
-    bits = ''.join(f"{ord(c):08b}" for c in full_message)
-    lsb_pairs = [(0, 1), (0, 2), (0, 3), (1, 2), (1, 3), (2, 3)]
-
-    idx = 0
-    for y in range(1, array.shape[0] - 1, 3):
-        for x in range(1, array.shape[1] - 1, 3):
-            if idx >= len(bits):
-                break
-            var = var_map[y, x]
-            bin_idx = int((var - min_var) / step) if step else 0
-            bin_idx = min(bin_idx, 5)
-            pos1, pos2 = lsb_pairs[bin_idx]
-            r = array[y, x, 0]
-            if idx + 2 <= len(bits):
-                b1, b2 = int(bits[idx]), int(bits[idx + 1])
-                mask1 = ~(1 << pos1) & 0xFF
-                mask2 = ~(1 << pos2) & 0xFF
-                r = (r & mask1) | (b1 << pos1)
-                r = (r & mask2) | (b2 << pos2)
-                array[y, x, 0] = r
-                idx += 2
-        if idx >= len(bits):
-            break
 
-    out = Image.fromarray(array)
-    out.save(output_image)
+       Raises:
+           ValueError: If the encrypted message does not fit (checked before the carrier is decoded).
+       """
+    encrypted, flags = encrypt_payload(message, sign, binary, compress)
+    # The dense capacity depends on the pixels; embed_payload_dense() checks an upper bound first
+    if stride is None:
+        check_capacity(input_image, VARIANCE_LSB, len(encrypted))
+    array = load_rgb_array(input_image, writable=True)
+    embed_payload_variance(array, encrypted, METHOD_VARIANCE_AES, flags, stride)
+    save_image(array, output_image)
     print(f" Encrypted message embedded into {output_image}")
 
 
-def extract_message_variance(input_image, sign):
+def embed_message_variance_array(message, array, sign, binary=True, compress=True, stride=None):
     """
-       Extracts and decrypts a hidden message from an image using variance-based LSB steganography.
-
-       This function first extracts an embedded header that contains the variance range
-       and the encrypted message length. Then it adaptively extracts bits from the image
-       based on local variance and finally decrypts the message using the shared secret.
+       In-memory version of embed_message_variance().
 
        Parameters:
-           input_image (str): Path to the image containing the hidden encrypted message.
-           sign (int): Shared secret used for AES decryption of the message.
+           message (str): Message to encrypt and embed.
+           array (np.ndarray): Writable HxWx3 uint8 RGB image data, modified in place.
+           sign (int): Shared secret for AES encryption.
+           binary (bool): Embed the raw ciphertext (default) instead of its hex text.
+           compress (bool): Compress the message before encryption when that helps (binary mode only).
+           stride (int or None): Block stride of the dense mode, or None for the classic mode.
 
        Returns:
-           str: The decrypted plaintext message, or an empty string if extraction or decryption fails.
+           np.ndarray: The same array, with the encrypted message embedded.
 
-       Notes:
-           - The message must be embedded using the `embed_message_variance` function.
-           - The function expects a header format of: "<min_var>,<max_var>|<len>|"
-           - LSB pairs are selected dynamically using 6 variance bins.
-           - The message is expected to end with the global END_MARKER (e.g. "$t3g0$").
+       Raises:
+           ValueError: If the encrypted message does not fit in the image.
        """
-    img = Image.open(input_image).convert("RGB")
-    array = np.array(img)
-    gray = img.convert("L")
-    gray_arr = np.array(gray)
-    var_map = generic_filter(gray_arr, local_variance, size=3, mode='reflect')
-    lsb_pairs = [(0, 1), (0, 2), (0, 3), (1, 2), (1, 3), (2, 3)]
-
-    header_bits = []
-    max_header_bits = 300 * 8  # More space to accommodate a long header
-    for y in range(1, gray_arr.shape[0] - 1, 3):
-        for x in range(1, gray_arr.shape[1] - 1, 3):
-            r = array[y, x, 0]
-            pos1, pos2 = lsb_pairs[0]
-            header_bits.append(str((r >> pos1) & 1))
-            header_bits.append(str((r >> pos2) & 1))
-            if len(header_bits) >= max_header_bits:
-                break
-        if len(header_bits) >= max_header_bits:
-            break
+    encrypted, flags = encrypt_payload(message, sign, binary, compress)
+    return embed_payload_variance(array, encrypted, METHOD_VARIANCE_AES, flags, stride)
+
+
+def encrypt_payload(message, sign, binary=True, compress=True):
+    # Returns (payload bytes, header flags): the raw ciphertext, or its hex text if binary is False
+    codec = CODEC_NONE
+    if binary:
+        data = message.encode()
+        if compress:
+            with stage("compress", bits=len(data) * 8):
+                codec, data = compress_payload(data)
+        with stage("encrypt"):
+            encrypted = encrypt_bytes(data, sign)
+    else:
+        with stage("encrypt"):
+            encrypted = encrypt_message(message + END_MARKER, sign).encode('ascii')
+    flags = (FLAG_BINARY | FLAG_HKDF | codec_flags(codec)) if binary else 0
+    return encrypted, flags
+
+
+def parse_legacy_header(header_bytes):
+    """
+       Parses the old text header "<min_var>,<max_var>|<len>|" read with the first LSB pair.
+
+       Parameters:
+           header_bytes (bytes): The first bytes of the carrier grid.
 
+       Returns:
+           tuple or None: (min_var, max_var, enc_len, enc_start) or None if no valid header was found.
+       """
     header = ''
-    for i in range(0, len(header_bits), 8):
-        byte = ''.join(header_bits[i:i + 8])
-        if len(byte) < 8:
-            break
-        char = chr(int(byte, 2))
+    for char in header_bytes.decode('latin-1'):
         header += char
         if re.search(r'^\d+\.\d{6},\d+\.\d{6}\|[0-9A-Fa-f]{4}\|', header):
             break
@@ -163,53 +149,94 @@ def extract_message_variance(input_image, sign):
     pattern = r'^(\d+\.\d{6}),(\d+\.\d{6})\|([0-9A-Fa-f]{4})\|'
     match = re.match(pattern, header)
     if not match:
-        print("Error: Invalid HEADER.")
+        return None
+    return float(match.group(1)), float(match.group(2)), int(match.group(3), 16), match.end()
+
+
+def decrypt_payload(encrypted_part, sign, flags=0):
+    # Decrypts the payload that follows the header: raw ciphertext (bytes, compressed with the codec
+    # in `flags`) or its hex text (str, ending in END_MARKER once decrypted). Returns "" on failure.
+    try:
+        if isinstance(encrypted_part, bytes):
+            with stage("decrypt"):
+                data = decrypt_bytes(encrypted_part, sign, bool(flags & FLAG_HKDF))
+            with stage("decompress"):
+                return decompress_payload(flags_codec(flags), data).decode()
+        with stage("decrypt"):
+            decrypted = decrypt_message(encrypted_part, sign)
+    except Exception as e:
+        print("AES decryption error:", e)
         return ""
 
-    min_var = float(match.group(1))
-    max_var = float(match.group(2))
-    enc_len = int(match.group(3), 16)
-    step = (max_var - min_var) / 6 if max_var > min_var else 1
+    return decrypted.split(END_MARKER)[0]
 
-    enc_start = match.end()
-    needed_bits = enc_start * 8 + enc_len * 8  # Because hex = 4 bits
 
-    bits = []
-    for y in range(1, gray_arr.shape[0] - 1, 3):
-        for x in range(1, gray_arr.shape[1] - 1, 3):
-            var = var_map[y, x]
-            bin_idx = int((var - min_var) / step) if step else 0
-            bin_idx = min(bin_idx, 5)
-            pos1, pos2 = lsb_pairs[bin_idx]
-            r = array[y, x, 0]
-            bits.append(str((r >> pos1) & 1))
-            bits.append(str((r >> pos2) & 1))
-            if len(bits) >= needed_bits:
-                break
-        if len(bits) >= needed_bits:
-            break
+def extract_message_variance(input_image, sign):
+    """
+       Extracts and decrypts a hidden message from an image using variance-based LSB steganography.
 
-    message = ''
-    for i in range(0, len(bits), 8):
-        byte = ''.join(bits[i:i + 8])
-        if len(byte) < 8:
-            break
-        char = chr(int(byte, 2))
-        message += char
+       This function first reads the fixed-size binary header (see stego_header) that contains
+       the variance range and the encrypted message length. Then it adaptively extracts bits from the image
+       based on local variance and finally decrypts the message using the shared secret.
+
+       Parameters:
+           input_image: Path, bytes, file-like object, PIL image or RGB array containing the message.
+           sign (int): Shared secret used for AES decryption of the message.
+
+       Returns:
+           str: The decrypted plaintext message, or an empty string if extraction or decryption fails.
 
-    encrypted_part = message[enc_start:enc_start + enc_len]
+       Notes:
+           - The message must be embedded using the `embed_message_variance` function.
+           - The header is read with the first LSB pair in a single vectorized read.
+           - Images written in the old text header format ("<min_var>,<max_var>|<len>|") are still read.
+           - LSB pairs are selected dynamically using 6 variance bins.
+           - With FLAG_BINARY in the header the payload is the raw ciphertext; otherwise it is
+             hex text and the message is expected to end with END_MARKER (e.g. "$t3g0$").
+       """
+    array = load_rgb_array(input_image)
 
     try:
-        decrypted = decrypt_message(encrypted_part, sign)
-    except Exception as e:
-        print("AES decryption error:", e)
+        header = unpack_header(np.packbits(extract_bits(array, HEADER_BITS)).tobytes())
+    except ValueError as e:
+        print("Error:", e)
         return ""
-
-    final_msg = decrypted.split(END_MARKER)[0]
-    print("The message is:\n", final_msg)
+    if header is None:
+        encrypted_part = _extract_legacy(array)
+        if encrypted_part is None:
+            print("Error: Invalid HEADER.")
+            return ""
+    elif header["method"] != METHOD_VARIANCE_AES:
+        print("Error: The image does not contain an AES variance-based message.")
+        return ""
+    else:
+        encrypted_part = extract_payload_variance(array, header)
+        if not header["flags"] & FLAG_BINARY:
+            encrypted_part = encrypted_part.decode('latin-1')
+
+    final_msg = decrypt_payload(encrypted_part, sign, header["flags"] if header is not None else 0)
+    if final_msg:
+        print("The message is:\n", final_msg)
     return final_msg
 
 
+def _extract_legacy(array):
+    # Old format: text header read with the first LSB pair, then header + hex ciphertext re-read
+    # with variance-selected pairs. Returns the hex ciphertext, or None if there is no valid header.
+    header = parse_legacy_header(np.packbits(extract_bits(array, LEGACY_HEADER_BITS)).tobytes())
+    if header is None:
+        return None
+
+    min_var, max_var, enc_len, enc_start = header
+    needed_bits = enc_start * 8 + enc_len * 8  # Because hex = 4 bits
+
+    # The old format bins on the variance of the unmasked (stego) image
+    var_map = cached_variance_map(np.asarray(Image.fromarray(array).convert("L")))
+    bits = extract_bits(array, needed_bits, var_map, min_var, max_var)
+    message = np.packbits(bits).tobytes().decode('latin-1')
+    return message[enc_start:enc_start + enc_len]
+
+
 # # Example usage:
 # embed_message_variance("Hello world! it is a beautiful day, this year 2025", "dog.png", "output_w_secr.png")
 # extract_message_variance("output_w_secr.png")
@@ -1,13 +1,18 @@
-from PIL import Image
-import numpy as np
-from scipy.ndimage import generic_filter
 import re
+from lazy_import import lazy_import
+from variance_cache import cached_variance_map
+from variance_kernel import embed_bits, extract_bits, stable_gray, extract_bytes_until
+from image_io import load_rgb_array, save_image
+from instrumentation import stage
+from stego_header import HEADER_BITS, METHOD_VARIANCE_PLAINTEXT, FLAG_DENSE, header_bits, unpack_header
+import variance_dense
+from capacity import VARIANCE_LSB, check_capacity
+
+Image = lazy_import("PIL.Image")
+np = lazy_import("numpy")
 
 END_MARKER = "$t3g0$"
-
-
-def local_variance(block):
-    return np.var(block)
+LEGACY_HEADER_BITS = 20 * 8   # assume 20 characters for the old text header
 
 def embed_message_variance(message, input_image, output_image):
     """
@@ -17,157 +22,203 @@ def embed_message_variance(message, input_image, output_image):
         to determine which pair of LSB positions to use for hiding 2 bits. This ensures bits are hidden
         more effectively in visually noisy regions.
 
-        The message is prepended with a header containing the min and max variance values, and
-        appended with a global END_MARKER to signal message termination during extraction.
+        The message is prepended with a fixed-size binary header (see stego_header) containing
+        the min and max variance values and the message length.
 
         Parameters:
             message (str): The message to be embedded into the image.
-            input_image (str): Path to the input image (should be in RGB format).
-            output_image (str): Path where the output image with the hidden message will be saved.
+            input_image: Path, bytes, file-like object, PIL image or RGB array of the carrier.
+            output_image (str or file-like): Path where the output image with the hidden message will be saved.
 
         Returns:
             None. The modified image is saved to the specified output path.
 
         Notes:
             - Uses a 2-bit embedding scheme with 6 LSB position pairs.
-            - The global variable END_MARKER must be defined (e.g. END_MARKER = "$t3g0$").
+            - The header is written with the first LSB pair, the message with variance-selected pairs.
+            - Variance is computed with bits 0-3 of red cleared, so extraction sees the same bins.
             - The message is embedded into the red channel only.
             - No encryption is used in this version.
         """
-    img = Image.open(input_image).convert("RGB")
-    array = np.array(img)
-    gray = img.convert("L")
-    gray_arr = np.array(gray)
+    check_capacity(input_image, VARIANCE_LSB, len(message.encode('latin-1')))
+    array = load_rgb_array(input_image, writable=True)
+    embed_message_variance_array(message, array)
+    save_image(array, output_image)
+
+
+def embed_message_variance_array(message, array, method=METHOD_VARIANCE_PLAINTEXT, stride=None):
+    """
+        In-memory version of embed_message_variance().
 
-    var_map = generic_filter(gray_arr, local_variance, size=3, mode='reflect')
+        Parameters:
+            message (str): The message to be embedded into the image.
+            array (np.ndarray): Writable HxWx3 uint8 RGB image data, modified in place.
+            method (int): Method recorded in the header (e.g. METHOD_VARIANCE_X25519 for a raw key).
+            stride (int or None): None for the classic red-channel mode, or the block stride (1-4)
+                                  of the dense multi-channel mode (see variance_dense).
+
+        Returns:
+            np.ndarray: The same array, with the message embedded.
+
+        Raises:
+            ValueError: If the message does not fit in the image.
+        """
+    return embed_payload_variance(array, message.encode('latin-1'), method, stride=stride)
+
+
+def embed_payload_variance(array, payload, method, flags=0, stride=None):
+    """
+       Writes a binary header and a byte payload with variance-selected LSB pairs.
+
+       The payload size is checked against the carrier grid before any pixel work, so an
+       oversized payload raises instead of being cut off where the grid ends.
+
+       Parameters:
+           array (np.ndarray): Writable HxWx3 uint8 RGB image data, modified in place.
+           payload (bytes): Data to embed.
+           method (int): METHOD_* constant recorded in the header.
+           flags (int): Header flags.
+           stride (int or None): Block stride of the dense mode, or None for the classic mode.
+
+       Returns:
+           np.ndarray: The same array, with the payload embedded.
+
+       Raises:
+           ValueError: If the payload does not fit in the image.
+       """
+    if stride is not None:
+        return variance_dense.embed_payload_dense(array, payload, method, flags, stride)
+    check_capacity(array, VARIANCE_LSB, len(payload))
+    pixels = array.shape[0] * array.shape[1]
+    with stage("to_gray", pixels=pixels):
+        gray = stable_gray(array)
+    with stage("variance_map", pixels=pixels):
+        var_map = cached_variance_map(gray)
     min_var = np.min(var_map)
     max_var = np.max(var_map)
-    step = (max_var - min_var) / 6 if max_var > min_var else 1
-
-    # Step 1: add header (min_var,max_var) + message + END_MARKER
-    header = f"{min_var:.6f},{max_var:.6f}"
-    full_message = header + message + END_MARKER
-
-    bits = ''.join(f"{ord(c):08b}" for c in full_message)
-    lsb_pairs = [(0, 1), (0, 2), (0, 3), (1, 2), (1, 3), (2, 3)]
-
-    idx = 0
-    for y in range(1, array.shape[0] - 1, 3):
-        for x in range(1, array.shape[1] - 1, 3):
-            if idx >= len(bits):
-                break
-            var = var_map[y, x]
-            bin_idx = int((var - min_var) / step) if step else 0
-            bin_idx = min(bin_idx, 5)
-            pos1, pos2 = lsb_pairs[bin_idx]
-            r = array[y, x, 0]
-            if idx + 2 <= len(bits):
-                b1, b2 = int(bits[idx]), int(bits[idx + 1])
-                # r = (r & ~(1 << pos1)) | (b1 << pos1)
-                # r = (r & ~(1 << pos2)) | (b2 << pos2)
-                mask1 = ~(1 << pos1) & 0xFF
-                mask2 = ~(1 << pos2) & 0xFF
-                r = (r & mask1) | (b1 << pos1)
-                r = (r & mask2) | (b2 << pos2)
-
-                array[y, x, 0] = r
-                idx += 2
-        if idx >= len(bits):
+
+    header = header_bits(method, min_var, max_var, len(payload), flags)
+    with stage("pack_bits", bits=len(payload) * 8):
+        bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8))
+    with stage("embed_variance", pixels=pixels, bits=len(header) + len(bits)):
+        embed_bits(array, None, min_var, max_var, header)
+        embed_bits(array, var_map, min_var, max_var, bits, start_bit=HEADER_BITS)
+    return array
+
+
+def parse_legacy_header(header_bytes):
+    """
+       Parses the old text header "<min_var>,<max_var>" read with the first LSB pair.
+
+       Parameters:
+           header_bytes (bytes): The first bytes of the carrier grid.
+
+       Returns:
+           tuple: (min_var, max_var).
+
+       Raises:
+           ValueError: If the header cannot be decoded.
+       """
+    header = ''
+    for char in header_bytes.decode('latin-1'):
+        header += char
+        if ',' in header and header.count('.') >= 2:
             break
+    try:
+        min_var, max_var = map(float, header.split(',')[:2])
+    except ValueError:
+        raise ValueError(f"Failed to decode the header: {header!r}")
+    return min_var, max_var
 
-    out = Image.fromarray(array)
-    out.save(output_image)
+
+def strip_legacy_header(message):
+    pattern = r'^\d+\.\d{6},\d+\.\d{6}'
+    return re.sub(pattern, '', message).lstrip()     #Removing the prefix from the beginning of the message
 
 
 def extract_message_variance(input_image):
     """
        Extracts a plaintext message from an image using variance-based LSB steganography.
 
-       The function first extracts a short header (assumed to be 20 characters) from the image
-       using a fixed LSB pair. This header encodes the min and max variance values used during
-       embedding. Based on the variance map, it dynamically selects LSB bit pairs for extracting
-       the message bits from the red channel of each 3x3 block.
+       The function first reads the fixed-size binary header from the image using a fixed LSB
+       pair. This header encodes the min and max variance values used during embedding and the
+       message length. Based on the variance map, it dynamically selects LSB bit pairs for
+       extracting the message bits from the red channel of each 3x3 block.
 
        Parameters:
-           input_image (str): Path to the image containing the embedded message.
+           input_image: Path, bytes, file-like object, PIL image or RGB array containing the message.
 
        Returns:
-           str: The extracted message without the variance header and END_MARKER.
+           str: The extracted message without the variance header.
                 If the header cannot be decoded, an empty string is returned.
 
        Notes:
-           - The function assumes the message ends with a global END_MARKER (e.g., "$t3g0$").
-           - The variance is computed using a 3x3 neighborhood on the grayscale version of the image.
+           - Images written in the old text header format ("<min_var>,<max_var>" + message +
+             END_MARKER) are still read.
+           - The variance is computed using a 3x3 neighborhood on the grayscale version of the image,
+             with the writable red bits cleared (see variance_kernel.stable_gray()).
            - The function uses 6 pre-defined LSB bit-pairs based on variance binning.
        """
-    img = Image.open(input_image).convert("RGB")
-    array = np.array(img)
-    gray = img.convert("L")
-    gray_arr = np.array(gray)
-    var_map = generic_filter(gray_arr, local_variance, size=3, mode='reflect')
-    lsb_pairs = [(0, 1), (0, 2), (0, 3), (1, 2), (1, 3), (2, 3)]
-
-    # Step 1: Extract initial header (20 characters should be enough)
-    header_bits = []
-    max_header_bits = 20 * 8   # assume 20 characters for the header
-    for y in range(1, gray_arr.shape[0] - 1, 3):
-        for x in range(1, gray_arr.shape[1] - 1, 3):
-            r = array[y, x, 0]
-            pos1, pos2 = lsb_pairs[0] # Using the first pair for header extraction
-            header_bits.append(str((r >> pos1) & 1))
-            header_bits.append(str((r >> pos2) & 1))
-            if len(header_bits) >= max_header_bits:
-                break
-        if len(header_bits) >= max_header_bits:
-            break
-
-    header = ''
-    for i in range(0, len(header_bits), 8):
-        byte = ''.join(header_bits[i:i + 8])
-        if len(byte) < 8:
-            break
-        char = chr(int(byte, 2))
-        header += char
-        if ',' in header and header.count('.') >= 2:
-            break
+    array = load_rgb_array(input_image)
 
+    # Step 1: Read the binary header with the first LSB pair
     try:
-        min_var, max_var = map(float, header.split(',')[:2])
-    except ValueError:
-        print("Error: Failed to decode the header:", repr(header))
+        header = unpack_header(np.packbits(extract_bits(array, HEADER_BITS)).tobytes())
+    except ValueError as e:
+        print("Error:", e)
         return ""
-
-    step = (max_var - min_var) / 6 if max_var > min_var else 1
-
-   # Step 2: Extracting the message based on variance
-    bits = []
-    for y in range(1, gray_arr.shape[0] - 1, 3):
-        for x in range(1, gray_arr.shape[1] - 1, 3):
-            var = var_map[y, x]
-            bin_idx = int((var - min_var) / step) if step else 0
-            bin_idx = min(bin_idx, 5)
-            pos1, pos2 = lsb_pairs[bin_idx]
-            r = array[y, x, 0]
-            bits.append(str((r >> pos1) & 1))
-            bits.append(str((r >> pos2) & 1))
-
-    #Decoding bits into a message
-    message = ''
-    for i in range(0, len(bits), 8):
-        byte = ''.join(bits[i:i + 8])
-        if len(byte) < 8:
-            break
-        char = chr(int(byte, 2))
-        message += char
-        if END_MARKER in message:
-            message = message.split(END_MARKER)[0]
-            break
-    pattern = r'^\d+\.\d{6},\d+\.\d{6}'
-    message_r = re.sub(pattern, '', message).lstrip()     #Removing the prefix from the beginning of the message
+    if header is None:
+        message_r = _extract_legacy(array)
+    elif header["method"] != METHOD_VARIANCE_PLAINTEXT:
+        print("Error: The image does not contain a plaintext variance-based message.")
+        return ""
+    else:
+        # Step 2: Extracting the message based on variance
+        message_r = extract_payload_variance(array, header).decode('latin-1')
     print(" the message is: ", message_r)
     return message_r
 
 
+def extract_payload_variance(array, header):
+    """
+       Reads the payload that follows a binary header with variance-selected LSB pairs.
+
+       Parameters:
+           array (np.ndarray): HxWx3 uint8 RGB image data.
+           header (dict): The parsed header (see stego_header.unpack_header()).
+
+       Returns:
+           bytes: header['length'] bytes of payload.
+       """
+    if header["flags"] & FLAG_DENSE:
+        return variance_dense.extract_payload_dense(array, header)
+    pixels = array.shape[0] * array.shape[1]
+    with stage("to_gray", pixels=pixels):
+        gray = stable_gray(array)
+    with stage("variance_map", pixels=pixels):
+        var_map = cached_variance_map(gray)
+    with stage("extract_variance", pixels=pixels, bits=header["length"] * 8):
+        bits = extract_bits(array, header["length"] * 8, var_map, header["min_var"], header["max_var"],
+                            start_bit=HEADER_BITS)
+    return np.packbits(bits).tobytes()
+
+
+def _extract_legacy(array):
+    # Old format: 20-character text header read with the first LSB pair, message ends with END_MARKER
+    header_bytes = np.packbits(extract_bits(array, LEGACY_HEADER_BITS)).tobytes()
+
+    try:
+        min_var, max_var = parse_legacy_header(header_bytes)
+    except ValueError as e:
+        print("Error:", e)
+        return ""
+
+    # The old format bins on the variance of the unmasked (stego) image
+    var_map = cached_variance_map(np.asarray(Image.fromarray(array).convert("L")))
+    data, _ = extract_bytes_until(array, var_map, min_var, max_var, END_MARKER.encode('latin-1'))
+    return strip_legacy_header(data.decode('latin-1'))
+
+
 
 # Example usage:
 # embed_message_variance("Hello world! it is a beautiful day , this year 2025", "clean.png", "op88uuo.png")
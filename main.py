@@ -1,24 +1,7 @@
+import argparse
 import os
-from dh_key_exchange_10 import generate_dh_values
-from embed_dh_values_into_image_11 import dh_key_generation_and_embedding
-from extract_dh_from_image_2 import extract_dh_from_image
-from encrypt_and_hide_message_3 import encrypt_and_embed_message
-from extract_and_decrypt_message_4 import extract_and_decrypt_message
-from embed_and_extract_B_Into_Image_12 import extract_B_from_image, embed_B_into_image
-import random
-
-def save_method_for_image(image_filename, method):
-    meta_filename = image_filename + ".method.txt"
-    with open(meta_filename, "w") as f:
-        f.write(method)
-
-def load_method_for_image(image_filename):
-    meta_filename = image_filename + ".method.txt"
-    try:
-        with open(meta_filename, "r") as f:
-            return f.read().strip()
-    except FileNotFoundError:
-        return None
+from exchange_sessions import ExchangeManager, SQLiteSessionStore
+from image_io import save_image
 
 def check_image_file_exists	(image_filename):
     if not os.path.exists(image_filename):
@@ -36,6 +19,20 @@ def main_menu():
     print("0. Exit")
     return input("Choose an option: ").strip()
 
+def choose_key_exchange():
+    print("\nChoose key exchange:")
+    print("1. Classic Diffie-Hellman (p, g, A)")
+    print("2. X25519 (32-byte public keys)")
+    return input("Enter 1 or 2: ").strip()
+
+def format_key(value):
+    return value.hex() if isinstance(value, bytes) else value
+
+def ask_session_id(prompt, default=None):
+    # Enter keeps the session ID from this run, if there is one
+    hint = f" [{default}]" if default else ""
+    return input(f"{prompt}{hint}: ").strip() or default
+
 def choose_lsb_method():
     print("\nChoose LSB embedding method:")
     print("1. Standard LSB")
@@ -43,69 +40,92 @@ def choose_lsb_method():
     return input("Enter 1 or 2: ").strip()
 
 if __name__ == "__main__":
+    # Each exchange lives in its own session (see exchange_sessions.py). Sessions are kept in an
+    # SQLite file, so e.g. Bob can run option 2, quit, and run option 4 later with his session ID.
+    parser = argparse.ArgumentParser(description="DH key exchange + steganography menu.")
+    parser.add_argument("--sessions", default="sessions.db", help="session database path (default: sessions.db)")
+    args = parser.parse_args()
+    manager = ExchangeManager(SQLiteSessionStore(args.sessions))
+    # Session IDs of this run, offered as defaults in options 3 and 4
+    sender_session = receiver_session = None
+
     while True:
         choice = main_menu()
 
         if choice == '1':
             # DH key generation + embedding
-            p, g, A, a = generate_dh_values()
-            print(f"\n Generated DH values:\np = {p}\ng = {g}\nA = {A}")
+            backend = "x25519" if choose_key_exchange() == '2' else "dh"
             image = input("Enter path to image to embed DH values (e.g. horse.png): ")
             if not check_image_file_exists(image): continue
 
             output = input("Enter output image filename (e.g. dh_embedded.png): ")
-            # embed_dh_values_lsb(p, g, A, image, output)
             method = choose_lsb_method()
-            save_method_for_image(output, method)
-            dh_key_generation_and_embedding(p, g, A, image, output, method) # @NEED TO DO !!
+            if method not in ('1', '2'):
+                print(" Invalid LSB method.")
+                continue
+            sender_session, array = manager.start(image, method, backend)
+            session = manager.session(sender_session)
+            if backend == "x25519":
+                print(f"\n Generated X25519 public key:\nA = {format_key(session['public_key'])}")
+            else:
+                print(f"\n Generated DH values:\np = {session['p']}\ng = {session['g']}\nA = {session['public_key']}")
+            save_image(array, output)
+            print(f" DH values (p, g, A) have been embedded into the image '{output}' successfully.")
+            print(f" Sender session: {sender_session}")
 
         elif choice == '2':
             image = input("Enter path to image with embedded DH values (e.g. dh_embedded.png): ")
             if not check_image_file_exists(image): continue
 
-            method = load_method_for_image(image)
-            p, g, A = extract_dh_from_image(image, method)
-            print(f"\n Extracted DH values:\np = {p}\ng = {g}\nA = {A}")
-            # Generate receiver's private key b and public key B
-            b = random.randint(2, p - 2)
-            print("\nBob's private key (b):", b)
-            B = pow(g, b, p)
-            print("Bob's public key (B):", B)
-            image = input("Enter path to image to embed B (e.g. dog.png): ")
-            if not check_image_file_exists(image): continue
+            carrier = input("Enter path to image to embed B (e.g. dog.png): ")
+            if not check_image_file_exists(carrier): continue
 
             output = input("Enter output image filename (e.g. B_embedded.png): ")
-            embed_B_into_image(str(B), image, output)
-
-            # Calculate shared secret
-            S = pow(A, b, p)
-            print(f"\n Bob Calculated shared secret (S) = {S}")
-
-            # Save Bob's shared secret for comparison (only for testing)
-            with open("shared_secret.txt", "w") as f:
-                f.write(str(S))
-            print(" Bob's shared secret saved to shared_secret.txt for later comparison.")
+            # The embedding method is stored in the image itself
+            try:
+                receiver_session, array = manager.respond(image, carrier)
+            except ValueError as e:
+                print(f" {e}")
+                continue
+            session = manager.session(receiver_session)
+            print(f"\n Extracted public values:\np = {session['p']}\ng = {session['g']}\n"
+                  f"A = {format_key(session['peer_public_key'])}")
+            print("Bob's public key (B):", format_key(session['public_key']))
+            save_image(array, output)
+            print(f" DH values ( B ) have been embedded into the image '{output}' successfully.")
+            print(f"\n Bob Calculated shared secret (S) = {session['shared_secret']}")
+            print(f" Receiver session: {receiver_session}")
 
         elif choice == '3':
+            sender_session = ask_session_id("Enter Alice's session ID (from option 1)", sender_session)
+            session = manager.session(sender_session) if sender_session else None
+            if session is None:
+                print(" Alice's session not found. Run option 1 first.")
+                continue
             image_with_B = input("Enter image file that contains B (e.g. B_embedded.png): ")
             if not check_image_file_exists(image_with_B): continue
 
-            B = int(extract_B_from_image(image_with_B))
-            print(f" Extracted B from image: {B}")
-            S = pow(B, a, p)
-            print(f" Alice Calculated shared secret (S) = {S}")
-
-            # Try to compare with Bob's shared secret if available
             try:
-                with open("shared_secret.txt", "r") as f:
-                    bob_S = int(f.read().strip())
-                if S == bob_S:
-                    print(" Shared secret MATCH confirmed between Alice and Bob! ")
+                if session["state"] == "established":
+                    S = session["shared_secret"]
                 else:
-                    print(" Shared secret MISMATCH!  Something went wrong.")
-                    continue
-            except FileNotFoundError:
-                print(" Bob's shared secret file not found. Skipping comparison.")
+                    S = manager.complete(sender_session, image_with_B)
+                    print(f" Extracted B from image: {format_key(manager.session(sender_session)['peer_public_key'])}")
+            except ValueError as e:
+                print(f" {e}")
+                continue
+            print(f" Alice Calculated shared secret (S) = {S}")
+
+            # Compare with Bob's shared secret if his session is in the same store (only for testing)
+            receiver_session = ask_session_id("Enter Bob's session ID to compare (Enter to skip)", receiver_session)
+            receiver = manager.session(receiver_session) if receiver_session else None
+            if receiver is None:
+                print(" Bob's session not found. Skipping comparison.")
+            elif receiver["shared_secret"] == S:
+                print(" Shared secret MATCH confirmed between Alice and Bob! ")
+            else:
+                print(" Shared secret MISMATCH!  Something went wrong.")
+                continue
 
             message = input("Enter the message to encrypt and embed (e.g. It's a beautiful day. ): ")
             image = input("Enter path to image to embed message (e.g. deer.png): ")
@@ -114,29 +134,28 @@ if __name__ == "__main__":
             output = input("Enter output image filename (e.g. encrypted_msg.png): ")
 
             method = choose_lsb_method()
-            save_method_for_image(output, method)
-            encrypt_and_embed_message(message, S, image, output, method)
+            if method not in ('1', '2'):
+                print(" Invalid embedding method.")
+                continue
+            save_image(manager.send_message(sender_session, message, image, method), output)
+            print(f" Encrypted message embedded into {output}")
 
         elif choice == '4':
-            try:
-                with open("shared_secret.txt", "r") as f:
-                    S = int(f.read().strip())
+            receiver_session = ask_session_id("Enter Bob's session ID (from option 2)", receiver_session)
+            if not receiver_session or manager.session(receiver_session) is None:
+                print(" Bob's session not found. Run option 2 first.")
+                continue
 
-                image = input("Enter image file with embedded encrypted message (e.g. encrypted_msg.png): ")
-                if not check_image_file_exists(image) : continue
+            image = input("Enter image file with embedded encrypted message (e.g. encrypted_msg.png): ")
+            if not check_image_file_exists(image) : continue
 
-                # S = int(input("Enter shared secret (S): "))
-                method = load_method_for_image(image)
-                extract_and_decrypt_message(image, S, method) # @NEED TO DO !!
-            except FileNotFoundError:
-                print(" Bob's shared secret file not found. Skipping comparison.")
-            finally:
-                if os.path.exists("shared_secret.txt"):
-                    os.remove("shared_secret.txt")
+            # The receiver session is closed after the message is read
+            manager.receive_message(receiver_session, image)
+            receiver_session = None
 
         elif choice == '0':
             print(" Exiting.")
             break
 
         else:
-            print(" Invalid option. Please try again.")
\ No newline at end of file
+            print(" Invalid option. Please try again.")
@@ -0,0 +1,254 @@
+import argparse
+import os
+import secrets
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from lazy_import import lazy_import
+from image_io import load_rgb_array, save_image
+from capacity import STANDARD_LSB, VARIANCE_LSB, capacity
+from standard_lsb import embed_lsb_array, extract_lsb_bytes, read_lsb_preamble
+from stego_header import HEADER_BITS, METHOD_STANDARD_SHARD, METHOD_VARIANCE_SHARD, unpack_header
+from stego_probe import probe_method
+from variance_kernel import extract_bits
+from variance_dense import dense_capacity
+from lsb_with_variance_plaintext import embed_payload_variance, extract_payload_variance
+from lsb_with_variance_aes import encrypt_payload, decrypt_payload
+
+np = lazy_import("numpy")
+
+# Payload sharding across several carrier images.
+#
+# The message is compressed and encrypted once (like the variance AES method), then the ciphertext
+# is cut into shards. Every shard is embedded into its own carrier, behind a shard header:
+#   magic (3 bytes) | version (u8) | flags (u8) | set id (8 bytes) | index (u16) | total (u16) | length (u32)
+# The flags are the AES payload flags (codec, key derivation) of the whole ciphertext. The set id
+# ties the shards of one message together, so shards of different messages are never mixed.
+# Shard images carry METHOD_*_SHARD in their preamble or binary header.
+
+SHARD_MAGIC = b"StS"
+SHARD_VERSION = 1
+SHARD_HEADER_FORMAT = ">3sBB8sHHI"
+SHARD_HEADER_SIZE = struct.calcsize(SHARD_HEADER_FORMAT)
+MAX_SHARDS = 0xFFFF
+
+
+def pack_shard(flags, set_id, index, total, data):
+    return struct.pack(SHARD_HEADER_FORMAT, SHARD_MAGIC, SHARD_VERSION, flags, set_id, index, total, len(data)) + data
+
+
+def unpack_shard_header(data):
+    """
+       Parses a shard header.
+
+       Returns:
+           dict or None: {'flags', 'set_id', 'index', 'total', 'length'}, or None if data is not a shard.
+       """
+    if len(data) < SHARD_HEADER_SIZE or not data.startswith(SHARD_MAGIC):
+        return None
+    magic, version, flags, set_id, index, total, length = struct.unpack(SHARD_HEADER_FORMAT,
+                                                                        data[:SHARD_HEADER_SIZE])
+    if version != SHARD_VERSION or not index < total:
+        return None
+    return {"flags": flags, "set_id": set_id, "index": index, "total": total, "length": length}
+
+
+def carrier_capacity(carrier, method, stride=None):
+    """
+       Returns how many ciphertext bytes one shard in this carrier can hold.
+
+       The capacity comes from the image dimensions (see capacity.capacity()), except for the
+       dense variance mode, where it depends on the image content and the carrier is decoded.
+       """
+    if method == VARIANCE_LSB and stride is not None:
+        available = dense_capacity(load_rgb_array(carrier), stride)
+    else:
+        available = capacity(carrier, method, marker="")
+    return max(0, available - SHARD_HEADER_SIZE)
+
+
+def plan_shards(payload_size, carriers, method, stride=None, capacities=None):
+    """
+       Assigns a payload to carriers from a pool.
+
+       The largest carriers are picked first, until their capacity covers the payload; the payload
+       is then spread over the picked carriers in proportion to their capacity, so no carrier is
+       filled more than the others.
+
+       Parameters:
+           payload_size (int): Ciphertext size in bytes.
+           carriers (list): Carrier images (paths or any source image_io accepts).
+           method (str): '1' for standard LSB, '2' for variance-based LSB.
+           stride (int or None): Dense variance mode stride (method '2' only).
+           capacities (list[int] or None): Shard capacities of the carriers, if already known.
+
+       Returns:
+           list[tuple]: (carrier, shard size) pairs, in shard order.
+
+       Raises:
+           ValueError: If the whole pool cannot hold the payload.
+       """
+    if capacities is None:
+        capacities = [carrier_capacity(carrier, method, stride) for carrier in carriers]
+    ranked = sorted(range(len(carriers)), key=lambda i: capacities[i], reverse=True)
+
+    picked, total = [], 0
+    for i in ranked:
+        if total >= payload_size and picked:
+            break
+        if capacities[i] > 0:
+            picked.append(i)
+            total += capacities[i]
+    if total < payload_size or len(picked) > MAX_SHARDS:
+        raise ValueError(f"The carrier pool cannot hold the payload: {payload_size} bytes needed, "
+                         f"{sum(capacities)} available.")
+
+    plan, remaining, remaining_capacity = [], payload_size, total
+    for i in picked:
+        size = min(capacities[i], -(-remaining * capacities[i] // remaining_capacity))
+        plan.append((carriers[i], size))
+        remaining -= size
+        remaining_capacity -= capacities[i]
+    return plan
+
+
+def _embed_shard(task):
+    # Worker: embeds one shard and saves the stego image. Returns the output path.
+    carrier, shard, output, method, stride = task
+    array = load_rgb_array(carrier, writable=True)
+    if method == STANDARD_LSB:
+        embed_lsb_array(array, shard, marker="", method=METHOD_STANDARD_SHARD)
+    else:
+        embed_payload_variance(array, shard, METHOD_VARIANCE_SHARD, stride=stride)
+    save_image(array, output)
+    return output
+
+
+def _read_shard(image):
+    # Worker: returns (shard header, shard data) of one stego image, or None if it holds no shard
+    array = load_rgb_array(image)
+    method = probe_method(array)
+    if method == METHOD_STANDARD_SHARD:
+        offset = read_lsb_preamble(array)["size"]
+        shard = unpack_shard_header(extract_lsb_bytes(array, SHARD_HEADER_SIZE, offset))
+        if shard is None:
+            return None
+        return shard, extract_lsb_bytes(array, shard["length"], offset + SHARD_HEADER_SIZE)
+    if method == METHOD_VARIANCE_SHARD:
+        header = unpack_header(np.packbits(extract_bits(array, HEADER_BITS)).tobytes())
+        data = extract_payload_variance(array, header)
+        shard = unpack_shard_header(data)
+        if shard is None:
+            return None
+        return shard, data[SHARD_HEADER_SIZE:SHARD_HEADER_SIZE + shard["length"]]
+    return None
+
+
+def _run(function, tasks, workers):
+    # Runs function over tasks in a process pool (in this process with 1 worker), keeping the order
+    if workers == 1 or len(tasks) <= 1:
+        return [function(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(function, tasks))
+
+
+def embed_sharded(message, S, carriers, output_dir, method, stride=None, workers=None, compress=True):
+    """
+       Encrypts a message once and embeds it across several carriers in parallel.
+
+       Parameters:
+           message (str): The plaintext message.
+           S (str or int): Shared secret for AES encryption.
+           carriers (list): Carrier pool (paths or any source image_io accepts, picklable).
+           output_dir (str): Directory for the stego images (shard_000.png, shard_001.png, ...).
+           method (str): '1' for standard LSB, '2' for variance-based LSB.
+           stride (int or None): Dense variance mode stride (method '2' only).
+           workers (int or None): Worker processes. Defaults to os.cpu_count(); 1 runs in-process.
+           compress (bool): Compress the message before encryption when that helps.
+
+       Returns:
+           list[str]: Paths of the stego images, in shard order.
+
+       Raises:
+           ValueError: If the method is invalid or the carriers cannot hold the payload.
+       """
+    if method not in (STANDARD_LSB, VARIANCE_LSB):
+        raise ValueError("Invalid LSB method.")
+    ciphertext, flags = encrypt_payload(message, str(S), compress=compress)
+    plan = plan_shards(len(ciphertext), carriers, method, stride)
+    set_id = secrets.token_bytes(8)
+
+    os.makedirs(output_dir, exist_ok=True)
+    tasks, offset = [], 0
+    for index, (carrier, size) in enumerate(plan):
+        shard = pack_shard(flags, set_id, index, len(plan), ciphertext[offset:offset + size])
+        offset += size
+        tasks.append((carrier, shard, os.path.join(output_dir, f"shard_{index:03d}.png"), method, stride))
+    outputs = _run(_embed_shard, tasks, workers)
+    print(f" Embedded {len(ciphertext)} encrypted bytes into {len(outputs)} carriers in {output_dir}")
+    return outputs
+
+
+def extract_sharded(images, S, workers=None):
+    """
+       Reads the shards of a message from stego images in parallel and decrypts the message.
+
+       The images may be given in any order; shards are ordered by their index.
+
+       Parameters:
+           images (list): Stego images written by embed_sharded().
+           S (str or int): Shared secret for AES decryption.
+           workers (int or None): Worker processes. Defaults to os.cpu_count(); 1 runs in-process.
+
+       Returns:
+           str or None: The message, or None if decryption failed.
+
+       Raises:
+           ValueError: If an image holds no shard, shards belong to different messages, or
+                       shards are missing.
+       """
+    shards = _run(_read_shard, list(images), workers)
+    if any(shard is None for shard in shards):
+        raise ValueError("An image does not contain a payload shard.")
+    first = shards[0][0]
+    if any(shard["set_id"] != first["set_id"] or shard["total"] != first["total"] for shard, _ in shards):
+        raise ValueError("The shards belong to different messages.")
+    parts = {shard["index"]: data for shard, data in shards}
+    missing = sorted(set(range(first["total"])) - set(parts))
+    if missing:
+        raise ValueError(f"Missing shards: {missing} of {first['total']}.")
+
+    ciphertext = b"".join(parts[index] for index in range(first["total"]))
+    message = decrypt_payload(ciphertext, str(S), first["flags"])
+    if message:
+        print(f" The message is:\n{message}")
+    return message or None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Embed a message across several carriers, or reassemble it.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    embed = commands.add_parser("embed", help="encrypt a message file and shard it across carriers")
+    embed.add_argument("message", help="text file with the message")
+    embed.add_argument("carriers", nargs="+", help="carrier images")
+    embed.add_argument("-o", "--output-dir", required=True, help="directory for the shard images")
+    embed.add_argument("-m", "--method", default=STANDARD_LSB, choices=(STANDARD_LSB, VARIANCE_LSB))
+    embed.add_argument("--stride", type=int, default=None, help="dense variance mode stride (method 2)")
+    extract = commands.add_parser("extract", help="reassemble and decrypt a sharded message")
+    extract.add_argument("images", nargs="+", help="shard images, in any order")
+    for command in (embed, extract):
+        command.add_argument("-s", "--secret", required=True, help="shared secret S")
+        command.add_argument("-w", "--workers", type=int, default=None, help="worker processes")
+    args = parser.parse_args(argv)
+
+    if args.command == "embed":
+        with open(args.message, encoding="utf-8") as f:
+            message = f.read()
+        embed_sharded(message, args.secret, args.carriers, args.output_dir, args.method, args.stride, args.workers)
+        return 0
+    return 0 if extract_sharded(args.images, args.secret, args.workers) is not None else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
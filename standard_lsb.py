@@ -0,0 +1,178 @@
+from lazy_import import lazy_import
+from image_io import load_rgb_array, save_image
+from capacity import STANDARD_LSB, check_capacity
+from instrumentation import stage
+from stego_header import PREAMBLE_SIZE, pack_preamble, unpack_preamble
+
+np = lazy_import("numpy")
+
+END_MARKER = "$t3g0$"  # Marker indicating end of message
+
+
+def embed_lsb_array(array, payload, marker=END_MARKER, method=None, flags=0):
+    """
+       Embeds a byte payload followed by the end marker into an RGB array, in place.
+
+       If a method is given, a preamble naming it (see stego_header.pack_preamble()) is written
+       in front of the payload, so extractors can tell how the image was embedded.
+       The payload is expanded to bits with np.unpackbits and written with one masked
+       assignment into a reshape(-1) view of the image array, so no copy of the image is made.
+
+       Parameters:
+           array (np.ndarray): Writable, C-contiguous HxWx3 uint8 image data.
+           payload (bytes): Data to embed.
+           marker (str): End marker appended after the payload.
+           method (int or None): METHOD_STANDARD_* constant for the preamble, or None to write none.
+           flags (int): Flags byte of the preamble (e.g. the compression codec).
+
+       Raises:
+           ValueError: If the payload is too large to fit in the image.
+
+       Returns:
+           np.ndarray: The same array, with the payload embedded.
+       """
+    flat = array.reshape(-1)
+
+    preamble = pack_preamble(method, flags) if method is not None else b""
+    data = preamble + bytes(payload) + marker.encode('latin-1')
+    with stage("pack_bits", bits=len(data) * 8):
+        bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+    if len(bits) > len(flat):
+        raise ValueError("Message is too large to embed in image.")
+
+    with stage("embed_lsb", pixels=array.shape[0] * array.shape[1], bits=len(bits)):
+        target = flat[:len(bits)]
+        target &= 254
+        target |= bits
+    return array
+
+
+def embed_lsb_bytes(image_path, payload, output_path, marker=END_MARKER, method=None, flags=0):
+    """
+       Embeds a byte payload followed by the end marker using standard LSB steganography.
+
+       Parameters:
+           image_path (str): Path to the input image file.
+           payload (bytes): Data to embed.
+           output_path (str): Path to save the resulting image.
+           marker (str): End marker appended after the payload.
+           method (int or None): METHOD_STANDARD_* constant for the preamble, or None to write none.
+           flags (int): Flags byte of the preamble.
+
+       Raises:
+           ValueError: If the payload is too large to fit in the image.
+
+       Returns:
+           None. Saves the modified image to the specified output path.
+       """
+    check_capacity(image_path, STANDARD_LSB, len(payload), marker)
+    data = load_rgb_array(image_path, writable=True)
+    embed_lsb_array(data, payload, marker, method, flags)
+    save_image(data, output_path)
+
+
+def extract_lsb_until_marker(image, marker=END_MARKER, first_chunk_bytes=4096):
+    """
+       Extracts bytes hidden with standard LSB steganography, stopping at the end marker.
+
+       The least significant bit of every channel value (RGB flattened) is read in chunks and
+       packed into bytes with np.packbits. Each chunk is searched for the marker, keeping the
+       last len(marker) - 1 bytes of the previous chunk so a marker split across chunks is
+       still found. Chunks double in size, so short payloads only touch the start of the image.
+       A preamble written by embed_lsb_array() is removed from the returned data.
+
+       Parameters:
+           image: Path, bytes, file-like object, PIL image or RGB array with the embedded message.
+           marker (str): End marker that terminates the message.
+           first_chunk_bytes (int): Number of bytes decoded in the first chunk.
+
+       Returns:
+           tuple: (data, found) where data is the extracted bytes without the marker and found
+                  tells whether the marker was seen. If it was not, data holds every decoded byte.
+       """
+    flat = load_rgb_array(image).reshape(-1)
+    marker = marker.encode('latin-1')
+
+    data = bytearray()
+    start = 0
+    chunk_bits = first_chunk_bytes * 8
+    usable_bits = len(flat) // 8 * 8
+    with stage("extract_lsb", pixels=len(flat) // 3) as s:
+        while start < usable_bits:
+            stop = min(start + chunk_bits, usable_bits)
+            search_from = max(0, len(data) - len(marker) + 1)
+            data += np.packbits(flat[start:stop] & 1).tobytes()
+            s.bits = stop
+            end = data.find(marker, search_from)
+            if end != -1:
+                return _strip_preamble(bytes(data[:end])), True
+            start = stop
+            chunk_bits *= 2
+    return _strip_preamble(bytes(data)), False
+
+
+def extract_lsb_bytes(image, n_bytes, offset=0):
+    """
+       Reads a fixed number of bytes hidden with standard LSB steganography (no end marker).
+
+       Parameters:
+           image: Path, bytes, file-like object, PIL image or RGB array.
+           n_bytes (int): Number of bytes to read.
+           offset (int): Byte offset to start at, e.g. PREAMBLE_SIZE to skip the preamble.
+
+       Returns:
+           bytes: The data read. Shorter than n_bytes if the image is too small.
+       """
+    flat = load_rgb_array(image).reshape(-1)
+    bits = flat[offset * 8:(offset + n_bytes) * 8] & 1
+    return np.packbits(bits[:len(bits) // 8 * 8]).tobytes()
+
+
+def write_lsb_bytes(array, data, offset=0):
+    """
+       Writes bytes into the LSBs of an RGB array at a byte offset, in place (no marker, no preamble).
+
+       Parameters:
+           array (np.ndarray): Writable, C-contiguous HxWx3 uint8 image data.
+           data (bytes): Data to write.
+           offset (int): Byte offset to start at, e.g. PREAMBLE_SIZE to write after the preamble.
+
+       Raises:
+           ValueError: If the data does not fit in the image.
+       """
+    flat = array.reshape(-1)
+    bits = np.unpackbits(np.frombuffer(bytes(data), dtype=np.uint8))
+    start = offset * 8
+    if start + len(bits) > len(flat):
+        raise ValueError("Message is too large to embed in image.")
+    target = flat[start:start + len(bits)]
+    target &= 254
+    target |= bits
+
+
+def _strip_preamble(data):
+    preamble = unpack_preamble(data)
+    return data[preamble["size"]:] if preamble is not None else data
+
+
+def read_lsb_preamble(image):
+    """
+       Reads the preamble from the first LSBs of the image.
+
+       Only the first PREAMBLE_SIZE * 8 channel values are looked at.
+
+       Parameters:
+           image: Path, bytes, file-like object, PIL image or RGB array.
+
+       Returns:
+           dict or None: {'method', 'flags', 'size'} (see stego_header.unpack_preamble()),
+                         or None if the image has no preamble.
+       """
+    flat = load_rgb_array(image).reshape(-1)
+    return unpack_preamble(np.packbits(flat[:PREAMBLE_SIZE * 8] & 1).tobytes())
+
+
+def probe_lsb_method(image):
+    # METHOD_STANDARD_* constant from the preamble, or None
+    preamble = read_lsb_preamble(image)
+    return preamble["method"] if preamble is not None else None
@@ -0,0 +1,115 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Import-time budget for the entry points.
+#
+# Every entry module is imported in a fresh interpreter with `python -X importtime`, and its
+# cumulative import time (the minimum over a few runs) is compared with its budget. The same
+# run lists which heavy dependencies were actually imported (lazy_import() stand-ins do not
+# import anything until first use).
+# Importing an entry point must not load any of them: they are loaded on first use.
+
+HEAVY_MODULES = ("numpy", "PIL.Image", "scipy", "Crypto.Cipher.AES", "Crypto.PublicKey.ECC", "zstandard")
+
+# Import-time budget of every entry module, in milliseconds
+BUDGETS = {
+    "main": 150,
+    "batch": 150,
+    "capacity": 100,
+    "stego_api": 150,
+    "standard_lsb": 100,
+    "carrier_index": 150,
+    "stego_service": 300,
+}
+
+_PROBE = ("import json, sys; import {module}; "
+          "print(json.dumps([name for name in {heavy!r} if name in sys.modules]))")
+
+
+def measure_import(module, directory=None):
+    """
+       Imports a module in a fresh interpreter.
+
+       Parameters:
+           module (str): Module name.
+           directory (str or None): Working directory (defaults to the directory of this file).
+
+       Returns:
+           tuple: (cumulative import time in seconds, list of heavy modules that were loaded).
+
+       Raises:
+           ValueError: If the import fails.
+       """
+    directory = directory or os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                             _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                            cwd=directory, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise ValueError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    micros = None
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"; top-level imports are not indented
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].rstrip() == f" {module}":
+            micros = int(fields[1])
+    if micros is None:
+        raise ValueError(f"No import time reported for {module}.")
+    return micros / 1e6, json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run_startup_benchmark(budgets=None, repeat=5, scale=1.0):
+    """
+       Measures every entry point against its budget.
+
+       Parameters:
+           budgets (dict or None): {module: budget in ms}. Defaults to BUDGETS.
+           repeat (int): Fresh imports per module; the minimum time counts.
+           scale (float): Factor applied to every budget (for slower machines).
+
+       Returns:
+           list[dict]: One record per module with seconds, budget_seconds, loaded (heavy modules) and ok.
+       """
+    records = []
+    for module, budget_ms in (budgets or BUDGETS).items():
+        times, loaded = [], set()
+        for _ in range(repeat):
+            seconds, heavy = measure_import(module)
+            times.append(seconds)
+            loaded.update(heavy)
+        budget = budget_ms * scale / 1000
+        records.append({"module": module, "seconds": min(times), "budget_seconds": budget,
+                        "loaded": sorted(loaded), "ok": min(times) <= budget and not loaded})
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the import time of the entry points against their budgets.")
+    parser.add_argument("modules", nargs="*", help="entry modules to check (default: all with a budget)")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="fresh imports per module (default: 5)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every budget by this factor")
+    parser.add_argument("-o", "--output", default=None, help="JSON results path")
+    args = parser.parse_args(argv)
+
+    unknown = [module for module in args.modules if module not in BUDGETS]
+    if unknown:
+        parser.error(f"no budget for: {', '.join(unknown)}")
+    budgets = {module: BUDGETS[module] for module in args.modules} if args.modules else BUDGETS
+    records = run_startup_benchmark(budgets, args.repeat, args.scale)
+
+    for record in records:
+        status = "ok" if record["ok"] else "OVER BUDGET"
+        if record["loaded"]:
+            status = "loads " + ", ".join(record["loaded"])
+        print(f" {record['module']:<16} {record['seconds'] * 1000:7.1f} ms "
+              f"(budget {record['budget_seconds'] * 1000:.0f} ms)  {status}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version, "results": records}, f, indent=2)
+    return 0 if all(record["ok"] for record in records) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+from image_io import convert_output
+from embed_dh_values_into_image_11 import embed_dh_values
+from extract_dh_from_image_2 import extract_dh_from_image
+from encrypt_and_hide_message_3 import encrypt_and_embed
+from extract_and_decrypt_message_4 import extract_and_decrypt_message
+from embed_and_extract_B_Into_Image_12 import embed_B, extract_B_from_image
+
+# In-memory library API for the four exchange steps.
+#
+# Every function accepts the image as a path, encoded image bytes, a binary file-like object,
+# a PIL.Image.Image or an HxWx3 uint8 np.ndarray. Embedding functions return the stego image
+# as an np.ndarray by default; pass output='pil' for a PIL image or output='bytes' for PNG bytes.
+# Nothing is read from or written to disk unless a path is passed in.
+
+
+def embed_dh(p, g, A, carrier, method, output="array"):
+    """
+       Step 1 (sender): embeds p, g, A into the carrier. method is '1' (standard) or '2' (variance).
+       For X25519, pass p = g = None and the 32-byte public key as A.
+       """
+    return convert_output(embed_dh_values(p, g, A, carrier, method), output)
+
+
+def extract_dh(image, method=None):
+    """
+       Step 1 (receiver): returns (p, g, A) extracted from the image, or (None, None, key) for X25519.
+       The method is detected if not given.
+       """
+    return extract_dh_from_image(image, method)
+
+
+def embed_public_key(B, carrier, output="array"):
+    """Step 2 (receiver): embeds the public key B into the carrier using standard LSB."""
+    return convert_output(embed_B(B, carrier), output)
+
+
+def extract_public_key(image):
+    """Step 2 (sender): returns B as an int (32 bytes for X25519), or None if it was not found."""
+    value = extract_B_from_image(image)
+    if value is None or isinstance(value, bytes):
+        return value
+    return int(value)
+
+
+def embed_message(message, S, carrier, method, output="array"):
+    """Step 3 (sender): encrypts the message with the shared secret S and embeds it."""
+    return convert_output(encrypt_and_embed(message, S, carrier, method), output)
+
+
+def extract_message(image, S, method=None):
+    """Step 4 (receiver): returns the decrypted message, or None if it could not be recovered."""
+    return extract_and_decrypt_message(image, S, method)
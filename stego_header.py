@@ -0,0 +1,137 @@
+import struct
+
+from lazy_import import lazy_import
+
+np = lazy_import("numpy")
+
+# Fixed-size binary header written in front of variance-LSB payloads:
+#   magic (3 bytes) | version (u8) | method (u8) | flags (u8) | min_var (f32) | max_var (f32) | length (u32)
+# All fields are big-endian. The header is always embedded with the first LSB pair, because the
+# variance range needed to select the other pairs is stored in it.
+MAGIC = b"StG"
+VERSION = 1
+HEADER_FORMAT = ">3sBBBffI"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+HEADER_BITS = HEADER_SIZE * 8
+
+METHOD_VARIANCE_PLAINTEXT = 1
+METHOD_VARIANCE_AES = 2
+METHOD_STANDARD_PLAINTEXT = 3
+METHOD_STANDARD_AES = 4
+# 32-byte X25519 public keys, embedded as raw bytes (no end marker)
+METHOD_STANDARD_X25519 = 5
+METHOD_VARIANCE_X25519 = 6
+# Chunked AES-GCM stream of a file (see aes_stream.py), no end marker
+METHOD_STANDARD_STREAM = 7
+METHOD_VARIANCE_STREAM = 8
+# One shard of an encrypted payload split across several carriers (see sharding.py)
+METHOD_STANDARD_SHARD = 9
+METHOD_VARIANCE_SHARD = 10
+
+# Header / preamble flags
+FLAG_BINARY = 0x01  # AES payload is the raw ciphertext (otherwise its hex text)
+FLAG_CODEC_SHIFT = 1
+FLAG_CODEC_MASK = 0x06  # Compression codec of the plaintext (see compression.py)
+FLAG_HKDF = 0x08  # AES key derived with HKDF (see key_derivation.py), otherwise legacy SHA-256
+FLAG_DENSE = 0x10  # Variance payload in the dense multi-channel grid (see variance_dense.py)
+FLAG_STRIDE_SHIFT = 5
+FLAG_STRIDE_MASK = 0x60  # Dense block stride - 1
+
+# Preamble written in front of standard-LSB payloads, in the first LSBs of the flattened image:
+#   magic (3 bytes) | version (u8) | method (u8) | flags (u8)
+# Version 1 preambles have no flags byte and are still read.
+PREAMBLE_VERSION = 2
+PREAMBLE_FORMAT = ">3sBBB"
+PREAMBLE_SIZE = struct.calcsize(PREAMBLE_FORMAT)
+_PREAMBLE_V1_FORMAT = ">3sBB"
+
+
+def pack_header(method, min_var, max_var, payload_len, flags=0):
+    """
+       Builds the binary header.
+
+       Parameters:
+           method (int): One of the METHOD_* constants.
+           min_var (float): Minimum local variance of the carrier.
+           max_var (float): Maximum local variance of the carrier.
+           payload_len (int): Length of the payload that follows the header, in bytes.
+           flags (int): Method specific flags (0 if unused).
+
+       Returns:
+           bytes: HEADER_SIZE bytes.
+       """
+    return struct.pack(HEADER_FORMAT, MAGIC, VERSION, method, flags,
+                       float(min_var), float(max_var), payload_len)
+
+
+def header_bits(method, min_var, max_var, payload_len, flags=0):
+    header = pack_header(method, min_var, max_var, payload_len, flags)
+    return np.unpackbits(np.frombuffer(header, dtype=np.uint8))
+
+
+def unpack_header(data):
+    """
+       Parses a binary header.
+
+       Parameters:
+           data (bytes): At least HEADER_SIZE bytes read from the start of the carrier grid.
+
+       Returns:
+           dict or None: {'version', 'method', 'flags', 'min_var', 'max_var', 'length'}, or None if
+                         the data does not start with the magic (e.g. an image in the old text format).
+
+       Raises:
+           ValueError: If the magic matches but the version is not supported.
+       """
+    if len(data) < HEADER_SIZE or not data.startswith(MAGIC):
+        return None
+    magic, version, method, flags, min_var, max_var, length = struct.unpack(HEADER_FORMAT, data[:HEADER_SIZE])
+    if version != VERSION:
+        raise ValueError(f"Unsupported stego header version: {version}")
+    return {"version": version, "method": method, "flags": flags,
+            "min_var": min_var, "max_var": max_var, "length": length}
+
+
+def codec_flags(codec):
+    return (codec << FLAG_CODEC_SHIFT) & FLAG_CODEC_MASK
+
+
+def flags_codec(flags):
+    return (flags & FLAG_CODEC_MASK) >> FLAG_CODEC_SHIFT
+
+
+def stride_flags(stride):
+    return ((stride - 1) << FLAG_STRIDE_SHIFT) & FLAG_STRIDE_MASK
+
+
+def flags_stride(flags):
+    return ((flags & FLAG_STRIDE_MASK) >> FLAG_STRIDE_SHIFT) + 1
+
+
+def pack_preamble(method, flags=0):
+    """Builds the standard-LSB preamble for one of the METHOD_STANDARD_* constants."""
+    return struct.pack(PREAMBLE_FORMAT, MAGIC, PREAMBLE_VERSION, method, flags)
+
+
+def unpack_preamble(data):
+    """
+       Parses a standard-LSB preamble.
+
+       Parameters:
+           data (bytes): The first bytes of the standard-LSB payload.
+
+       Returns:
+           dict or None: {'method', 'flags', 'size'} where size is the preamble length in bytes,
+                         or None if the data does not start with the magic (e.g. an image
+                         embedded before the preamble was introduced).
+       """
+    if not data.startswith(MAGIC) or len(data) < struct.calcsize(_PREAMBLE_V1_FORMAT):
+        return None
+    version = data[len(MAGIC)]
+    if version == 1:
+        magic, version, method = struct.unpack(_PREAMBLE_V1_FORMAT, data[:struct.calcsize(_PREAMBLE_V1_FORMAT)])
+        return {"method": method, "flags": 0, "size": struct.calcsize(_PREAMBLE_V1_FORMAT)}
+    if version != PREAMBLE_VERSION or len(data) < PREAMBLE_SIZE:
+        return None
+    magic, version, method, flags = struct.unpack(PREAMBLE_FORMAT, data[:PREAMBLE_SIZE])
+    return {"method": method, "flags": flags, "size": PREAMBLE_SIZE}
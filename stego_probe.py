@@ -0,0 +1,89 @@
+from lazy_import import lazy_import
+from image_io import load_rgb_array
+from standard_lsb import probe_lsb_method
+from variance_kernel import extract_bits
+from stego_header import (HEADER_BITS, METHOD_VARIANCE_PLAINTEXT, METHOD_VARIANCE_AES,
+                          METHOD_STANDARD_PLAINTEXT, METHOD_STANDARD_AES, METHOD_STANDARD_X25519,
+                          METHOD_VARIANCE_X25519, METHOD_STANDARD_STREAM, METHOD_VARIANCE_STREAM,
+                          METHOD_STANDARD_SHARD, METHOD_VARIANCE_SHARD, unpack_header)
+import lsb_with_variance_aes
+import lsb_with_variance_plaintext
+
+np = lazy_import("numpy")
+
+# Menu codes used by main.py and the extract functions
+STANDARD_LSB = '1'
+VARIANCE_LSB = '2'
+
+_MENU_CODES = {
+    METHOD_STANDARD_PLAINTEXT: STANDARD_LSB,
+    METHOD_STANDARD_AES: STANDARD_LSB,
+    METHOD_STANDARD_X25519: STANDARD_LSB,
+    METHOD_STANDARD_STREAM: STANDARD_LSB,
+    METHOD_STANDARD_SHARD: STANDARD_LSB,
+    METHOD_VARIANCE_PLAINTEXT: VARIANCE_LSB,
+    METHOD_VARIANCE_AES: VARIANCE_LSB,
+    METHOD_VARIANCE_X25519: VARIANCE_LSB,
+    METHOD_VARIANCE_STREAM: VARIANCE_LSB,
+    METHOD_VARIANCE_SHARD: VARIANCE_LSB,
+}
+
+
+def probe_method(image):
+    """
+       Reads the embedding method stored in a stego image.
+
+       Two small reads are enough: the standard-LSB preamble in the first 40 channel values,
+       and the binary variance header in the first 72 blocks of the carrier grid.
+
+       Parameters:
+           image: Path, bytes, file-like object, PIL image or RGB array.
+
+       Returns:
+           int or None: One of the stego_header.METHOD_* constants, or None if the image
+                        carries neither a preamble nor a binary header.
+       """
+    array = load_rgb_array(image)
+    method = probe_lsb_method(array)
+    if method is not None:
+        return method
+    try:
+        header = unpack_header(np.packbits(extract_bits(array, HEADER_BITS)).tobytes())
+    except ValueError:
+        return None
+    return header["method"] if header is not None else None
+
+
+def _has_legacy_variance_header(array):
+    # Text headers of images embedded before the binary header existed
+    header_bytes = np.packbits(extract_bits(array, lsb_with_variance_aes.LEGACY_HEADER_BITS)).tobytes()
+    if lsb_with_variance_aes.parse_legacy_header(header_bytes) is not None:
+        return True
+    try:
+        lsb_with_variance_plaintext.parse_legacy_header(
+            header_bytes[:lsb_with_variance_plaintext.LEGACY_HEADER_BITS // 8])
+    except ValueError:
+        return False
+    return True
+
+
+def detect_method(image):
+    """
+       Detects how an image was embedded, replacing the old <image>.method.txt sidecar files.
+
+       Parameters:
+           image: Path, bytes, file-like object, PIL image or RGB array.
+
+       Returns:
+           str: '1' for standard LSB or '2' for variance-based LSB.
+
+       Notes:
+           - Images written by this version are recognized from their preamble or header.
+           - For older images the variance text header is tried; anything else is assumed
+             to be standard LSB.
+       """
+    array = load_rgb_array(image)
+    method = probe_method(array)
+    if method in _MENU_CODES:
+        return _MENU_CODES[method]
+    return VARIANCE_LSB if _has_legacy_variance_header(array) else STANDARD_LSB
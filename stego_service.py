@@ -0,0 +1,394 @@
+import argparse
+import asyncio
+import base64
+import binascii
+import contextlib
+import http.client
+import io
+import json
+import os
+import secrets
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+
+from exchange_sessions import ExchangeManager, MemorySessionStore, SQLiteSessionStore
+from image_io import encode_image
+
+# Asyncio HTTP front end for the four exchange steps (stdlib only).
+#
+# Requests and responses are JSON; images travel as base64-encoded image files (PNG out):
+#   POST /exchange/start          {"carrier", "method", "backend"}           -> {"session_id", "image"}
+#   POST /exchange/respond        {"image", "carrier"}                       -> {"session_id", "image"}
+#   POST /sessions/<id>/message   {"carrier", "method", "message", "b_image"} -> {"image"}
+#   POST /sessions/<id>/extract   {"image"}                                  -> {"message"}
+#   GET  /sessions/<id>           -> {"role", "backend", "state"}
+#   GET  /health                  -> {"status", "running", "pending"}
+# "b_image" (the image with B) completes the sender's session before the message is embedded;
+# it can be left out once the session is established. The receiver's session is closed after
+# its message is extracted.
+#
+# Session records live in the service process. Every step runs in a worker process on a copy of
+# its record, and the updated record is stored when the worker returns; session store calls run
+# in a thread. So the event loop never runs NumPy/PIL work or blocks on SQLite. At most
+# `workers` steps run at once; up to `max_pending` requests wait for a worker, and further
+# requests are refused with 503 and a Retry-After header.
+
+DEFAULT_PORT = 8080
+DEFAULT_MAX_BODY = 64 * 1024 * 1024
+DEFAULT_TIMEOUT = 60
+RETRY_AFTER = 1
+
+
+class HTTPError(Exception):
+    """An error response (status code and message)."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _exchange_step(step, session_id, record, args):
+    # Worker: runs one ExchangeManager step on a copy of the session record.
+    # Returns (result, updated record); images in the result are encoded as PNG bytes.
+    manager = ExchangeManager()
+    if record is not None:
+        manager.store.put(session_id, record)
+    with contextlib.redirect_stdout(io.StringIO()):
+        if step == "start":
+            _, array = manager.start(args["carrier"], args["method"], args["backend"], session_id)
+            result = {"image": encode_image(array)}
+        elif step == "respond":
+            _, array = manager.respond(args["image"], args["carrier"], session_id)
+            result = {"image": encode_image(array)}
+        elif step == "message":
+            if args.get("b_image") is not None:
+                manager.complete(session_id, args["b_image"])
+            array = manager.send_message(session_id, args["message"], args["carrier"], args["method"])
+            result = {"image": encode_image(array)}
+        elif step == "extract":
+            # Closing the session here also evicts its keys from this worker's key cache
+            result = {"message": manager.receive_message(session_id, args["image"])}
+        else:
+            raise ValueError(f"Unknown exchange step: {step!r}")
+    return result, manager.session(session_id)
+
+
+def _json_body(body):
+    try:
+        payload = json.loads(body or b"{}")
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "The request body is not valid JSON.")
+    if not isinstance(payload, dict):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "The request body must be a JSON object.")
+    return payload
+
+
+def _image_field(payload, name, required=True):
+    value = payload.get(name)
+    if value is None and not required:
+        return None
+    if not isinstance(value, str):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"Missing base64 image field '{name}'.")
+    try:
+        return base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"Field '{name}' is not valid base64.")
+
+
+def _method_field(payload):
+    method = str(payload.get("method", "1"))
+    if method not in ('1', '2'):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid LSB method.")
+    return method
+
+
+def _encode_image_field(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+async def _read_request(reader, max_body):
+    # Returns (method, path, version, headers, body), or None when the client closed the connection
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line.")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HTTPError(HTTPStatus.LENGTH_REQUIRED, "Chunked requests are not supported.")
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length.")
+    if length > max_body:
+        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"The request body exceeds {max_body} bytes.")
+    body = await reader.readexactly(length) if length > 0 else b""
+    return method.upper(), target.split("?", 1)[0], version, headers, body
+
+
+class StegoService:
+    """
+       Asyncio HTTP service for the four exchange steps.
+
+       Parameters:
+           store (MemorySessionStore, SQLiteSessionStore or None): Session store.
+                                                                   Defaults to a new MemorySessionStore.
+           workers (int or None): Worker processes, and steps run at once. Defaults to os.cpu_count().
+           max_pending (int or None): Requests that may wait for a worker before new ones are
+                                      refused with 503. Defaults to 4 * workers.
+           max_body (int): Largest accepted request body, in bytes.
+           timeout (float): Seconds a connection may take to send a request.
+       """
+
+    def __init__(self, store=None, workers=None, max_pending=None, max_body=DEFAULT_MAX_BODY,
+                 timeout=DEFAULT_TIMEOUT):
+        self.store = store if store is not None else MemorySessionStore()
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending if max_pending is not None else 4 * self.workers
+        self.max_body = max_body
+        self.timeout = timeout
+        self._executor = None
+        self._slots = None
+        self._running = 0
+        self._pending = 0
+
+    async def start(self, host="127.0.0.1", port=DEFAULT_PORT):
+        """
+           Starts the worker pool and the HTTP server.
+
+           Returns:
+               asyncio.Server: The listening server (port 0 picks a free port, see server.sockets).
+           """
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._slots = asyncio.Semaphore(self.workers)
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    async def _offload(self, step, session_id, record, args):
+        # Runs a step in the worker pool, or refuses it if too many requests are waiting
+        if self._pending >= self.max_pending:
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "The service is busy, retry later.")
+        self._pending += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._pending -= 1
+        self._running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, _exchange_step, step, session_id, record, args)
+        finally:
+            self._running -= 1
+            self._slots.release()
+
+    async def _store(self, operation, *args):
+        # Session store calls run in the default thread pool (SQLite stores do file I/O)
+        return await asyncio.get_running_loop().run_in_executor(None, getattr(self.store, operation), *args)
+
+    async def _session(self, session_id):
+        record = await self._store("get", session_id)
+        if record is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Unknown or expired session: {session_id}")
+        return record
+
+    async def dispatch(self, method, path, body):
+        """
+           Handles one request.
+
+           Returns:
+               tuple: (HTTP status, JSON-serializable response body).
+           """
+        parts = [part for part in path.split("/") if part]
+        if method == "GET" and parts == ["health"]:
+            return HTTPStatus.OK, {"status": "ok", "running": self._running, "pending": self._pending}
+        if method == "GET" and len(parts) == 2 and parts[0] == "sessions":
+            record = await self._session(parts[1])
+            return HTTPStatus.OK, {key: record.get(key) for key in ("role", "backend", "state")}
+        if method != "POST":
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"No route for {method} {path}")
+
+        payload = _json_body(body)
+        if parts == ["exchange", "start"]:
+            backend = payload.get("backend", "dh")
+            if backend not in ("dh", "x25519"):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, f"Unknown key exchange backend: {backend!r}")
+            session_id = secrets.token_urlsafe(16)
+            result, record = await self._offload("start", session_id, None, {
+                "carrier": _image_field(payload, "carrier"), "method": _method_field(payload), "backend": backend})
+            await self._store("put", session_id, record)
+            return HTTPStatus.CREATED, {"session_id": session_id, "image": _encode_image_field(result["image"])}
+
+        if parts == ["exchange", "respond"]:
+            session_id = secrets.token_urlsafe(16)
+            result, record = await self._offload("respond", session_id, None, {
+                "image": _image_field(payload, "image"), "carrier": _image_field(payload, "carrier")})
+            await self._store("put", session_id, record)
+            return HTTPStatus.CREATED, {"session_id": session_id, "image": _encode_image_field(result["image"])}
+
+        if len(parts) == 3 and parts[0] == "sessions" and parts[2] == "message":
+            session_id = parts[1]
+            message = payload.get("message")
+            if not isinstance(message, str):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Missing text field 'message'.")
+            result, record = await self._offload("message", session_id, await self._session(session_id), {
+                "carrier": _image_field(payload, "carrier"), "method": _method_field(payload),
+                "message": message, "b_image": _image_field(payload, "b_image", required=False)})
+            await self._store("put", session_id, record)
+            return HTTPStatus.OK, {"image": _encode_image_field(result["image"])}
+
+        if len(parts) == 3 and parts[0] == "sessions" and parts[2] == "extract":
+            session_id = parts[1]
+            result, _ = await self._offload("extract", session_id, await self._session(session_id),
+                                            {"image": _image_field(payload, "image")})
+            await self._store("delete", session_id)
+            return HTTPStatus.OK, {"message": result["message"]}
+
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"No route for {method} {path}")
+
+    async def handle_connection(self, reader, writer):
+        """Serves the requests of one connection (HTTP/1.1 keep-alive)."""
+        try:
+            while True:
+                close = False
+                try:
+                    request = await asyncio.wait_for(_read_request(reader, self.max_body), self.timeout)
+                    if request is None:
+                        break
+                    method, path, version, headers, body = request
+                    close = (headers.get("connection", "").lower() == "close"
+                             or version == "HTTP/1.0" and headers.get("connection", "").lower() != "keep-alive")
+                    status, response = await self.dispatch(method, path, body)
+                except (asyncio.TimeoutError, ConnectionError, asyncio.IncompleteReadError):
+                    break
+                except HTTPError as e:
+                    status, response = e.status, {"error": e.message}
+                    close = close or e.status in (HTTPStatus.BAD_REQUEST, HTTPStatus.LENGTH_REQUIRED,
+                                                  HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+                except ValueError as e:
+                    status, response = HTTPStatus.BAD_REQUEST, {"error": str(e)}
+                except OSError as e:
+                    # Images arrive in memory, so this is an image PIL cannot decode
+                    status, response = HTTPStatus.BAD_REQUEST, {"error": f"Invalid image: {type(e).__name__}"}
+                except Exception as e:
+                    print(f" Request failed: {type(e).__name__}: {e}", file=sys.stderr)
+                    status, response = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Internal server error."}
+                await self._write_response(writer, status, response, close)
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def _write_response(self, writer, status, response, close):
+        status = HTTPStatus(status)
+        data = json.dumps(response).encode("utf-8")
+        headers = [f"HTTP/1.1 {status.value} {status.phrase}", "Content-Type: application/json",
+                   f"Content-Length: {len(data)}", f"Connection: {'close' if close else 'keep-alive'}"]
+        if status == HTTPStatus.SERVICE_UNAVAILABLE:
+            headers.append(f"Retry-After: {RETRY_AFTER}")
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + data)
+        await writer.drain()
+
+
+class ServiceClient:
+    """
+       Minimal blocking client of StegoService, for local use and tests.
+
+       Images are passed as encoded image bytes and returned as PNG bytes.
+
+       Raises:
+           ValueError: From every method, if the service answers with an error.
+       """
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, timeout=DEFAULT_TIMEOUT):
+        self._connection = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def request(self, method, path, payload=None):
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        self._connection.request(method, path, body=body, headers=headers)
+        response = self._connection.getresponse()
+        data = json.loads(response.read() or b"{}")
+        if response.status >= 400:
+            raise ValueError(f"{response.status} {response.reason}: {data.get('error')}")
+        return data
+
+    def start(self, carrier, method, backend="dh"):
+        """Step 1 (sender). Returns (session_id, PNG bytes with the public values)."""
+        data = self.request("POST", "/exchange/start", {"carrier": _encode_image_field(carrier),
+                                                         "method": method, "backend": backend})
+        return data["session_id"], base64.b64decode(data["image"])
+
+    def respond(self, dh_image, carrier):
+        """Step 2 (receiver). Returns (session_id, PNG bytes with B)."""
+        data = self.request("POST", "/exchange/respond", {"image": _encode_image_field(dh_image),
+                                                           "carrier": _encode_image_field(carrier)})
+        return data["session_id"], base64.b64decode(data["image"])
+
+    def send_message(self, session_id, message, carrier, method, b_image=None):
+        """Step 3 (sender). Returns PNG bytes with the encrypted message."""
+        payload = {"message": message, "carrier": _encode_image_field(carrier), "method": method}
+        if b_image is not None:
+            payload["b_image"] = _encode_image_field(b_image)
+        return base64.b64decode(self.request("POST", f"/sessions/{session_id}/message", payload)["image"])
+
+    def receive_message(self, session_id, image):
+        """Step 4 (receiver). Returns the message, or None if it could not be recovered."""
+        return self.request("POST", f"/sessions/{session_id}/extract",
+                            {"image": _encode_image_field(image)})["message"]
+
+    def close(self):
+        self._connection.close()
+
+
+async def serve(service, host, port):
+    server = await service.start(host, port)
+    address = server.sockets[0].getsockname()
+    print(f" Serving on http://{address[0]}:{address[1]} with {service.workers} workers")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the four exchange steps over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes")
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="requests waiting for a worker before 503 is returned")
+    parser.add_argument("--sessions", default=None, help="SQLite session database (default: in memory)")
+    parser.add_argument("--ttl", type=float, default=None, help="session lifetime in seconds")
+    args = parser.parse_args(argv)
+
+    store_args = {"ttl": args.ttl} if args.ttl is not None else {}
+    store = SQLiteSessionStore(args.sessions, **store_args) if args.sessions else MemorySessionStore(**store_args)
+    service = StegoService(store, workers=args.workers, max_pending=args.max_pending)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import io
+import os
+
+import numpy as np
+import pytest
+
+from conftest import ROOT
+from aes_stream import (STREAM_HEADER_SIZE, TAG_SIZE, decrypt_stream, embed_file, embed_stream, encrypt_stream,
+                        extract_file, extract_stream)
+from image_io import load_rgb_array
+from key_derivation import INFO_STREAM, derive_key
+from standard_lsb import read_lsb_preamble
+from stego_header import FLAG_HKDF, HEADER_BITS, METHOD_VARIANCE_STREAM, header_bits, unpack_header
+from variance_cache import cached_variance_map
+from variance_kernel import embed_bits, extract_bits, stable_gray
+
+CARRIER = os.path.join(ROOT, "horse.png")
+CHUNK_SIZE = 1024
+DATA = np.random.default_rng(18).integers(0, 256, 5000, dtype=np.uint8).tobytes()  # 5 chunks
+
+
+def _embed(method, S=1875):
+    return embed_stream(io.BytesIO(DATA), len(DATA), S, CARRIER, method, CHUNK_SIZE)
+
+
+def _flip_stream_byte(array, method, offset):
+    # Flips one bit of the embedded stream at a byte offset (0 = first byte of the stream header)
+    if method == '1':
+        array.reshape(-1)[(read_lsb_preamble(array)["size"] + offset) * 8] ^= 1
+        return
+    header = unpack_header(np.packbits(extract_bits(array, HEADER_BITS)).tobytes())
+    var_map = cached_variance_map(stable_gray(array))
+    start_bit = HEADER_BITS + offset * 8
+    bits = extract_bits(array, 8, var_map, header["min_var"], header["max_var"], start_bit=start_bit)[:8]
+    bits[0] ^= 1
+    embed_bits(array, var_map, header["min_var"], header["max_var"], bits, start_bit=start_bit)
+
+
+def _frames(key):
+    # (stream header, [frame, ...]) as written by encrypt_stream()
+    header, *frames = encrypt_stream(io.BytesIO(DATA), len(DATA), key, CHUNK_SIZE)
+    return header, frames
+
+
+@pytest.mark.parametrize("method", ['1', '2'])
+def test_file_round_trip(tmp_path, method):
+    source, output = tmp_path / "source.bin", tmp_path / "out.bin"
+    source.write_bytes(DATA)
+    embed_file(str(source), 1875, CARRIER, str(tmp_path / "stego.png"), method, CHUNK_SIZE)
+    assert extract_file(str(tmp_path / "stego.png"), 1875, str(output)) == len(DATA)
+    assert output.read_bytes() == DATA
+
+
+@pytest.mark.parametrize("method", ['1', '2'])
+def test_empty_stream(method):
+    array = embed_stream(io.BytesIO(b""), 0, "secret", CARRIER, method)
+    assert list(extract_stream(array, "secret")) == [b""]
+
+
+@pytest.mark.parametrize("method", ['1', '2'])
+def test_wrong_key_fails_on_first_chunk(method):
+    array = _embed(method)
+    chunks = extract_stream(array, 1876)
+    with pytest.raises(ValueError, match="chunk 0"):
+        next(chunks)
+
+
+@pytest.mark.parametrize("method", ['1', '2'])
+def test_modified_frame_is_rejected(tmp_path, method):
+    array = _embed(method)
+    # A bit inside the third frame: the first two chunks are still authentic
+    _flip_stream_byte(array, method, STREAM_HEADER_SIZE + 2 * (CHUNK_SIZE + TAG_SIZE) + 10)
+    chunks = extract_stream(array, 1875)
+    assert next(chunks) + next(chunks) == DATA[:2 * CHUNK_SIZE]
+    with pytest.raises(ValueError, match="chunk 2"):
+        next(chunks)
+
+    output = tmp_path / "out.bin"
+    with pytest.raises(ValueError, match="chunk 2"):
+        extract_file(array, 1875, str(output))
+    assert not output.exists() and not (tmp_path / "out.bin.part").exists()
+
+
+@pytest.mark.parametrize("method", ['1', '2'])
+def test_truncated_stream_leaves_no_output(tmp_path, method):
+    array = _embed(method)
+    if method == '1':
+        # Cropping the image cuts the stream, which runs row by row
+        array = np.ascontiguousarray(array[:8])
+    else:
+        # Shorten the length in the header by 100 bytes
+        header = unpack_header(np.packbits(extract_bits(array, HEADER_BITS)).tobytes())
+        embed_bits(array, None, header["min_var"], header["max_var"],
+                   header_bits(METHOD_VARIANCE_STREAM, header["min_var"], header["max_var"],
+                               header["length"] - 100, FLAG_HKDF))
+    output = tmp_path / "out.bin"
+    with pytest.raises(ValueError, match="truncated"):
+        extract_file(array, 1875, str(output))
+    assert not output.exists() and not (tmp_path / "out.bin.part").exists()
+
+
+def test_reordered_frames_are_rejected():
+    key = derive_key(1875, INFO_STREAM)
+    header, frames = _frames(key)
+    frames[1], frames[2] = frames[2], frames[1]
+    chunks = decrypt_stream(io.BytesIO(header + b"".join(frames)).read, key)
+    assert next(chunks) == DATA[:CHUNK_SIZE]
+    with pytest.raises(ValueError, match="chunk 1"):
+        next(chunks)
+
+
+def test_dropped_last_frame_is_rejected():
+    # A stream cut at a frame boundary must not pass as a shorter plaintext
+    key = derive_key(1875, INFO_STREAM)
+    header, frames = _frames(key)
+    with pytest.raises(ValueError, match="truncated at chunk 4"):
+        list(decrypt_stream(io.BytesIO(header + b"".join(frames[:-1])).read, key))
+
+
+def test_source_shorter_than_size():
+    with pytest.raises(ValueError, match="announced size"):
+        list(encrypt_stream(io.BytesIO(DATA[:100]), len(DATA), derive_key(1875, INFO_STREAM), CHUNK_SIZE))
+
+
+def test_image_without_stream():
+    with pytest.raises(ValueError, match="does not contain an encrypted stream"):
+        list(extract_stream(load_rgb_array(os.path.join(ROOT, "clean.png")), 1875))
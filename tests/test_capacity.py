@@ -0,0 +1,52 @@
+import io
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from capacity import capacity
+import embed_and_extract_B_Into_Image_12
+import embed_dh_values_into_image_11
+import encrypt_and_hide_message_3
+import lsb_with_variance_aes
+import lsb_with_variance_plaintext
+
+# Oversized payloads must be rejected from the image dimensions alone, before the carrier is decoded
+MODULES = (lsb_with_variance_plaintext, lsb_with_variance_aes, embed_dh_values_into_image_11,
+           embed_and_extract_B_Into_Image_12, encrypt_and_hide_message_3)
+
+
+@pytest.fixture
+def carrier():
+    buffer = io.BytesIO()
+    Image.fromarray(np.random.default_rng(20).integers(0, 256, (12, 12, 3), dtype=np.uint8)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def no_decoding(monkeypatch):
+    def load_rgb_array(*args, **kwargs):
+        raise AssertionError("the carrier was decoded")
+    for module in MODULES:
+        monkeypatch.setattr(module, "load_rgb_array", load_rgb_array)
+
+
+def test_capacity_from_dimensions(carrier):
+    # 12x12: 432 bits standard (54 bytes), 4x4 blocks of 2 bits variance (4 bytes)
+    assert capacity(carrier, '1') == 54 - 6 - 6
+    assert capacity(carrier, '2') == 0
+
+
+@pytest.mark.parametrize("embed", [
+    lambda carrier: lsb_with_variance_plaintext.embed_message_variance("x" * 100, carrier, os.devnull),
+    lambda carrier: lsb_with_variance_aes.embed_message_variance("x" * 100, carrier, os.devnull, "4242"),
+    lambda carrier: embed_dh_values_into_image_11.embed_dh_values(7919, 2, 10 ** 60, carrier, '1'),
+    lambda carrier: embed_dh_values_into_image_11.embed_dh_values(7919, 2, 1234, carrier, '2'),
+    lambda carrier: embed_dh_values_into_image_11.embed_dh_values(None, None, bytes(range(32)), carrier, '2'),
+    lambda carrier: embed_and_extract_B_Into_Image_12.embed_B(10 ** 60, carrier),
+    lambda carrier: encrypt_and_hide_message_3.encrypt_and_embed("x" * 100, 1875, carrier, '1', compress=False),
+])
+def test_rejected_before_decoding(carrier, no_decoding, embed):
+    with pytest.raises(ValueError, match="too large"):
+        embed(carrier)
@@ -0,0 +1,45 @@
+import os
+import threading
+
+import pytest
+
+from conftest import ROOT
+import dh_key_exchange_10
+import keypair_pool
+from embed_dh_values_into_image_11 import embed_dh_values
+from exchange_sessions import ExchangeManager
+
+CARRIER = os.path.join(ROOT, "clean.png")
+
+# A 2048-bit safe prime (RFC 3526 group 14)
+MODP_2048 = int(
+    "FFFFFFFFFFFFFFFFC90FDAA22168C234C4C6628B80DC1CD129024E088A67CC74020BBEA63B139B22514A08798E3404DD"
+    "EF9519B3CD3A431B302B0A6DF25F14374FE1356D6D51C245E485B576625E7EC6F44C42E9A637ED6B0BFF5CB6F406B7ED"
+    "EE386BFB5A899FA5AE9F24117C4B1FE649286651ECE45B3DC2007CB8A163BF0598DA48361C55D39A69163FA8FD24CF5F"
+    "83655D23DCA3AD961C62F356208552BB9ED529077096966D670C354E4ABC9804F1746C08CA18217C32905E462E36CE3B"
+    "E39E772C180E86039B2783A2EC07A28FB5C55DF06F4C52C9DE2BCBF6955817183995497CEA956AE515D2261898FA0510"
+    "15728E5A8AACAA68FFFFFFFFFFFFFFFF", 16)
+
+
+def _pool_threads():
+    return sum(thread.name == "keypair-pool" for thread in threading.enumerate())
+
+
+def test_untrusted_groups_create_no_pools():
+    manager = ExchangeManager()
+    manager.respond(embed_dh_values(dh_key_exchange_10.p, dh_key_exchange_10.g, 5, CARRIER, '1'), CARRIER)
+    pools, threads = len(keypair_pool._pools), _pool_threads()
+    for offset in range(3):
+        p = MODP_2048 + 2 * offset  # Size check only; primality is not what bounds the work
+        manager.respond(embed_dh_values(p, 2, 12345, CARRIER, '1'), CARRIER)
+    assert len(keypair_pool._pools) == pools
+    assert _pool_threads() == threads
+
+
+@pytest.mark.parametrize("p, g, A", [(7907, 2, 5), (2 ** 9000 + 1, 2, 5), (dh_key_exchange_10.p, 1, 5),
+                                     (dh_key_exchange_10.p, dh_key_exchange_10.g, 1)])
+def test_rejected_groups(p, g, A):
+    pools = len(keypair_pool._pools)
+    with pytest.raises(ValueError):
+        ExchangeManager().respond(embed_dh_values(p, g, A, CARRIER, '1'), CARRIER)
+    assert len(keypair_pool._pools) == pools
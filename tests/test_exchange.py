@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+from conftest import ROOT
+from exchange_sessions import ExchangeManager
+from extract_dh_from_image_2 import extract_dh_from_image
+
+CLEAN_IMAGE = os.path.join(ROOT, "clean.png")
+CARRIER = os.path.join(ROOT, "dog.png")
+
+
+@pytest.mark.parametrize("method", [None, '1', '2'])
+def test_extract_dh_without_payload(method):
+    assert extract_dh_from_image(CLEAN_IMAGE, method) == (None, None, None)
+
+
+def test_respond_without_payload_raises_value_error():
+    manager = ExchangeManager()
+    with pytest.raises(ValueError, match="No valid DH values"):
+        manager.respond(CLEAN_IMAGE, CARRIER)
+    assert len(manager.store) == 0
+
+
+@pytest.mark.parametrize("backend", ["dh", "x25519"])
+@pytest.mark.parametrize("method", ['1', '2'])
+def test_exchange_round_trip(backend, method):
+    manager = ExchangeManager()
+    sender, dh_image = manager.start(os.path.join(ROOT, "horse.png"), method, backend)
+    receiver, b_image = manager.respond(dh_image, CARRIER)
+    manager.complete(sender, b_image)
+    stego = manager.send_message(sender, "round trip", CLEAN_IMAGE, method)
+    assert manager.receive_message(receiver, stego) == "round trip"
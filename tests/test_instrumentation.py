@@ -0,0 +1,52 @@
+import threading
+import time
+
+from instrumentation import instrument, stage
+
+
+def test_disabled_stage_ignores_fields():
+    with stage("variance_map") as s:
+        s.pixels = 100
+        s.bits = 8
+    with stage("variance_map") as other:
+        assert other is s
+        assert not hasattr(other, "pixels") and not hasattr(other, "bits")
+
+
+def test_enabled_stage_reports_fields():
+    with instrument() as records:
+        with stage("embed") as s:
+            s.pixels = 100
+            s.bits = 8
+    assert [(r["stage"], r["pixels"], r["bits"]) for r in records] == [("embed", 100, 8)]
+    with stage("embed") as s:
+        s.pixels = 1
+    assert not hasattr(s, "pixels")
+
+
+def test_memory_peaks_of_concurrent_threads():
+    # tracemalloc has one peak per process: a stage in another thread must not reset ours
+    allocated = threading.Event()
+    results = {}
+
+    def big():
+        with stage("big"):
+            data = bytearray(8 * 1024 * 1024)
+            del data
+            allocated.set()
+            time.sleep(0.2)
+
+    def small():
+        allocated.wait()
+        with stage("small"):
+            results["small"] = bytearray(1024)
+
+    with instrument(memory=True) as records:
+        threads = [threading.Thread(target=big), threading.Thread(target=small)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    peaks = {record["stage"]: record["peak_bytes"] for record in records}
+    assert peaks["big"] >= 8 * 1024 * 1024
+    assert 1024 <= peaks["small"] < 1024 * 1024
@@ -0,0 +1,91 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from conftest import ROOT
+from sharding import carrier_capacity, embed_sharded, extract_sharded, plan_shards
+
+MESSAGE = "".join(f"shard test line {i}: {i * 7919 % 10007}\n" for i in range(200))
+SECRET = "1875"
+
+
+@pytest.fixture(scope="module")
+def carriers(tmp_path_factory):
+    # Small crops of horse.png of different sizes, so the message needs several of them
+    directory = tmp_path_factory.mktemp("carriers")
+    horse = Image.open(os.path.join(ROOT, "horse.png")).convert("RGB")
+    paths = []
+    for i, (width, height) in enumerate([(60, 45), (90, 60), (45, 45), (120, 75), (30, 30)]):
+        path = str(directory / f"carrier_{i}.png")
+        horse.crop((i * 100, i * 50, i * 100 + width, i * 50 + height)).save(path)
+        paths.append(path)
+    return paths
+
+
+def _check_plan(plan, payload_size, carriers, capacities):
+    assert sum(size for _, size in plan) == payload_size
+    for carrier, size in plan:
+        assert 0 < size <= capacities[carriers.index(carrier)]
+
+
+def test_plan_is_proportional():
+    carriers = ["a", "b", "c", "d"]
+    capacities = [100, 300, 50, 200]
+    plan = plan_shards(450, carriers, "1", capacities=capacities)
+    # The two largest carriers cover the payload and share it 3:2
+    assert plan == [("b", 270), ("d", 180)]
+
+
+def test_plan_sizes_fit():
+    rng = np.random.default_rng(22)
+    for _ in range(200):
+        n = int(rng.integers(1, 12))
+        capacities = [int(c) for c in rng.integers(0, 5000, n)]
+        carriers = [f"carrier_{i}" for i in range(n)]
+        payload_size = int(rng.integers(1, max(2, sum(capacities) + 1)))
+        if payload_size > sum(capacities):
+            continue
+        _check_plan(plan_shards(payload_size, carriers, "1", capacities=capacities), payload_size, carriers,
+                    capacities)
+
+
+def test_plan_uses_real_capacities(carriers):
+    capacities = [carrier_capacity(carrier, "2") for carrier in carriers]
+    payload_size = sum(capacities) - 10
+    _check_plan(plan_shards(payload_size, carriers, "2"), payload_size, carriers, capacities)
+
+
+def test_pool_too_small():
+    with pytest.raises(ValueError, match="cannot hold the payload"):
+        plan_shards(1000, ["a", "b", "c"], "1", capacities=[400, 500, 0])
+
+
+@pytest.mark.parametrize("method", ['1', '2'])
+def test_round_trip_in_any_order(tmp_path, carriers, method):
+    # The variance method holds about 1/16 of the standard one
+    message = MESSAGE if method == '1' else MESSAGE[:300]
+    outputs = embed_sharded(message, SECRET, carriers, str(tmp_path), method, workers=1, compress=False)
+    assert len(outputs) > 1
+    assert extract_sharded(outputs, SECRET, workers=1) == message
+    assert extract_sharded(outputs[::-1], SECRET, workers=1) == message
+
+
+def test_missing_shard(tmp_path, carriers):
+    outputs = embed_sharded(MESSAGE, SECRET, carriers, str(tmp_path), '1', workers=1, compress=False)
+    with pytest.raises(ValueError, match=r"Missing shards: \[1\]"):
+        extract_sharded(outputs[:1] + outputs[2:], SECRET, workers=1)
+
+
+def test_mixed_sets(tmp_path, carriers):
+    first = embed_sharded(MESSAGE, SECRET, carriers, str(tmp_path / "first"), '1', workers=1, compress=False)
+    second = embed_sharded(MESSAGE, SECRET, carriers, str(tmp_path / "second"), '1', workers=1, compress=False)
+    assert len(first) == len(second)
+    with pytest.raises(ValueError, match="different messages"):
+        extract_sharded(first[:-1] + second[-1:], SECRET, workers=1)
+
+
+def test_image_without_shard(carriers):
+    with pytest.raises(ValueError, match="does not contain a payload shard"):
+        extract_sharded(carriers[:1], SECRET, workers=1)
@@ -0,0 +1,21 @@
+import pytest
+
+from startup_benchmark import BUDGETS, run_startup_benchmark
+
+# Budgets are tuned on a developer machine; shared CI runners get some headroom
+TOLERANCE = 3.0
+
+
+@pytest.fixture(scope="module")
+def records():
+    return {record["module"]: record for record in run_startup_benchmark(repeat=3, scale=TOLERANCE)}
+
+
+@pytest.mark.parametrize("module", sorted(BUDGETS))
+def test_entry_point_within_budget(records, module):
+    record = records[module]
+    assert record["loaded"] == [], f"importing {module} loads {', '.join(record['loaded'])}"
+    assert record["seconds"] <= record["budget_seconds"], (
+        f"{module} imports in {record['seconds'] * 1000:.1f} ms "
+        f"(budget {record['budget_seconds'] * 1000:.0f} ms)")
+    assert record["ok"]
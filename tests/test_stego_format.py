@@ -0,0 +1,93 @@
+import contextlib
+import io
+import os
+
+import pytest
+
+from conftest import ROOT
+from embed_and_extract_B_Into_Image_12 import extract_B_from_image
+from extract_and_decrypt_message_4 import extract_and_decrypt_message
+from extract_dh_from_image_2 import extract_dh_from_image
+from image_io import load_rgb_array
+import lsb_with_variance_aes
+import lsb_with_variance_plaintext
+from stego_header import (FLAG_BINARY, FLAG_HKDF, HEADER_SIZE, METHOD_STANDARD_AES, METHOD_VARIANCE_AES,
+                          pack_header, pack_preamble, unpack_header, unpack_preamble)
+import stego_header
+from stego_probe import detect_method
+from variance_tiled import extract_message_variance_tiled
+
+# Images written by the code of the baseline commit (text header, hex ciphertext, no preamble):
+# small crops of horse.png, with the DH values p=7919, g=2, A=1234, B=5555 and the secret 4242.
+LEGACY = os.path.join(ROOT, "tests", "fixtures", "legacy")
+
+
+def _quiet(function, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args)
+
+
+def test_header_layout():
+    # Existing images depend on these bytes: never change them without bumping VERSION
+    header = pack_header(METHOD_VARIANCE_AES, 1.5, 200.25, 1234, FLAG_BINARY | FLAG_HKDF)
+    assert HEADER_SIZE == 18
+    assert header == bytes.fromhex("537447" "01" "02" "09" "3fc00000" "43484000" "000004d2")
+    assert unpack_header(header) == {"version": 1, "method": METHOD_VARIANCE_AES, "flags": 9,
+                                     "min_var": 1.5, "max_var": 200.25, "length": 1234}
+
+
+def test_method_and_flag_values():
+    assert [getattr(stego_header, name) for name in (
+        "METHOD_VARIANCE_PLAINTEXT", "METHOD_VARIANCE_AES", "METHOD_STANDARD_PLAINTEXT", "METHOD_STANDARD_AES",
+        "METHOD_STANDARD_X25519", "METHOD_VARIANCE_X25519", "METHOD_STANDARD_STREAM", "METHOD_VARIANCE_STREAM",
+        "METHOD_STANDARD_SHARD", "METHOD_VARIANCE_SHARD")] == list(range(1, 11))
+    assert (stego_header.FLAG_BINARY, stego_header.FLAG_CODEC_MASK, stego_header.FLAG_HKDF,
+            stego_header.FLAG_DENSE, stego_header.FLAG_STRIDE_MASK) == (0x01, 0x06, 0x08, 0x10, 0x60)
+
+
+def test_header_rejects_other_data():
+    assert unpack_header(b"12.345678,99.000000|0040|") is None
+    assert unpack_header(b"StG") is None
+    with pytest.raises(ValueError, match="version"):
+        unpack_header(b"StG\x02" + bytes(HEADER_SIZE))
+
+
+def test_preamble_layout():
+    assert pack_preamble(METHOD_STANDARD_AES, FLAG_HKDF) == b"StG\x02\x04\x08"
+    assert unpack_preamble(b"StG\x02\x04\x08rest") == {"method": METHOD_STANDARD_AES, "flags": FLAG_HKDF, "size": 6}
+    # Version 1 preambles have no flags byte
+    assert unpack_preamble(b"StG\x01\x04rest") == {"method": METHOD_STANDARD_AES, "flags": 0, "size": 5}
+    assert unpack_preamble(b"legacy") is None
+
+
+def _legacy(name):
+    return os.path.join(LEGACY, name)
+
+
+def test_legacy_variance_messages():
+    assert _quiet(lsb_with_variance_plaintext.extract_message_variance,
+                  _legacy("variance_plaintext.png")) == "Hello legacy plaintext variance"
+    assert _quiet(lsb_with_variance_aes.extract_message_variance,
+                  _legacy("variance_aes.png"), "4242") == "Hello legacy aes variance"
+    assert _quiet(extract_message_variance_tiled, load_rgb_array(_legacy("variance_plaintext.png")),
+                  None, 30) == "Hello legacy plaintext variance"
+    assert _quiet(extract_message_variance_tiled, load_rgb_array(_legacy("variance_aes.png")),
+                  "4242", 30) == "Hello legacy aes variance"
+
+
+@pytest.mark.parametrize("name, method", [
+    ("dh_standard.png", '1'), ("dh_variance.png", '2'), ("message_standard.png", '1'),
+    ("message_variance.png", '2'), ("b_standard.png", '1'), ("variance_plaintext.png", '2'),
+    ("variance_aes.png", '2'),
+])
+def test_legacy_method_detection(name, method):
+    assert detect_method(_legacy(name)) == method
+
+
+def test_legacy_exchange_steps():
+    for name in ("dh_standard.png", "dh_variance.png"):
+        assert _quiet(extract_dh_from_image, _legacy(name)) == (7919, 2, 1234)
+    # Old images carry B as text
+    assert _quiet(extract_B_from_image, _legacy("b_standard.png")) == "5555"
+    assert _quiet(extract_and_decrypt_message, _legacy("message_standard.png"), 4242) == "legacy std aes"
+    assert _quiet(extract_and_decrypt_message, _legacy("message_variance.png"), 4242) == "legacy var aes"
@@ -0,0 +1,100 @@
+import asyncio
+import base64
+import os
+import threading
+
+import pytest
+
+from conftest import ROOT
+from exchange_sessions import ExchangeManager, SQLiteSessionStore
+from image_io import encode_image
+from key_derivation import key_cache
+from stego_service import ServiceClient, StegoService, _exchange_step
+
+
+def _read(name):
+    with open(os.path.join(ROOT, name), "rb") as f:
+        return f.read()
+
+
+@pytest.fixture(scope="module")
+def service_port(tmp_path_factory):
+    # Runs the service on a free port in a background event loop
+    service = StegoService(SQLiteSessionStore(str(tmp_path_factory.mktemp("svc") / "sessions.db")), workers=2)
+    ready = threading.Event()
+    state = {}
+
+    async def run():
+        server = await service.start("127.0.0.1", 0)
+        state["port"] = server.sockets[0].getsockname()[1]
+        state["loop"], state["server"] = asyncio.get_running_loop(), server
+        ready.set()
+        async with server:
+            try:
+                await server.serve_forever()
+            except asyncio.CancelledError:
+                pass
+
+    thread = threading.Thread(target=lambda: asyncio.run(run()), daemon=True)
+    thread.start()
+    assert ready.wait(30)
+    yield state["port"]
+    state["loop"].call_soon_threadsafe(state["server"].close)
+    thread.join(30)
+    service.close()
+
+
+@pytest.fixture
+def client(service_port):
+    client = ServiceClient(port=service_port)
+    yield client
+    client.close()
+
+
+@pytest.mark.parametrize("backend", ["dh", "x25519"])
+@pytest.mark.parametrize("method", ['1', '2'])
+def test_four_steps(client, backend, method):
+    sender, dh_image = client.start(_read("horse.png"), method, backend)
+    receiver, b_image = client.respond(dh_image, _read("dog.png"))
+    assert client.request("GET", f"/sessions/{sender}")["state"] == "awaiting_response"
+    assert client.request("GET", f"/sessions/{receiver}")["state"] == "established"
+
+    stego = client.send_message(sender, f"hello {backend} {method}", _read("clean.png"), method, b_image=b_image)
+    assert client.receive_message(receiver, stego) == f"hello {backend} {method}"
+    with pytest.raises(ValueError, match="404"):
+        client.receive_message(receiver, stego)
+
+
+@pytest.mark.parametrize("path, payload", [
+    ("/exchange/start", {"carrier": "not base64!"}),
+    ("/exchange/start", {"carrier": base64.b64encode(b"not an image").decode(), "method": "1"}),
+    ("/exchange/start", {"carrier": base64.b64encode(_read("clean.png")).decode(), "method": "3"}),
+    ("/exchange/respond", {"image": base64.b64encode(_read("clean.png")).decode(),
+                           "carrier": base64.b64encode(_read("dog.png")).decode()}),
+])
+def test_bad_input_is_400(client, path, payload):
+    with pytest.raises(ValueError, match="^400"):
+        client.request("POST", path, payload)
+
+
+def test_unknown_session_and_route(client):
+    with pytest.raises(ValueError, match="^404"):
+        client.receive_message("no-such-session", _read("clean.png"))
+    with pytest.raises(ValueError, match="^404"):
+        client.request("GET", "/nope")
+    assert client.request("GET", "/health")["status"] == "ok"
+
+
+def test_extract_step_evicts_keys():
+    # Workers outlive sessions: the extract step must not leave the secret's keys in their cache
+    manager = ExchangeManager()
+    sender, dh_image = manager.start(_read("horse.png"), '1')
+    receiver, b_image = manager.respond(dh_image, _read("dog.png"))
+    manager.complete(sender, b_image)
+    stego = encode_image(manager.send_message(sender, "evict me", _read("clean.png"), '1'))
+    key_cache.clear()
+
+    result, record = _exchange_step("extract", receiver, manager.session(receiver), {"image": stego})
+    assert result["message"] == "evict me"
+    assert record is None
+    assert len(key_cache) == 0
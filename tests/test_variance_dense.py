@@ -0,0 +1,54 @@
+import contextlib
+import io
+import os
+
+import numpy as np
+import pytest
+
+from conftest import ROOT
+from image_io import load_rgb_array
+import lsb_with_variance_aes
+import lsb_with_variance_plaintext
+from stego_header import FLAG_DENSE, HEADER_BITS, flags_stride, unpack_header
+from stego_probe import detect_method
+from variance_dense import MAX_STRIDE, dense_capacity
+from variance_kernel import extract_bits
+from variance_tiled import extract_message_variance_tiled
+
+
+def _quiet(function, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args)
+
+
+def _read_header(array):
+    return unpack_header(np.packbits(extract_bits(array, HEADER_BITS)).tobytes())
+
+
+@pytest.fixture(scope="module")
+def horse():
+    return load_rgb_array(os.path.join(ROOT, "horse.png"))
+
+
+@pytest.mark.parametrize("stride", range(1, MAX_STRIDE + 1))
+def test_dense_round_trip(horse, stride):
+    message = "Dense multi-channel payload. " * 40
+    array = lsb_with_variance_plaintext.embed_message_variance_array(message, np.array(horse), stride=stride)
+    header = _read_header(array)
+    assert header["flags"] & FLAG_DENSE and flags_stride(header["flags"]) == stride
+    assert _quiet(lsb_with_variance_plaintext.extract_message_variance, array) == message
+    assert _quiet(extract_message_variance_tiled, array) == message
+    assert detect_method(array) == '2'
+
+    array = lsb_with_variance_aes.embed_message_variance_array(message, np.array(horse), "4242", stride=stride)
+    assert flags_stride(_read_header(array)["flags"]) == stride
+    assert _quiet(lsb_with_variance_aes.extract_message_variance, array, "4242") == message
+
+
+def test_dense_capacity_and_stride(horse):
+    small = np.ascontiguousarray(horse[:60, :60])
+    with pytest.raises(ValueError, match="too large"):
+        lsb_with_variance_plaintext.embed_message_variance_array("x" * (dense_capacity(small, 2) + 1),
+                                                                 np.array(small), stride=2)
+    with pytest.raises(ValueError, match="stride"):
+        lsb_with_variance_plaintext.embed_message_variance_array("x", np.array(small), stride=MAX_STRIDE + 1)
@@ -0,0 +1,32 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from conftest import ROOT
+from variance_map import compute_variance_map
+
+ndimage = pytest.importorskip("scipy.ndimage")
+
+
+def _reference(gray):
+    # The original per-pixel implementation: float variance written into a uint8 output
+    return ndimage.generic_filter(gray, np.var, size=3, mode='reflect')
+
+
+def _gray(name):
+    with Image.open(os.path.join(ROOT, name)) as img:
+        return np.asarray(img.convert("L"))
+
+
+@pytest.mark.parametrize("name", ["horse.png", "dog.png"])
+def test_matches_generic_filter_on_bundled_images(name):
+    gray = _gray(name)
+    np.testing.assert_array_equal(compute_variance_map(gray), _reference(gray))
+
+
+@pytest.mark.parametrize("shape", [(97, 131), (3, 3), (1, 5)])
+def test_matches_generic_filter_on_random_images(shape):
+    gray = np.random.default_rng(sum(shape)).integers(0, 256, shape, dtype=np.uint8)
+    np.testing.assert_array_equal(compute_variance_map(gray), _reference(gray))
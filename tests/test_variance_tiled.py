@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+import pytest
+
+from conftest import ROOT
+from image_io import load_rgb_array
+import lsb_with_variance_aes
+import lsb_with_variance_plaintext
+from variance_tiled import (embed_message_variance_tiled, extract_message_variance_tiled, image_to_raw,
+                            open_raw_rgb)
+
+MESSAGE = "Band by band, the same bits as the whole image. " * 8
+SECRET = "1875"
+
+
+def _carriers():
+    horse = load_rgb_array(os.path.join(ROOT, "horse.png"))
+    random = np.random.default_rng(8).integers(0, 256, (160, 131, 3), dtype=np.uint8)
+    # 882 rows (a multiple of 3), 881 and 160 rows (not)
+    return {"horse": horse, "horse_881": horse[:881], "random_160": random}
+
+
+CARRIERS = _carriers()
+
+
+def _in_memory(carrier, sign):
+    array = np.array(carrier)
+    if sign is None:
+        return lsb_with_variance_plaintext.embed_message_variance_array(MESSAGE, array)
+    return lsb_with_variance_aes.embed_message_variance_array(MESSAGE, array, sign)
+
+
+@pytest.mark.parametrize("sign", [None, SECRET])
+@pytest.mark.parametrize("band_rows", [3, 4, 30, 31, 512])
+@pytest.mark.parametrize("name", sorted(CARRIERS))
+def test_tiled_matches_in_memory(name, band_rows, sign):
+    carrier = CARRIERS[name]
+    expected = _in_memory(carrier, sign)
+    tiled = embed_message_variance_tiled(MESSAGE, np.array(carrier), sign, band_rows)
+    assert tiled.tobytes() == expected.tobytes()
+    assert extract_message_variance_tiled(tiled, sign, band_rows) == MESSAGE
+
+
+@pytest.mark.parametrize("sign", [None, SECRET])
+def test_memmap_round_trip(tmp_path, sign):
+    raw = str(tmp_path / "horse.rgb")
+    width, height = image_to_raw(os.path.join(ROOT, "horse.png"), raw)
+    array = open_raw_rgb(raw, width, height, mode="r+")
+    embed_message_variance_tiled(MESSAGE, array, sign, band_rows=30)
+    array.flush()
+    del array
+
+    stego = open_raw_rgb(raw, width, height)
+    assert stego.tobytes() == _in_memory(CARRIERS["horse"], sign).tobytes()
+    assert extract_message_variance_tiled(stego, sign, band_rows=33) == MESSAGE
+    if sign is None:
+        assert lsb_with_variance_plaintext.extract_message_variance(np.array(stego)) == MESSAGE
+    else:
+        assert lsb_with_variance_aes.extract_message_variance(np.array(stego), sign) == MESSAGE
@@ -0,0 +1,132 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from lazy_import import lazy_import
+from variance_map import compute_variance_map
+
+np = lazy_import("numpy")
+
+
+def gray_content_key(gray_arr):
+    # Hash of the grayscale pixels (and the shape, so equal bytes in other shapes do not collide)
+    gray_arr = np.ascontiguousarray(gray_arr)
+    digest = hashlib.blake2b(gray_arr.tobytes(), digest_size=20)
+    digest.update(repr(gray_arr.shape).encode())
+    return digest.hexdigest()
+
+
+class VarianceCache:
+    """
+       Cache of local variance maps keyed by a hash of the grayscale pixels.
+
+       Entries are kept in an in-process LRU bounded by a memory budget. If a directory is
+       given, maps are also stored there as <key>.npy files and loaded on an in-memory miss,
+       so the cache survives restarts and can be shared between worker processes.
+
+       Parameters:
+           max_bytes (int): Memory budget of the in-process LRU. 0 disables it.
+           disk_dir (str or None): Directory of the on-disk .npy store, or None for memory only.
+       """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.npy")
+
+    def _remember(self, key, var_map):
+        if var_map.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = var_map
+            self._size += var_map.nbytes
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.nbytes
+
+    def get(self, key):
+        """Returns the cached variance map for key, or None."""
+        with self._lock:
+            var_map = self._entries.get(key)
+            if var_map is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return var_map
+        if self.disk_dir and os.path.exists(self._disk_path(key)):
+            var_map = np.load(self._disk_path(key))
+            var_map.setflags(write=False)
+            self.disk_hits += 1
+            self._remember(key, var_map)
+            return var_map
+        return None
+
+    def put(self, key, var_map):
+        """Stores a variance map. The array is marked read-only since it is shared."""
+        var_map.setflags(write=False)
+        self._remember(key, var_map)
+        if self.disk_dir:
+            path = self._disk_path(key)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, var_map)
+            os.replace(tmp_path, path)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        return {"entries": len(self._entries), "bytes": self._size, "hits": self.hits,
+                "disk_hits": self.disk_hits, "misses": self.misses}
+
+    def variance_map(self, gray_arr):
+        """
+           Returns the local variance map of a grayscale image, computing it only on a cache miss.
+
+           Parameters:
+               gray_arr (np.ndarray): 2D uint8 array of the grayscale image.
+
+           Returns:
+               np.ndarray: Read-only uint8 variance map (see compute_variance_map()).
+           """
+        key = gray_content_key(gray_arr)
+        var_map = self.get(key)
+        if var_map is None:
+            self.misses += 1
+            var_map = compute_variance_map(gray_arr)
+            self.put(key, var_map)
+        return var_map
+
+
+_default_cache = VarianceCache()
+
+
+def configure_variance_cache(max_bytes=256 * 1024 * 1024, disk_dir=None):
+    """Replaces the cache used by the variance-based LSB modules and returns it."""
+    global _default_cache
+    _default_cache = VarianceCache(max_bytes=max_bytes, disk_dir=disk_dir)
+    return _default_cache
+
+
+def get_variance_cache():
+    return _default_cache
+
+
+def cached_variance_map(gray_arr):
+    # Variance map of gray_arr from the module-wide cache
+    return _default_cache.variance_map(gray_arr)
@@ -0,0 +1,217 @@
+import functools
+
+from lazy_import import lazy_import
+from variance_cache import cached_variance_map
+from variance_kernel import WRITABLE_BITS_MASK, embed_bits, variance_bins
+from instrumentation import stage
+from stego_header import HEADER_BITS, FLAG_DENSE, header_bits, stride_flags, flags_stride
+
+Image = lazy_import("PIL.Image")
+np = lazy_import("numpy")
+
+# Dense variance-LSB mode (FLAG_DENSE in the binary header).
+#
+# Instead of 2 bits in the red channel of every 3x3 block center, every block of a configurable
+# stride (1-4 pixels) stores bits in R, G and B. The number of bits per channel follows the
+# variance bin: 1 in the smoothest regions, up to 4 in the noisiest (DENSE_LEVELS). Variance is
+# taken on the grayscale image with bits 0-3 of all three channels cleared, the only bits this
+# mode writes, so extraction sees exactly the bins used for embedding.
+#
+# The binary header is still written in the red-channel grid of the classic mode (first LSB pair),
+# so detection and the header read are unchanged. The dense grid starts below the header rows.
+# Within a block, bit j of the block goes to channel j % 3 at bit position j // 3.
+
+DENSE_LEVELS = (1, 1, 2, 2, 3, 4)  # Bits per channel, by variance bin
+MAX_LEVEL = 4
+CHANNELS = 3
+DEFAULT_STRIDE = 2
+MAX_STRIDE = 4
+_HEADER_BLOCKS = HEADER_BITS // 2
+
+
+@functools.lru_cache(maxsize=None)
+def _level_table():
+    return np.array(DENSE_LEVELS, dtype=np.uint8)
+
+
+def dense_gray(array):
+    """
+       Returns the grayscale image used for variance binning in dense mode.
+
+       Bits 0-3 of every channel are cleared before the conversion, so embedding does not change it.
+       """
+    masked = np.array(array)
+    masked &= 0xFF & ~WRITABLE_BITS_MASK
+    return np.asarray(Image.fromarray(masked).convert("L"))
+
+
+def _grid_origin(shape, stride):
+    # (first row, number of rows, number of columns) of the dense grid.
+    # The classic header occupies the first ceil(72 / classic grid width) block rows.
+    height, width = shape[:2]
+    classic_w = len(range(1, width - 1, 3))
+    header_rows = -(-_HEADER_BLOCKS // classic_w) if classic_w else 0
+    first_row = 3 * header_rows + 1
+    return first_row, len(range(first_row, height - 1, stride)), len(range(1, width - 1, stride))
+
+
+def max_dense_capacity_bits(shape, stride=DEFAULT_STRIDE):
+    # Upper bound (every block in the noisiest bin), known from the dimensions alone
+    _, rows, cols = _grid_origin(shape, stride)
+    return rows * cols * CHANNELS * MAX_LEVEL
+
+
+def block_levels(var_map, min_var, max_var, stride=DEFAULT_STRIDE):
+    """
+       Returns the bits per channel of every dense block, in row-major block order.
+
+       Parameters:
+           var_map (np.ndarray): Variance map of dense_gray().
+           min_var (float): Minimum variance used for binning.
+           max_var (float): Maximum variance used for binning.
+           stride (int): Block stride in pixels.
+
+       Returns:
+           np.ndarray: uint8 array, one value (1 to MAX_LEVEL) per block.
+       """
+    first_row, _, _ = _grid_origin(var_map.shape, stride)
+    var_values = var_map[first_row:var_map.shape[0] - 1:stride, 1:var_map.shape[1] - 1:stride].reshape(-1)
+    return _level_table()[variance_bins(var_values, min_var, max_var)]
+
+
+def _block_layout(shape, levels, n_bits, stride):
+    # Returns (rows, cols, first bit, levels) of the blocks holding the first n_bits bits
+    first_row, _, cols = _grid_origin(shape, stride)
+    per_block = levels.astype(np.int64) * CHANNELS
+    ends = np.cumsum(per_block)
+    count = min(int(np.searchsorted(ends, n_bits)) + 1, len(levels)) if n_bits else 0
+    block_rows, block_cols = np.divmod(np.arange(count, dtype=np.int64), cols)
+    return (first_row + block_rows * stride, 1 + block_cols * stride,
+            ends[:count] - per_block[:count], levels[:count])
+
+
+def _bit_slots(starts, levels, n_bits):
+    # Yields (channel, bit position, selected blocks, payload bit indices) for every slot in use
+    for level in range(MAX_LEVEL):
+        blocks = np.flatnonzero(levels > level)
+        for channel in range(CHANNELS):
+            index = starts[blocks] + level * CHANNELS + channel
+            used = index < n_bits
+            yield channel, level, blocks[used], index[used]
+
+
+def embed_dense_bits(array, levels, bits, stride=DEFAULT_STRIDE):
+    """
+       Writes a bit array into the dense grid of an RGB image array, in place.
+
+       Parameters:
+           array (np.ndarray): HxWx3 uint8 image array.
+           levels (np.ndarray): Bits per channel of every block (see block_levels()).
+           bits (np.ndarray): uint8 array of 0/1 values.
+           stride (int): Block stride in pixels.
+
+       Raises:
+           ValueError: If the bits do not fit in the dense grid.
+       """
+    n_bits = len(bits)
+    if n_bits > int(levels.sum(dtype=np.int64)) * CHANNELS:
+        raise ValueError("Message is too large to embed in image.")
+    rows, cols, starts, levels_used = _block_layout(array.shape, levels, n_bits, stride)
+    values = array[rows, cols]
+    for channel, level, blocks, index in _bit_slots(starts, levels_used, n_bits):
+        mask = np.uint8(~(1 << level) & 0xFF)
+        values[blocks, channel] = (values[blocks, channel] & mask) | (bits[index] << level)
+    array[rows, cols] = values
+
+
+def extract_dense_bits(array, levels, n_bits, stride=DEFAULT_STRIDE):
+    """
+       Reads n_bits bits from the dense grid of an RGB image array.
+
+       Returns:
+           np.ndarray: uint8 array of 0/1 values. Shorter than requested if the grid runs out.
+       """
+    n_bits = min(n_bits, int(levels.sum(dtype=np.int64)) * CHANNELS)
+    rows, cols, starts, levels_used = _block_layout(array.shape, levels, n_bits, stride)
+    values = array[rows, cols]
+    bits = np.zeros(n_bits, dtype=np.uint8)
+    for channel, level, blocks, index in _bit_slots(starts, levels_used, n_bits):
+        bits[index] = (values[blocks, channel] >> level) & 1
+    return bits
+
+
+def _check_stride(stride):
+    if not 1 <= stride <= MAX_STRIDE:
+        raise ValueError(f"Dense block stride must be between 1 and {MAX_STRIDE}.")
+
+
+def embed_payload_dense(array, payload, method, flags=0, stride=DEFAULT_STRIDE):
+    """
+       Dense-mode counterpart of lsb_with_variance_plaintext.embed_payload_variance().
+
+       Parameters:
+           array (np.ndarray): Writable HxWx3 uint8 RGB image data, modified in place.
+           payload (bytes): Data to embed.
+           method (int): METHOD_* constant recorded in the header.
+           flags (int): Header flags; FLAG_DENSE and the stride are added.
+           stride (int): Block stride in pixels (1-4). Smaller strides hold more data.
+
+       Returns:
+           np.ndarray: The same array, with the payload embedded.
+
+       Raises:
+           ValueError: If the stride is invalid or the payload does not fit. Payloads larger than
+                       the dimensions allow are rejected before the variance map is computed.
+       """
+    _check_stride(stride)
+    n_bits = len(payload) * 8
+    if n_bits > max_dense_capacity_bits(array.shape, stride):
+        raise ValueError("Message is too large to embed in image.")
+    pixels = array.shape[0] * array.shape[1]
+    with stage("to_gray", pixels=pixels):
+        gray = dense_gray(array)
+    with stage("variance_map", pixels=pixels):
+        var_map = cached_variance_map(gray)
+    min_var = np.min(var_map)
+    max_var = np.max(var_map)
+    levels = block_levels(var_map, min_var, max_var, stride)
+
+    header = header_bits(method, min_var, max_var, len(payload), flags | FLAG_DENSE | stride_flags(stride))
+    with stage("pack_bits", bits=n_bits):
+        bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8))
+    with stage("embed_dense", pixels=pixels, bits=len(header) + n_bits):
+        embed_dense_bits(array, levels, bits, stride)
+        embed_bits(array, None, min_var, max_var, header)
+    return array
+
+
+def extract_payload_dense(array, header):
+    """
+       Reads the payload of a dense-mode image (FLAG_DENSE in the header).
+
+       Returns:
+           bytes: header['length'] bytes of payload (fewer if the image is too small).
+       """
+    stride = flags_stride(header["flags"])
+    pixels = array.shape[0] * array.shape[1]
+    with stage("to_gray", pixels=pixels):
+        gray = dense_gray(array)
+    with stage("variance_map", pixels=pixels):
+        var_map = cached_variance_map(gray)
+    levels = block_levels(var_map, header["min_var"], header["max_var"], stride)
+    with stage("extract_dense", pixels=pixels, bits=header["length"] * 8):
+        bits = extract_dense_bits(array, levels, header["length"] * 8, stride)
+    return np.packbits(bits[:len(bits) // 8 * 8]).tobytes()
+
+
+def dense_capacity(array, stride=DEFAULT_STRIDE):
+    """
+       Returns the exact dense-mode payload capacity of an image, in bytes.
+
+       Unlike capacity.capacity(), this depends on the image content (the variance bins), so
+       the variance map is computed.
+       """
+    _check_stride(stride)
+    var_map = cached_variance_map(dense_gray(array))
+    levels = block_levels(var_map, np.min(var_map), np.max(var_map), stride)
+    return int(levels.sum(dtype=np.int64)) * CHANNELS // 8
@@ -0,0 +1,184 @@
+import functools
+
+from lazy_import import lazy_import
+
+Image = lazy_import("PIL.Image")
+np = lazy_import("numpy")
+
+# LSB positions used in the red channel, selected by the variance bin (0 = smoothest, 5 = noisiest)
+LSB_PAIRS = ((0, 1), (0, 2), (0, 3), (1, 2), (1, 3), (2, 3))
+NUM_BINS = len(LSB_PAIRS)
+WRITABLE_BITS_MASK = 0x0F  # Every LSB pair lies in bits 0-3 of the red channel
+
+
+@functools.lru_cache(maxsize=None)
+def _lsb_pair_table():
+    # LSB_PAIRS as a uint8 array, built on first use so importing this module does not load NumPy
+    return np.array(LSB_PAIRS, dtype=np.uint8)
+
+
+def stable_gray(array):
+    """
+       Returns the grayscale image used for variance binning by the binary-header format.
+
+       Bits 0-3 of the red channel are cleared before the conversion. Those are the only bits
+       embedding can change, so the grayscale image (and the variance bins derived from it) is
+       the same before and after embedding. Without this, the extractor recomputes variance on
+       the stego image and larger payloads land in different bins than they were written with.
+
+       Parameters:
+           array (np.ndarray): HxWx3 uint8 RGB image data (not modified).
+
+       Returns:
+           np.ndarray: 2D uint8 grayscale array.
+       """
+    masked = np.array(array)
+    masked[..., 0] &= 0xFF & ~WRITABLE_BITS_MASK
+    return np.asarray(Image.fromarray(masked).convert("L"))
+
+
+def carrier_grid(array):
+    """
+       Returns a view of the red channel of the center pixel of every 3x3 block.
+
+       This is the same set of pixels the loops `for y in range(1, h - 1, 3)` /
+       `for x in range(1, w - 1, 3)` visit, in the same (row-major) order.
+       Writing into the view modifies the image array in place.
+       """
+    return array[1:-1:3, 1:-1:3, 0]
+
+
+def variance_step(min_var, max_var):
+    return (max_var - min_var) / NUM_BINS if max_var > min_var else 1
+
+
+def variance_bins(var_values, min_var, max_var):
+    """
+       Maps local variance values to bin indices (vectorized form of
+       `min(int((var - min_var) / step), 5)`).
+
+       Parameters:
+           var_values (np.ndarray): Variance values of the selected blocks.
+           min_var (float): Minimum variance of the carrier.
+           max_var (float): Maximum variance of the carrier.
+
+       Returns:
+           np.ndarray: int64 array of bin indices.
+
+       Notes:
+           Values below min_var (possible on extraction, since embedding changes the image)
+           truncate toward zero and may become negative, exactly like int(). Negative bins then
+           index LSB_PAIRS from the end, as Python list indexing did.
+       """
+    step = variance_step(float(min_var), float(max_var))
+    bins = np.trunc((var_values.astype(np.float64) - float(min_var)) / step).astype(np.int64)
+    return np.minimum(bins, NUM_BINS - 1)
+
+
+def _block_pairs(array, var_map, min_var, max_var, start, count):
+    # Returns (rows, cols, pos1, pos2) for `count` blocks starting at block number `start`
+    grid_w = carrier_grid(array).shape[1]
+    blocks = np.arange(start, start + count, dtype=np.int64)
+    rows, cols = np.divmod(blocks, grid_w)
+    if var_map is None:
+        pairs = np.broadcast_to(_lsb_pair_table()[0], (count, 2))
+    else:
+        var_values = var_map[1:-1:3, 1:-1:3][rows, cols]
+        pairs = _lsb_pair_table()[variance_bins(var_values, min_var, max_var)]
+    return rows, cols, pairs[:, 0], pairs[:, 1]
+
+
+def grid_capacity_bits(array):
+    grid = carrier_grid(array)
+    return 2 * grid.shape[0] * grid.shape[1]
+
+
+def embed_bits(array, var_map, min_var, max_var, bits, start_bit=0):
+    """
+       Writes a bit array into the carrier grid of an RGB image array, 2 bits per block.
+
+       Parameters:
+           array (np.ndarray): HxWx3 uint8 image array, modified in place.
+           var_map (np.ndarray or None): Local variance map of the original image. If None,
+                                         the first LSB pair is used for every block (header write).
+           min_var (float): Minimum variance used for binning.
+           max_var (float): Maximum variance used for binning.
+           bits (np.ndarray): uint8 array of 0/1 values (e.g. from np.unpackbits).
+           start_bit (int): Bit offset to start writing at (must be even).
+
+       Returns:
+           int: Number of bits actually written. Bits that do not fit in the grid are dropped.
+       """
+    start = start_bit // 2
+    count = min(len(bits) // 2, grid_capacity_bits(array) // 2 - start)
+    if count <= 0:
+        return 0
+    rows, cols, pos1, pos2 = _block_pairs(array, var_map, min_var, max_var, start, count)
+
+    bit_pairs = np.asarray(bits[:2 * count], dtype=np.uint8).reshape(count, 2)
+    clear_mask = ~((np.uint8(1) << pos1) | (np.uint8(1) << pos2))
+
+    grid = carrier_grid(array)
+    r = grid[rows, cols]
+    grid[rows, cols] = (r & clear_mask) | (bit_pairs[:, 0] << pos1) | (bit_pairs[:, 1] << pos2)
+    return 2 * count
+
+
+def extract_bits(array, n_bits, var_map=None, min_var=0, max_var=0, start_bit=0):
+    """
+       Reads bits from the carrier grid of an RGB image array, 2 bits per block.
+
+       Parameters:
+           array (np.ndarray): HxWx3 uint8 image array.
+           n_bits (int): Number of bits to read (rounded up to a whole block).
+           var_map (np.ndarray or None): Local variance map. If None, the first LSB pair
+                                         is used for every block (header read).
+           min_var (float): Minimum variance used for binning.
+           max_var (float): Maximum variance used for binning.
+           start_bit (int): Bit offset to start reading from (must be even).
+
+       Returns:
+           np.ndarray: uint8 array of 0/1 values. Shorter than requested if the grid runs out.
+       """
+    start = start_bit // 2
+    count = min((n_bits + 1) // 2, grid_capacity_bits(array) // 2 - start)
+    if count <= 0:
+        return np.zeros(0, dtype=np.uint8)
+    rows, cols, pos1, pos2 = _block_pairs(array, var_map, min_var, max_var, start, count)
+
+    r = carrier_grid(array)[rows, cols]
+    bits = np.empty((count, 2), dtype=np.uint8)
+    bits[:, 0] = (r >> pos1) & 1
+    bits[:, 1] = (r >> pos2) & 1
+    return bits.reshape(-1)
+
+
+def extract_bytes_until(array, var_map, min_var, max_var, marker, chunk_bytes=1 << 16):
+    """
+       Reads whole bytes from the carrier grid in chunks until `marker` is found.
+
+       Parameters:
+           array (np.ndarray): HxWx3 uint8 image array.
+           var_map (np.ndarray): Local variance map.
+           min_var (float): Minimum variance used for binning.
+           max_var (float): Maximum variance used for binning.
+           marker (bytes): End marker to look for.
+           chunk_bytes (int): Number of bytes decoded per chunk.
+
+       Returns:
+           tuple: (data, found) where data is everything before the marker (or all decoded
+                  bytes if the marker was not found) and found tells whether it was found.
+       """
+    capacity = grid_capacity_bits(array) // 8 * 8
+    data = bytearray()
+    bit_pos = 0
+    while bit_pos < capacity:
+        n_bits = min(chunk_bytes * 8, capacity - bit_pos)
+        bits = extract_bits(array, n_bits, var_map, min_var, max_var, start_bit=bit_pos)
+        search_from = max(0, len(data) - len(marker) + 1)
+        data += np.packbits(bits).tobytes()
+        bit_pos += n_bits
+        end = data.find(marker, search_from)
+        if end != -1:
+            return bytes(data[:end]), True
+    return bytes(data), False
@@ -0,0 +1,89 @@
+from lazy_import import lazy_import
+
+np = lazy_import("numpy")
+
+
+def _box_sum(arr):
+    # 3x3 box sum of a padded 2D array, done separably (rows, then columns)
+    rows = arr[:, :-2] + arr[:, 1:-1] + arr[:, 2:]
+    return rows[:-2, :] + rows[1:-1, :] + rows[2:, :]
+
+
+def _pairwise_sum(values):
+    # Same summation order numpy uses for a contiguous 9-element float64 array
+    return ((values[0] + values[1]) + (values[2] + values[3])) + \
+           ((values[4] + values[5]) + (values[6] + values[7])) + values[8]
+
+
+def compute_variance_map(gray_arr):
+    """
+       Computes the 3x3 local variance map of a grayscale image using box filters.
+
+       This is a drop-in replacement for
+       generic_filter(gray_arr, local_variance, size=3, mode='reflect') and returns
+       exactly the same uint8 array, so bin assignments of already embedded images
+       do not change.
+
+       Parameters:
+           gray_arr (np.ndarray): 2D uint8 array of the grayscale image.
+
+       Returns:
+           np.ndarray: 2D uint8 array with the local variance of each pixel.
+
+       Notes:
+           - The variance is computed as (9 * sum(x^2) - sum(x)^2) / 81 with exact integer box sums.
+           - generic_filter writes the float variance into a uint8 output, i.e. it is truncated
+             and wrapped modulo 256. The same conversion is applied here.
+           - When the exact variance is a whole number, np.var may return a value one ulp below it,
+             which truncates to the previous integer. Those pixels are recomputed with the same
+             floating point operations np.var performs.
+       """
+    gray_arr = np.asarray(gray_arr)
+    padded = np.pad(gray_arr, 1, mode='symmetric').astype(np.int32)
+    return _variance_of_padded(padded)
+
+
+def compute_band_variance_map(gray_band, above=None, below=None):
+    """
+       Computes the local variance map of a horizontal band of a larger grayscale image.
+
+       The result equals the corresponding rows of compute_variance_map() on the full image,
+       as long as the rows directly above and below the band (the 1-pixel halo) are given.
+
+       Parameters:
+           gray_band (np.ndarray): 2D uint8 array with the rows of the band.
+           above (np.ndarray or None): The image row just above the band, or None if the band
+                                       starts at the top of the image.
+           below (np.ndarray or None): The image row just below the band, or None if the band
+                                       ends at the bottom of the image.
+
+       Returns:
+           np.ndarray: 2D uint8 variance map of the band rows.
+       """
+    gray_band = np.asarray(gray_band)
+    # At the image edges, mode='reflect' repeats the edge row
+    above = gray_band[0] if above is None else above
+    below = gray_band[-1] if below is None else below
+    rows = np.concatenate([above[None, :], gray_band, below[None, :]])
+    padded = np.pad(rows, ((0, 0), (1, 1)), mode='symmetric').astype(np.int32)
+    return _variance_of_padded(padded)
+
+
+def _variance_of_padded(padded):
+    # Variance map of the interior of a 1-pixel padded int32 array
+    s1 = _box_sum(padded)
+    s2 = _box_sum(padded * padded)
+    numerator = 9 * s2 - s1 * s1
+
+    var_map = (numerator // 81).astype(np.uint8)
+
+    ys, xs = np.nonzero((numerator % 81 == 0) & (numerator > 0))
+    if len(ys):
+        window = [padded[ys + dy, xs + dx].astype(np.float64)
+                  for dy in range(3) for dx in range(3)]
+        mean = _pairwise_sum(window) / 9
+        squared = [(v - mean) * (v - mean) for v in window]
+        var = _pairwise_sum(squared) / 9
+        var_map[ys, xs] = var.astype(np.int64).astype(np.uint8)
+
+    return var_map
@@ -0,0 +1,246 @@
+from lazy_import import lazy_import
+from variance_map import compute_band_variance_map
+from variance_kernel import embed_bits, extract_bits, stable_gray
+from stego_header import (HEADER_BITS, HEADER_SIZE, METHOD_VARIANCE_PLAINTEXT, METHOD_VARIANCE_AES, FLAG_BINARY,
+                          FLAG_DENSE, header_bits, unpack_header)
+from capacity import VARIANCE_LSB, check_capacity
+import lsb_with_variance_aes
+import lsb_with_variance_plaintext
+
+Image = lazy_import("PIL.Image")
+np = lazy_import("numpy")
+
+DEFAULT_BAND_ROWS = 3 * 512  # Bands start on a multiple of 3 so every 3x3 block lies in one band
+
+
+def open_raw_rgb(path, width, height, mode="r"):
+    """
+       Memory-maps a raw interleaved RGB file (height x width x 3 bytes, no header).
+
+       Parameters:
+           path (str): Path of the raw file.
+           width (int): Image width in pixels.
+           height (int): Image height in pixels.
+           mode (str): np.memmap mode: 'r' read-only, 'r+' read/write, 'w+' create.
+
+       Returns:
+           np.memmap: HxWx3 uint8 array backed by the file.
+       """
+    return np.memmap(path, dtype=np.uint8, mode=mode, shape=(height, width, 3))
+
+
+def image_to_raw(image_path, raw_path):
+    """Decodes an image once and writes it as a raw RGB file. Returns (width, height)."""
+    img = Image.open(image_path).convert("RGB")
+    raw = open_raw_rgb(raw_path, img.width, img.height, mode="w+")
+    raw[:] = np.asarray(img)
+    raw.flush()
+    return img.width, img.height
+
+
+def iter_bands(height, band_rows=DEFAULT_BAND_ROWS):
+    # Yields (start, stop) row ranges; every band but the last has a multiple of 3 rows
+    band_rows = max(3, band_rows - band_rows % 3)
+    for start in range(0, height, band_rows):
+        yield start, min(start + band_rows, height)
+
+
+def band_variance_map(array, start, stop, legacy=False):
+    """
+       Computes the local variance map of rows [start, stop) of an RGB image array.
+
+       Only the band and its 1-pixel halo are converted to grayscale, so memory use is
+       bounded by the band size. The grayscale image is taken with the writable red bits
+       cleared (see stable_gray()), unless legacy is True (images with the old text header).
+       """
+    height = array.shape[0]
+    lo, hi = max(start - 1, 0), min(stop + 1, height)
+    if legacy:
+        gray = np.asarray(Image.fromarray(np.ascontiguousarray(array[lo:hi])).convert("L"))
+    else:
+        gray = stable_gray(array[lo:hi])
+    above = gray[0] if start > 0 else None
+    below = gray[-1] if stop < height else None
+    return compute_band_variance_map(gray[start - lo:stop - lo], above, below)
+
+
+def variance_range(array, band_rows=DEFAULT_BAND_ROWS):
+    """
+       First streaming pass: returns (min_var, max_var) of the whole image, band by band.
+
+       Returns:
+           tuple: (min_var, max_var) as np.uint8, like np.min/np.max of the full variance map.
+       """
+    min_var = max_var = None
+    for start, stop in iter_bands(array.shape[0], band_rows):
+        var_band = band_variance_map(array, start, stop)
+        band_min, band_max = var_band.min(), var_band.max()
+        min_var = band_min if min_var is None else min(min_var, band_min)
+        max_var = band_max if max_var is None else max(max_var, band_max)
+    return min_var, max_var
+
+
+def _band_layout(array, band_rows):
+    # Yields (start_row, stop_row, first_bit, capacity_bits) of every band in the carrier grid
+    grid_w = len(range(1, array.shape[1] - 1, 3))
+    first_bit = 0
+    for start, stop in iter_bands(array.shape[0], band_rows):
+        grid_h = len(range(1, stop - start - 1, 3))
+        capacity = 2 * grid_h * grid_w
+        yield start, stop, first_bit, capacity
+        first_bit += capacity
+
+
+def embed_message_variance_tiled(message, array, sign=None, band_rows=DEFAULT_BAND_ROWS):
+    """
+       Embeds a message with variance-based LSB steganography, processing the image in row bands.
+
+       The result is identical to embed_message_variance_array() of lsb_with_variance_plaintext
+       (sign=None) or lsb_with_variance_aes (sign given), but only one band of grayscale and
+       variance data is held in memory at a time. The image array can be an np.memmap
+       (see open_raw_rgb()), in which case the pixels never need to be fully loaded.
+
+       Parameters:
+           message (str): Message to embed.
+           array (np.ndarray): Writable HxWx3 uint8 RGB image data, modified in place.
+           sign (str, int or None): Shared secret for AES encryption, or None for plaintext.
+           band_rows (int): Rows per band (rounded down to a multiple of 3).
+
+       Returns:
+           np.ndarray: The same array, with the message embedded.
+
+       Raises:
+           ValueError: If the message does not fit in the image (checked before the variance pass).
+       """
+    if sign is None:
+        method, data, flags = METHOD_VARIANCE_PLAINTEXT, message.encode('latin-1'), 0
+    else:
+        data, flags = lsb_with_variance_aes.encrypt_payload(message, str(sign))
+        method = METHOD_VARIANCE_AES
+    check_capacity(array, VARIANCE_LSB, len(data))
+
+    min_var, max_var = variance_range(array, band_rows)
+    header = header_bits(method, min_var, max_var, len(data), flags)
+    payload = np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+    end_bit = HEADER_BITS + len(payload)
+
+    for start, stop, first_bit, capacity in _band_layout(array, band_rows):
+        if first_bit >= end_bit:
+            break
+        band = array[start:stop]
+        # The variance of a band is taken before anything is written into it. Halo rows are never
+        # written (block centers are rows 1, 4, 7, ...), so later bands still see original pixels.
+        var_band = band_variance_map(array, start, stop)
+        if first_bit < HEADER_BITS:
+            embed_bits(band, None, min_var, max_var, header[first_bit:])
+        payload_from = max(first_bit, HEADER_BITS)
+        embed_bits(band, var_band, min_var, max_var, payload[payload_from - HEADER_BITS:],
+                   start_bit=payload_from - first_bit)
+    return array
+
+
+def _read_bits(array, band_rows, start_bit, n_bits, min_var=None, max_var=None, legacy=False):
+    # Reads n_bits of the carrier grid starting at start_bit, band by band.
+    # Without a variance range, the first LSB pair is used.
+    chunks = []
+    end_bit = start_bit + n_bits
+    for start, stop, first_bit, capacity in _band_layout(array, band_rows):
+        if first_bit >= end_bit:
+            break
+        lo, hi = max(start_bit, first_bit), min(end_bit, first_bit + capacity)
+        if lo >= hi:
+            continue
+        var_band = None if min_var is None else band_variance_map(array, start, stop, legacy)
+        chunks.append(extract_bits(array[start:stop], hi - lo, var_band, min_var, max_var,
+                                   start_bit=lo - first_bit))
+    return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.uint8)
+
+
+def _read_bytes(array, band_rows, start_bit, n_bytes, min_var=None, max_var=None, legacy=False):
+    bits = _read_bits(array, band_rows, start_bit, n_bytes * 8, min_var, max_var, legacy)
+    return np.packbits(bits[:len(bits) // 8 * 8]).tobytes()
+
+
+def _read_bytes_until(array, band_rows, marker, min_var, max_var):
+    # Old plaintext format: reads whole bands until the end marker appears
+    data = bytearray()
+    pending = np.zeros(0, dtype=np.uint8)
+    for start, stop, first_bit, capacity in _band_layout(array, band_rows):
+        if capacity == 0:
+            continue
+        bits = extract_bits(array[start:stop], capacity, band_variance_map(array, start, stop, legacy=True),
+                            min_var, max_var)
+        pending = np.concatenate([pending, bits])
+        whole = len(pending) // 8 * 8
+        search_from = max(0, len(data) - len(marker) + 1)
+        data += np.packbits(pending[:whole]).tobytes()
+        pending = pending[whole:]
+        end = data.find(marker, search_from)
+        if end != -1:
+            return bytes(data[:end])
+    return bytes(data)
+
+
+def _extract_legacy_tiled(array, sign, band_rows):
+    # Images written before the binary header was introduced
+    if sign is None:
+        header_bytes = _read_bytes(array, band_rows, 0, lsb_with_variance_plaintext.LEGACY_HEADER_BITS // 8)
+        try:
+            min_var, max_var = lsb_with_variance_plaintext.parse_legacy_header(header_bytes)
+        except ValueError as e:
+            print("Error:", e)
+            return ""
+        marker = lsb_with_variance_plaintext.END_MARKER.encode('latin-1')
+        data = _read_bytes_until(array, band_rows, marker, min_var, max_var)
+        return lsb_with_variance_plaintext.strip_legacy_header(data.decode('latin-1'))
+
+    header_bytes = _read_bytes(array, band_rows, 0, lsb_with_variance_aes.LEGACY_HEADER_BITS // 8)
+    header = lsb_with_variance_aes.parse_legacy_header(header_bytes)
+    if header is None:
+        print("Error: Invalid HEADER.")
+        return ""
+    min_var, max_var, enc_len, enc_start = header
+    message = _read_bytes(array, band_rows, 0, enc_start + enc_len, min_var, max_var, legacy=True).decode('latin-1')
+    return lsb_with_variance_aes.decrypt_payload(message[enc_start:enc_start + enc_len], str(sign))
+
+
+def extract_message_variance_tiled(array, sign=None, band_rows=DEFAULT_BAND_ROWS):
+    """
+       Extracts a message embedded with variance-based LSB steganography, band by band.
+
+       Gives the same result as extract_message_variance() of lsb_with_variance_plaintext
+       (sign=None) or lsb_with_variance_aes (sign given), with memory bounded by the band size.
+
+       Parameters:
+           array (np.ndarray): HxWx3 uint8 RGB image data (may be a read-only np.memmap).
+           sign (str, int or None): Shared secret for AES decryption, or None for plaintext.
+           band_rows (int): Rows per band (rounded down to a multiple of 3).
+
+       Returns:
+           str: The extracted message, or an empty string if the header or decryption fails.
+
+       Notes:
+           Dense-mode images (see variance_dense) are read with the whole-image extractor.
+       """
+    try:
+        header = unpack_header(_read_bytes(array, band_rows, 0, HEADER_SIZE))
+    except ValueError as e:
+        print("Error:", e)
+        return ""
+    if header is None:
+        return _extract_legacy_tiled(array, sign, band_rows)
+
+    expected = METHOD_VARIANCE_PLAINTEXT if sign is None else METHOD_VARIANCE_AES
+    if header["method"] != expected:
+        print("Error: The image was embedded with a different method.")
+        return ""
+    if header["flags"] & FLAG_DENSE:
+        payload = lsb_with_variance_plaintext.extract_payload_variance(np.asarray(array), header)
+    else:
+        payload = _read_bytes(array, band_rows, HEADER_BITS, header["length"],
+                              header["min_var"], header["max_var"])
+    if sign is None:
+        return payload.decode('latin-1')
+    if not header["flags"] & FLAG_BINARY:
+        payload = payload.decode('latin-1')
+    return lsb_with_variance_aes.decrypt_payload(payload, str(sign), header["flags"])
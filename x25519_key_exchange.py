@@ -0,0 +1,103 @@
+from lazy_import import lazy_import
+from image_io import load_rgb_array
+from standard_lsb import embed_lsb_array, extract_lsb_bytes, read_lsb_preamble
+from stego_header import HEADER_BITS, METHOD_STANDARD_X25519, METHOD_VARIANCE_X25519, unpack_header
+from stego_probe import probe_method
+from variance_kernel import extract_bits
+from lsb_with_variance_plaintext import embed_message_variance_array, extract_payload_variance
+
+ECC = lazy_import("Crypto.PublicKey.ECC")
+DH = lazy_import("Crypto.Protocol.DH")
+np = lazy_import("numpy")
+
+# X25519 key agreement, selectable instead of the classic DH of dh_key_exchange_10.py.
+#
+# Public keys are 32 raw bytes. They are embedded in binary, without an end marker: the
+# preamble (standard LSB) or binary header (variance LSB) records METHOD_*_X25519, so the
+# extractor knows a fixed-size key follows. The shared secret is returned as a hex string,
+# which the AES steps use exactly like the decimal string of the classic DH secret.
+
+X25519_KEY_SIZE = 32
+
+
+def generate_x25519_keypair():
+    """
+       Generates an X25519 keypair.
+
+       Returns:
+           tuple: (private_key, public_key), both 32-byte strings.
+       """
+    key = ECC.generate(curve="curve25519")
+    return key.seed, key.public_key().export_key(format="raw")
+
+
+def x25519_shared_secret(private_key, peer_public_key):
+    """
+       Computes the X25519 shared secret.
+
+       Parameters:
+           private_key (bytes): Our 32-byte private key.
+           peer_public_key (bytes): The other side's 32-byte public key.
+
+       Returns:
+           str: The 32-byte shared secret as 64 hex characters.
+
+       Raises:
+           ValueError: If a key is malformed.
+       """
+    if len(peer_public_key) != X25519_KEY_SIZE:
+        raise ValueError(f"X25519 public keys are {X25519_KEY_SIZE} bytes, got {len(peer_public_key)}.")
+    secret = DH.key_agreement(static_priv=DH.import_x25519_private_key(bytes(private_key)),
+                              static_pub=DH.import_x25519_public_key(bytes(peer_public_key)),
+                              kdf=lambda z: z)
+    return secret.hex()
+
+
+def is_x25519_key(value):
+    return isinstance(value, (bytes, bytearray)) and len(value) == X25519_KEY_SIZE
+
+
+def embed_x25519_public_key(public_key, array, method):
+    """
+       Embeds a 32-byte public key into an RGB array, in place.
+
+       Parameters:
+           public_key (bytes): The X25519 public key.
+           array (np.ndarray): Writable HxWx3 uint8 image data.
+           method (str): '1' for standard LSB, '2' for variance-based LSB.
+
+       Returns:
+           np.ndarray: The same array, with the key embedded.
+
+       Raises:
+           ValueError: If the key or the method is invalid, or the image is too small.
+       """
+    if not is_x25519_key(public_key):
+        raise ValueError("Not an X25519 public key.")
+    if method == '1':
+        return embed_lsb_array(array, public_key, marker="", method=METHOD_STANDARD_X25519)
+    if method == '2':
+        return embed_message_variance_array(bytes(public_key).decode('latin-1'), array, METHOD_VARIANCE_X25519)
+    raise ValueError("Invalid LSB method.")
+
+
+def extract_x25519_public_key(image):
+    """
+       Extracts a public key embedded with embed_x25519_public_key().
+
+       Parameters:
+           image: Path, bytes, file-like object, PIL image or RGB array.
+
+       Returns:
+           bytes or None: The 32-byte public key, or None if the image does not hold one.
+       """
+    array = load_rgb_array(image)
+    method = probe_method(array)
+    if method == METHOD_STANDARD_X25519:
+        key = extract_lsb_bytes(array, X25519_KEY_SIZE, offset=read_lsb_preamble(array)["size"])
+    elif method == METHOD_VARIANCE_X25519:
+        header = unpack_header(np.packbits(extract_bits(array, HEADER_BITS)).tobytes())
+        key = extract_payload_variance(array, header)[:header["length"]]
+    else:
+        return None
+    return key if is_x25519_key(key) else None